@@ -0,0 +1,156 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Mapping, Optional, Set
+
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+
+Deliver = Callable[[Any], Awaitable[None]]
+
+
+class Subscriber:
+    """Where one subscriber's messages go, and what it was sent last"""
+
+    __slots__ = ("deliver", "on_close", "seen", "busy", "ping")
+
+    def __init__(self, deliver: Deliver, on_close: Optional[Callable[[], Awaitable[None]]], seen: int):
+        self.deliver = deliver
+        self.on_close = on_close
+        self.seen = seen
+        self.busy = False
+        self.ping = False
+
+
+class Broadcaster:
+    """Fans the latest message out to any number of subscribers in this process.
+
+    Subscribers are delivery callbacks kept in a set, rather than tasks
+    each waiting on a queue: an idle subscriber is one small object, and a
+    task only exists while a message is being delivered to it. Messages are
+    states, not a log (the dataset's current version): a subscriber still
+    busy with one message when two more are published only receives the
+    newest of them. With ``keepalive``, one timer shared by every subscriber
+    delivers ``None`` to the idle ones each ``keepalive`` seconds. A
+    subscriber whose delivery raises is dropped.
+    """
+
+    def __init__(self, keepalive: Optional[float] = None):
+        self.latest: Any = None
+        self.sequence = 0
+        self.closed = False
+        self.keepalive = keepalive
+        self._subscribers: Set[Subscriber] = set()
+        self._deliveries: Set[asyncio.Task] = set()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, deliver: Deliver, on_close: Optional[Callable[[], Awaitable[None]]] = None,
+                  replay: bool = False) -> Subscriber:
+        """Deliver the messages published from now on (preceded by the latest
+        one when ``replay``); ``on_close`` is awaited when the broadcaster closes"""
+        subscriber = Subscriber(deliver, on_close, self.sequence)
+        self._subscribers.add(subscriber)
+        if self.closed or (replay and self.latest is not None):
+            subscriber.seen -= 1
+            self._dispatch(subscriber)
+        if self.keepalive and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.keepalive, self._ping)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+        if not self._subscribers and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def publish(self, message: Any):
+        """Make ``message`` the latest and deliver it to every subscriber"""
+        self.latest = message
+        self.sequence += 1
+        for subscriber in self._subscribers:
+            self._dispatch(subscriber)
+
+    def close(self):
+        """End every subscription, e.g. so open streams finish on shutdown"""
+        self.closed = True
+        for subscriber in self._subscribers:
+            self._dispatch(subscriber)
+
+    def _ping(self):
+        self._timer = asyncio.get_running_loop().call_later(self.keepalive, self._ping)
+        for subscriber in self._subscribers:
+            if not subscriber.busy:
+                subscriber.ping = True
+                self._dispatch(subscriber)
+
+    def _dispatch(self, subscriber: Subscriber):
+        # A busy subscriber picks up the newest message once its delivery ends
+        if subscriber.busy:
+            return
+        subscriber.busy = True
+        task = asyncio.ensure_future(self._deliver(subscriber))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, subscriber: Subscriber):
+        try:
+            while subscriber in self._subscribers:
+                if self.closed:
+                    self.unsubscribe(subscriber)
+                    if subscriber.on_close is not None:
+                        await subscriber.on_close()
+                elif subscriber.seen != self.sequence:
+                    subscriber.seen, subscriber.ping = self.sequence, False
+                    await subscriber.deliver(self.latest)
+                elif subscriber.ping:
+                    subscriber.ping = False
+                    await subscriber.deliver(None)
+                else:
+                    break
+        except Exception:
+            self.unsubscribe(subscriber)
+        finally:
+            subscriber.busy = False
+
+
+class EventStreamResponse(Response):
+    """An open-ended ``text/event-stream`` of a broadcaster's messages, each
+    written as ``render(message)`` (``None`` for a keepalive).
+
+    Unlike a StreamingResponse there is no task group, second task or body
+    generator per client: the request only waits for the disconnect while
+    the broadcaster writes to it. When the broadcaster closes, the response
+    is completed, which ASGI servers answer with the disconnect.
+    """
+
+    media_type = "text/event-stream"
+
+    def __init__(self, broadcaster: Broadcaster, render: Callable[[Any], bytes], replay: bool = False,
+                 headers: Optional[Mapping[str, str]] = None):
+        self.broadcaster = broadcaster
+        self.render = render
+        self.replay = replay
+        self.status_code = 200
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        # Sent at once so proxies and the browser see the stream open
+        await send({"type": "http.response.body", "body": b": connected\n\n", "more_body": True})
+
+        async def deliver(message):
+            await send({"type": "http.response.body", "body": self.render(message), "more_body": True})
+
+        async def end():
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+        subscriber = self.broadcaster.subscribe(deliver, end, self.replay)
+        try:
+            while (await receive())["type"] != "http.disconnect":
+                pass
+        finally:
+            self.broadcaster.unsubscribe(subscriber)
@@ -0,0 +1,133 @@
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def project(lat: float, lng: float) -> Tuple[float, float]:
+    """Web Mercator position of a point as fractions of the world (0..1)"""
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    x = (lng + 180.0) / 360.0
+    sin_lat = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, y
+
+
+class ClusterIndex:
+    """Hierarchical grid of marker clusters, one level per zoom.
+
+    Each level buckets markers into square cells ``cell_size`` screen pixels
+    wide at that zoom, so a cell at zoom z is exactly four cells at zoom z+1
+    and coarser levels are built by merging the finer ones. Cells keep a
+    per-layer ``[count, sum_lat, sum_lng, first_marker]`` aggregate, which
+    lets a query pick any subset of layers without touching the markers.
+    Above ``max_zoom`` queries return the individual markers instead.
+    """
+
+    def __init__(self, markers: List[Dict], min_zoom: int = 0, max_zoom: int = 16, cell_size: int = 64):
+        self.markers = markers
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.cell_size = cell_size
+
+        finest: Dict[Tuple[int, int], Dict[str, list]] = {}
+        self._cell_markers: Dict[Tuple[int, int], List[int]] = {}
+        scale = self._scale(max_zoom)
+        for index, marker in enumerate(markers):
+            lat, lng = marker['lat'], marker['lng']
+            x, y = project(lat, lng)
+            key = (int(x * scale), int(y * scale))
+            layers = finest.get(key)
+            if layers is None:
+                layers = finest[key] = {}
+                self._cell_markers[key] = []
+            aggregate = layers.get(marker['layer_id'])
+            if aggregate is None:
+                layers[marker['layer_id']] = [1, lat, lng, index]
+            else:
+                aggregate[0] += 1
+                aggregate[1] += lat
+                aggregate[2] += lng
+            self._cell_markers[key].append(index)
+
+        self.levels: Dict[int, Dict[Tuple[int, int], Dict[str, list]]] = {max_zoom: finest}
+        for zoom in range(max_zoom - 1, min_zoom - 1, -1):
+            level = {}
+            for (cx, cy), layers in self.levels[zoom + 1].items():
+                parent = level.get((cx >> 1, cy >> 1))
+                if parent is None:
+                    parent = level[(cx >> 1, cy >> 1)] = {}
+                for layer_id, (count, sum_lat, sum_lng, first) in layers.items():
+                    aggregate = parent.get(layer_id)
+                    if aggregate is None:
+                        parent[layer_id] = [count, sum_lat, sum_lng, first]
+                    else:
+                        aggregate[0] += count
+                        aggregate[1] += sum_lat
+                        aggregate[2] += sum_lng
+            self.levels[zoom] = level
+
+    def _scale(self, zoom: int) -> float:
+        return (2 ** zoom) * 256 / self.cell_size
+
+    def _cells_in_bbox(self, cells: Dict, zoom: int, south: float, west: float,
+                       north: float, east: float) -> Iterable:
+        scale = self._scale(zoom)
+        x0, y0 = project(north, west)
+        x1, y1 = project(south, east)
+        cx0, cx1 = int(x0 * scale), int(x1 * scale)
+        cy0, cy1 = int(y0 * scale), int(y1 * scale)
+
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) <= len(cells):
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    layers = cells.get((cx, cy))
+                    if layers is not None:
+                        yield (cx, cy), layers
+        else:
+            for key, layers in cells.items():
+                if cx0 <= key[0] <= cx1 and cy0 <= key[1] <= cy1:
+                    yield key, layers
+
+    def query(self, south: float, west: float, north: float, east: float, zoom: int,
+              layers: Optional[Iterable[str]] = None) -> Dict:
+        """Clusters and single markers inside a bounding box at a zoom level"""
+        wanted = set(layers) if layers else None
+        clusters, markers = [], []
+
+        if zoom > self.max_zoom:
+            finest = self.levels[self.max_zoom]
+            for key, _ in self._cells_in_bbox(finest, self.max_zoom, south, west, north, east):
+                for index in self._cell_markers[key]:
+                    marker = self.markers[index]
+                    if wanted is not None and marker['layer_id'] not in wanted:
+                        continue
+                    if south <= marker['lat'] <= north and west <= marker['lng'] <= east:
+                        markers.append(marker)
+            return {"zoom": zoom, "clusters": clusters, "markers": markers}
+
+        level_zoom = max(zoom, self.min_zoom)
+        cells = self.levels[level_zoom]
+        for (cx, cy), cell_layers in self._cells_in_bbox(cells, level_zoom, south, west, north, east):
+            count = sum_lat = sum_lng = 0
+            breakdown = {}
+            first = None
+            for layer_id, aggregate in cell_layers.items():
+                if wanted is not None and layer_id not in wanted:
+                    continue
+                count += aggregate[0]
+                sum_lat += aggregate[1]
+                sum_lng += aggregate[2]
+                breakdown[layer_id] = aggregate[0]
+                first = aggregate[3]
+            if count == 0:
+                continue
+            if count == 1:
+                markers.append(self.markers[first])
+            else:
+                clusters.append({
+                    "id": f"{level_zoom}/{cx}/{cy}",
+                    "lat": sum_lat / count,
+                    "lng": sum_lng / count,
+                    "count": count,
+                    "layers": breakdown,
+                })
+        return {"zoom": zoom, "clusters": clusters, "markers": markers}
@@ -0,0 +1,155 @@
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/x-ndjson",
+    "application/msgpack",
+    "application/vnd.",
+)
+
+# Event streams stay open for hours: a compressor per connection would cost
+# far more memory than the few bytes each event saves
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli else ("gzip",)
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best supported content coding from an Accept-Encoding header"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        weights[coding.strip().lower()] = quality
+    for coding in supported_encodings():
+        if weights.get(coding, weights.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+class _Encoder:
+    """Incremental compressor for one response body"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def write(self, data: bytes, flush: bool = False) -> bytes:
+        if self.encoding == "br":
+            out = self._compressor.process(data)
+            return out + self._compressor.flush() if flush else out
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.finish()
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+def compress(body: bytes, encoding: str, gzip_level: int = 9, brotli_quality: int = 9) -> bytes:
+    return _Encoder(encoding, gzip_level, brotli_quality).finish(body)
+
+
+class CompressionMiddleware:
+    """Brotli/gzip compression of responses of at least ``minimum_size`` bytes.
+
+    Works like Starlette's GZipMiddleware, but negotiates brotli when it is
+    installed and accepted, and only touches compressible media types.
+    Streaming bodies are flushed chunk by chunk so NDJSON keeps streaming.
+    Responses that already carry a Content-Encoding, and event streams, pass
+    through unchanged.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6,
+                 brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        initial_message: Message = {}
+        encoder: Optional[_Encoder] = None
+        state = {"started": False, "passthrough": False}
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal initial_message, encoder
+            if message["type"] == "http.response.start":
+                initial_message = message
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                state["passthrough"] = (
+                    "content-encoding" in headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or content_type.startswith(UNCOMPRESSED_TYPES)
+                )
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if not state["started"]:
+                state["started"] = True
+                headers = MutableHeaders(raw=initial_message["headers"])
+                if state["passthrough"] or (len(body) < self.minimum_size and not more_body):
+                    state["passthrough"] = True
+                    await send(initial_message)
+                    await send(message)
+                    return
+
+                encoder = _Encoder(encoding, self.gzip_level, self.brotli_quality)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                    message["body"] = encoder.write(body, flush=True)
+                else:
+                    message["body"] = encoder.finish(body)
+                    headers["Content-Length"] = str(len(message["body"]))
+                await send(initial_message)
+                await send(message)
+                return
+
+            if state["passthrough"]:
+                await send(message)
+                return
+            message["body"] = encoder.write(body, flush=True) if more_body else encoder.finish(body)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
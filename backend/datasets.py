@@ -0,0 +1,293 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterable, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class DatasetConflict(Exception):
+    """Raised when another writer published a dataset version first"""
+
+
+class DatasetStore:
+    """Versioned dataset kept as one immutable collection per version.
+
+    Writers build a new version in a staging collection (a copy of the current
+    one with the bulk operations applied), validate it and then atomically
+    flip the pointer document in ``datasets``. Readers resolve the current
+    collection from the in-process pointer, so they never see a half-built
+    version. The ``keep_versions`` previous versions are kept for rollback.
+    ``indexes`` are ``(keys, options)`` pairs built on every version before
+    it becomes current.
+
+    With ``revisions``, every publish and rollback takes the next number of a
+    monotonic revision counter kept in the pointer. Documents written without
+    a ``revision`` (inserted, replaced, or updated with ``revision: None``)
+    are stamped with the publishing revision, and the ids of documents a
+    publish removed are recorded as tombstones, so clients can fetch what
+    changed since the revision they hold. A rollback cannot be expressed
+    that way and moves ``changes_floor`` up to its revision; so does
+    compacting tombstones older than ``tombstone_ttl``.
+    """
+
+    def __init__(self, db, name: str = "markers", keep_versions: int = 3,
+                 validate: Optional[Callable[[Dict], None]] = None,
+                 indexes: Optional[List[Tuple[List, Dict]]] = None,
+                 revisions: bool = False, tombstone_ttl: timedelta = timedelta(days=30)):
+        self.db = db
+        self.name = name
+        self.keep_versions = keep_versions
+        self.validate = validate
+        self.indexes = indexes if indexes is not None else [([("id", 1)], {"unique": True})]
+        self.revisions = revisions
+        self.tombstone_ttl = tombstone_ttl
+        self.version = 0
+        self.revision = 0
+        # Oldest revision changes can still be computed from
+        self.changes_floor = 0
+        # Deployments that predate versioning keep their data in `name`
+        self.collection_name = name
+        self._lock = asyncio.Lock()
+        self._listeners: List[Tuple[Callable[[int], Awaitable[None]], bool]] = []
+
+    @property
+    def collection(self):
+        return self.db[self.collection_name]
+
+    @property
+    def tombstones(self):
+        return self.db[f"{self.name}_tombstones"]
+
+    def add_listener(self, callback: Callable[[int], Awaitable[None]], on_load: bool = True):
+        """Register a coroutine called with the new version after every flip.
+        
+        With ``on_load=False`` it only hears about versions this process
+        published or rolled back to, not the ones ``load`` picks up from
+        other writers.
+        """
+        self._listeners.append((callback, on_load))
+
+    async def _notify(self, loaded: bool = False):
+        for callback, on_load in self._listeners:
+            if loaded and not on_load:
+                continue
+            try:
+                await callback(self.version)
+            except Exception as e:
+                logger.error(f"Dataset listener failed for {self.name} v{self.version}: {str(e)}")
+
+    async def ensure_indexes(self, collection=None):
+        """Create the configured indexes (idempotent) on a version's collection"""
+        if collection is None:
+            collection = self.collection
+            if self.revisions:
+                await self.tombstones.create_index([("revision", 1)])
+        for keys, options in self.indexes:
+            await collection.create_index(keys, **options)
+
+    async def _pointer(self) -> Optional[Dict]:
+        return await self.db.datasets.find_one({"_id": self.name})
+
+    async def load(self):
+        """Refresh the in-process pointer from the datasets collection"""
+        pointer = await self._pointer()
+        version, collection_name = 0, self.name
+        if pointer:
+            version, collection_name = pointer['version'], pointer['collection']
+            self.revision = pointer.get('revision', 0)
+            self.changes_floor = pointer.get('changes_floor', 0)
+        changed = (version, collection_name) != (self.version, self.collection_name)
+        self.version, self.collection_name = version, collection_name
+        if changed:
+            await self._notify(loaded=True)
+
+    async def _validate(self, staging) -> int:
+        count = 0
+        async for document in staging.find({}, {"_id": 0}):
+            if self.validate:
+                self.validate(document)
+            count += 1
+        if count == 0:
+            raise ValueError(f"Refusing to publish an empty {self.name} dataset")
+        return count
+
+    async def publish(self, operations: List) -> int:
+        """Build a new version with ``operations`` applied and make it current.
+
+        Returns the new version number.
+        """
+        async def single_batch():
+            if operations:
+                yield operations
+
+        return await self.publish_stream(single_batch())
+
+    async def publish_stream(self, batches: AsyncIterable[List], skip_unchanged: bool = False) -> Optional[int]:
+        """Like ``publish``, with the operations arriving as a stream of batches.
+
+        Each batch is bulk-written to the staging collection as it arrives, so
+        only one batch is held in memory. Batches are produced while the
+        current version is still current, so they can be diffed against it.
+        With ``skip_unchanged``, nothing is published when every batch is
+        empty and None is returned.
+        """
+        async with self._lock:
+            pointer = await self._pointer()
+            current_version = pointer['version'] if pointer else 0
+            current_collection = pointer['collection'] if pointer else self.name
+            history = pointer['history'] if pointer else []
+            new_version = max([current_version] + [entry['version'] for entry in history]) + 1
+            revision = (pointer.get('revision', current_version) if pointer else 0) + 1
+            staging_name = f"{self.name}_v{new_version}_{uuid.uuid4().hex[:8]}"
+            staging = self.db[staging_name]
+
+            try:
+                if current_collection in await self.db.list_collection_names():
+                    await self.db[current_collection].aggregate(
+                        [{"$match": {}}, {"$out": staging_name}]
+                    ).to_list(None)
+                await self.ensure_indexes(staging)
+                changed = False
+                async for operations in batches:
+                    if operations:
+                        await staging.bulk_write(operations, ordered=False)
+                        changed = True
+                if skip_unchanged and not changed:
+                    await self.db.drop_collection(staging_name)
+                    return None
+                if self.revisions:
+                    await staging.update_many({"revision": None}, {"$set": {"revision": revision}})
+                    if pointer:
+                        await self._record_deletions(self.db[current_collection], staging, revision)
+                count = await self._validate(staging)
+            except BaseException:
+                await self.db.drop_collection(staging_name)
+                raise
+
+            now = datetime.now(timezone.utc)
+            history = [{
+                "version": new_version,
+                "collection": staging_name,
+                "published_at": now,
+                "count": count,
+            }] + history
+            if not pointer:
+                history.append({"version": 0, "collection": self.name, "published_at": now, "count": None})
+            kept, expired = history[:self.keep_versions + 1], history[self.keep_versions + 1:]
+
+            flipped = await self.db.datasets.find_one_and_update(
+                {"_id": self.name, "version": current_version} if pointer else {"_id": self.name},
+                {"$set": {
+                    "version": new_version,
+                    "collection": staging_name,
+                    "published_at": now,
+                    "history": kept,
+                    "revision": revision,
+                }},
+                upsert=not pointer,
+            )
+            if pointer and flipped is None:
+                await self.db.drop_collection(staging_name)
+                raise DatasetConflict(f"{self.name} changed while building v{new_version}")
+
+            for entry in expired:
+                if entry['collection'] != staging_name:
+                    await self.db.drop_collection(entry['collection'])
+
+            self.version, self.collection_name = new_version, staging_name
+            self.revision = revision
+            logger.info(f"Published {self.name} v{new_version} with {count} documents")
+            if self.revisions:
+                await self.compact_tombstones()
+        await self._notify()
+        return new_version
+
+    async def rollback(self, version: Optional[int] = None) -> int:
+        """Point back at a kept version (the previous one by default)"""
+        async with self._lock:
+            pointer = await self._pointer()
+            if not pointer:
+                raise ValueError(f"No {self.name} versions to roll back to")
+            history = pointer['history']
+            if version is None:
+                older = [entry for entry in history if entry['version'] < pointer['version']]
+                target = older[0] if older else None
+            else:
+                target = next((entry for entry in history if entry['version'] == version), None)
+            if target is None:
+                raise ValueError(f"{self.name} version {version} is not available")
+
+            # Documents keep the revisions they had in the target version
+            revision = pointer.get('revision', pointer['version']) + 1
+            await self.db.datasets.update_one(
+                {"_id": self.name},
+                {"$set": {
+                    "version": target['version'],
+                    "collection": target['collection'],
+                    "published_at": datetime.now(timezone.utc),
+                    "revision": revision,
+                    "changes_floor": revision,
+                }},
+            )
+            self.version, self.collection_name = target['version'], target['collection']
+            self.revision = self.changes_floor = revision
+            logger.info(f"Rolled {self.name} back to v{target['version']}")
+        await self._notify()
+        return self.version
+
+    async def _record_deletions(self, current, staging, revision: int, batch_size: int = 1000):
+        """Tombstone the ids in ``current`` missing from ``staging``"""
+        now = datetime.now(timezone.utc)
+
+        async def flush(ids):
+            present = set(await staging.distinct("id", {"id": {"$in": ids}}))
+            tombstones = [{"id": key, "revision": revision, "deleted_at": now} for key in ids if key not in present]
+            if tombstones:
+                await self.tombstones.insert_many(tombstones)
+
+        ids = []
+        async for document in current.find({}, {"_id": 0, "id": 1}):
+            ids.append(document["id"])
+            if len(ids) == batch_size:
+                await flush(ids)
+                ids = []
+        if ids:
+            await flush(ids)
+
+    async def compact_tombstones(self) -> int:
+        """Drop tombstones older than ``tombstone_ttl``; changes from before the
+        newest one dropped can no longer be computed"""
+        cutoff = datetime.now(timezone.utc) - self.tombstone_ttl
+        newest = await self.tombstones.find({"deleted_at": {"$lt": cutoff}}).sort("revision", -1).to_list(1)
+        if not newest:
+            return 0
+        floor = newest[0]["revision"]
+        result = await self.tombstones.delete_many({"revision": {"$lte": floor}})
+        await self.db.datasets.update_one({"_id": self.name}, {"$max": {"changes_floor": floor}})
+        self.changes_floor = max(self.changes_floor, floor)
+        logger.info(f"Compacted {result.deleted_count} {self.name} tombstones up to revision {floor}")
+        return result.deleted_count
+
+    def has_changes_since(self, since: int) -> bool:
+        """Whether the changes after revision ``since`` can be computed"""
+        return self.revision > 0 and self.changes_floor <= since <= self.revision
+
+    async def deleted_since(self, since: int) -> List[str]:
+        """Ids deleted after revision ``since`` that are not in the current version"""
+        ids = await self.tombstones.distinct("id", {"revision": {"$gt": since}})
+        if not ids:
+            return []
+        present = set(await self.collection.distinct("id", {"id": {"$in": ids}}))
+        return sorted(key for key in ids if key not in present)
+
+    async def versions(self) -> Dict:
+        pointer = await self._pointer()
+        return {
+            "current": pointer['version'] if pointer else 0,
+            "revision": pointer.get('revision', 0) if pointer else 0,
+            "changes_floor": pointer.get('changes_floor', 0) if pointer else 0,
+            "versions": pointer['history'] if pointer else [],
+        }
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+
+logger = logging.getLogger(__name__)
+
+
+def worker_id() -> str:
+    """Identifies this process among the workers sharing the database"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class EventBus:
+    """Cross-worker notifications through a capped ``events`` collection.
+
+    ``publish`` inserts an event tagged with this worker's id; ``follow``
+    tails the collection and calls the handlers subscribed to each event's
+    kind, skipping the worker's own events (it already acted on them). A
+    capped collection keeps the newest events only and preserves insertion
+    order, so a tailable cursor returns new events as they are written
+    without polling, and it needs no replica set, unlike change streams.
+
+    When the cursor dies (the collection was empty, or the connection was
+    lost), following resumes ``resume_window`` before the last event seen,
+    since ObjectIds from different workers are only ordered to the second;
+    events already handled are recognized by id and skipped.
+    """
+
+    def __init__(self, db, collection_name: str = "events", size: int = 1 << 20, max_events: int = 1000,
+                 worker: Optional[str] = None, poll_interval: float = 0.5,
+                 resume_window: timedelta = timedelta(seconds=5)):
+        self.db = db
+        self.collection_name = collection_name
+        self.size = size
+        self.max_events = max_events
+        self.worker = worker or worker_id()
+        self.poll_interval = poll_interval
+        self.resume_window = resume_window
+        self.tailable = True
+        self._handlers: Dict[str, List[Callable[[Dict], Awaitable[None]]]] = {}
+        self._seen: OrderedDict = OrderedDict()
+        # Events written before this process started are reflected in the state
+        # it loads; replaying the few inside resume_window is harmless
+        self._resume_from = ObjectId.from_datetime(datetime.now(timezone.utc))
+        self.published = 0
+        self.received = 0
+
+    @property
+    def collection(self):
+        return self.db[self.collection_name]
+
+    async def ensure_collection(self):
+        """Create the capped collection (idempotent)"""
+        try:
+            await self.db.create_collection(
+                self.collection_name, capped=True, size=self.size, max=self.max_events
+            )
+        except CollectionInvalid:
+            pass
+        except Exception as e:
+            # Tailing then degrades to polling every poll_interval
+            self.tailable = False
+            logger.warning(f"Could not create capped {self.collection_name} collection: {str(e)}")
+
+    def subscribe(self, kind: str, handler: Callable[[Dict], Awaitable[None]]):
+        """Register a coroutine called with each event of ``kind`` from other workers"""
+        self._handlers.setdefault(kind, []).append(handler)
+
+    async def publish(self, kind: str, **payload):
+        event = {
+            "_id": ObjectId(),
+            "kind": kind,
+            "worker": self.worker,
+            "at": datetime.now(timezone.utc),
+            "payload": payload,
+        }
+        self._remember(event["_id"])
+        await self.collection.insert_one(event)
+        self.published += 1
+
+    def _remember(self, event_id: ObjectId):
+        self._seen[event_id] = None
+        while len(self._seen) > self.max_events:
+            self._seen.popitem(last=False)
+
+    async def _dispatch(self, event: Dict):
+        if event["_id"] in self._seen:
+            return
+        self._remember(event["_id"])
+        self._resume_from = max(self._resume_from, event["_id"])
+        if event.get("worker") == self.worker:
+            return
+        self.received += 1
+        for handler in self._handlers.get(event.get("kind"), []):
+            try:
+                await handler(event.get("payload") or {})
+            except Exception as e:
+                logger.error(f"Event handler for {event.get('kind')} failed: {str(e)}")
+
+    def _query(self) -> Dict:
+        since = self._resume_from.generation_time - self.resume_window
+        return {"_id": {"$gte": ObjectId.from_datetime(since)}}
+
+    async def follow(self):
+        """Dispatch other workers' events until cancelled"""
+        while True:
+            try:
+                if self.tailable:
+                    cursor = self.collection.find(self._query(), cursor_type=CursorType.TAILABLE_AWAIT)
+                    while cursor.alive:
+                        async for event in cursor:
+                            await self._dispatch(event)
+                else:
+                    async for event in self.collection.find(self._query()).sort("_id", 1):
+                        await self._dispatch(event)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if self.tailable:
+                    self.tailable = False
+                    logger.warning(f"Cannot tail {self.collection_name}, polling instead: {str(e)}")
+                    continue
+                logger.warning(f"Reading {self.collection_name} failed: {str(e)}")
+            except Exception as e:
+                logger.warning(f"Reading {self.collection_name} failed: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    def stats(self) -> Dict:
+        return {
+            "worker": self.worker,
+            "tailable": self.tailable,
+            "published": self.published,
+            "received": self.received,
+        }
@@ -0,0 +1,308 @@
+import asyncio
+import logging
+import os
+import random
+import re
+import time
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from cachetools import LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+
+def geocode_query(place_name: str) -> str:
+    """Build the geocoding query for a place in Ilhéus"""
+    # Add Ilhéus context to improve accuracy
+    return f"{place_name}, Ilhéus, Bahia, Brazil"
+
+
+def normalize_query(place_name: str) -> str:
+    """Cache key for a place: the geocoding query, NFC-normalized, case-folded
+    and with whitespace collapsed"""
+    query = unicodedata.normalize('NFC', geocode_query(place_name.strip()))
+    return re.sub(r'\s+', ' ', query).casefold()
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Motor returns naive datetimes unless the client is tz_aware
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class GeocodeCache:
+    """Geocode results stored in MongoDB with an in-process LRU in front.
+
+    Entries are keyed by ``normalize_query`` and expire after ``ttl``;
+    failed lookups are remembered as negative entries for ``negative_ttl``.
+    A TTL index on ``expires_at`` lets MongoDB purge expired entries.
+    """
+
+    def __init__(
+        self,
+        collection,
+        maxsize: int = 10000,
+        ttl: timedelta = timedelta(days=30),
+        negative_ttl: timedelta = timedelta(hours=24),
+    ):
+        self.collection = collection
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lru = LRUCache(maxsize=maxsize)
+        self.hits = 0
+        self.misses = 0
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def _lookup_lru(self, key: str, now: datetime) -> Tuple[bool, Optional[Dict]]:
+        entry = self._lru.get(key)
+        if entry is None:
+            return False, None
+        if _as_utc(entry['expires_at']) <= now:
+            del self._lru[key]
+            return False, None
+        return True, entry['location']
+
+    async def get_many(self, place_names: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """Return cached locations (None for negative entries) for the names
+        that have a live entry; names without one are left out"""
+        now = datetime.now(timezone.utc)
+        found = {}
+        pending = {}
+        for name in place_names:
+            key = normalize_query(name)
+            hit, location = self._lookup_lru(key, now)
+            if hit:
+                found[name] = location
+            else:
+                pending.setdefault(key, []).append(name)
+
+        if pending:
+            cursor = self.collection.find(
+                {"_id": {"$in": list(pending)}, "expires_at": {"$gt": now}}
+            )
+            async for entry in cursor:
+                self._lru[entry['_id']] = entry
+                for name in pending.pop(entry['_id']):
+                    found[name] = entry['location']
+
+        self.hits += len(found)
+        self.misses += sum(len(names) for names in pending.values())
+        return found
+
+    async def set(self, place_name: str, location: Optional[Dict]):
+        now = datetime.now(timezone.utc)
+        key = normalize_query(place_name)
+        entry = {
+            "_id": key,
+            "query": geocode_query(place_name.strip()),
+            "location": location,
+            "negative": location is None,
+            "created_at": now,
+            "expires_at": now + (self.ttl if location else self.negative_ttl),
+        }
+        self._lru[key] = entry
+        await self.collection.replace_one({"_id": key}, entry, upsert=True)
+
+    async def list_entries(self, query: Optional[str] = None, negative: Optional[bool] = None,
+                           limit: int = 100) -> List[Dict]:
+        filters = {}
+        if query:
+            filters["_id"] = {"$regex": re.escape(normalize_query(query).split(',')[0])}
+        if negative is not None:
+            filters["negative"] = negative
+        entries = await self.collection.find(filters).sort("created_at", -1).to_list(limit)
+        for entry in entries:
+            entry["key"] = entry.pop("_id")
+        return entries
+
+    def forget(self, place_name: Optional[str] = None, negative_only: bool = False):
+        """Drop entries from the in-process LRU only, e.g. after another
+        worker invalidated them in MongoDB"""
+        if place_name:
+            self._lru.pop(normalize_query(place_name), None)
+        elif negative_only:
+            for key in [k for k, v in self._lru.items() if v['negative']]:
+                del self._lru[key]
+        else:
+            self._lru.clear()
+
+    async def invalidate(self, place_name: Optional[str] = None, negative_only: bool = False) -> int:
+        """Drop one place's entry, or every (negative) entry when no name is given"""
+        self.forget(place_name, negative_only)
+        if place_name:
+            result = await self.collection.delete_one({"_id": normalize_query(place_name)})
+        elif negative_only:
+            result = await self.collection.delete_many({"negative": True})
+        else:
+            result = await self.collection.delete_many({})
+        return result.deleted_count
+
+    def stats(self) -> Dict:
+        return {
+            "lru_size": len(self._lru),
+            "lru_maxsize": self._lru.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class Geocoder:
+    """Non-blocking Google Maps geocoder with bounded concurrency.
+
+    At most ``concurrency`` lookups are in flight at once, each one limited by
+    ``timeout`` seconds. OVER_QUERY_LIMIT answers and timeouts are retried up
+    to ``max_retries`` times with exponential backoff. When a ``cache`` is
+    given, answers are served from it and definitive results written back.
+    ``on_request`` is called after every API request with its outcome (the
+    API status, or "timeout"/"error") and duration in seconds.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        cache: Optional[GeocodeCache] = None,
+        concurrency: int = 8,
+        timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        url: str = GEOCODE_URL,
+        on_request: Optional[Callable[[str, float], None]] = None,
+    ):
+        self.api_key = api_key
+        self.cache = cache
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.url = url
+        self.on_request = on_request
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+        # Outbound requests made to the geocoding API
+        self.calls = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.concurrency),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _record(self, outcome: str, started: float):
+        if self.on_request:
+            self.on_request(outcome, time.perf_counter() - started)
+
+    def _backoff(self, attempt: int) -> float:
+        return self.backoff_base * (2 ** attempt) * (1 + random.random() / 2)
+
+    async def _fetch(self, place_name: str) -> Tuple[bool, Optional[Dict]]:
+        """Query the API; returns ``(definitive, location)`` where
+        ``definitive`` is False for transient failures that must not be cached"""
+        api_key = self.api_key or os.environ.get('GOOGLE_MAPS_KEY')
+        if not api_key:
+            logger.error("GOOGLE_MAPS_KEY not found in environment")
+            return False, None
+
+        params = {
+            "address": geocode_query(place_name),
+            "key": api_key
+        }
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    self.calls += 1
+                    started = time.perf_counter()
+                    response = await self.client.get(self.url, params=params)
+                data = response.json()
+            except httpx.TimeoutException:
+                self._record("timeout", started)
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+                logger.error(f"Geocoding timed out for '{place_name}'")
+                return False, None
+            except Exception as e:
+                self._record("error", started)
+                logger.error(f"Geocoding error for '{place_name}': {str(e)}")
+                return False, None
+
+            status = data.get('status')
+            self._record(status or f"http_{response.status_code}", started)
+            if status == 'OK' and len(data.get('results', [])) > 0:
+                location = data['results'][0]['geometry']['location']
+                return True, {
+                    'lat': location['lat'],
+                    'lng': location['lng']
+                }
+            if status == 'OVER_QUERY_LIMIT' and attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            logger.warning(f"Geocoding failed for '{place_name}': {status}")
+            return status in ('OK', 'ZERO_RESULTS'), None
+        return False, None
+
+    async def _geocode_uncached(self, place_name: str) -> Optional[Dict]:
+        definitive, location = await self._fetch(place_name)
+        if self.cache is not None and definitive:
+            await self.cache.set(place_name, location)
+        return location
+
+    async def geocode(self, place_name: str) -> Optional[Dict]:
+        """Geocode a place name in Ilhéus, returning ``{'lat', 'lng'}`` or None"""
+        return (await self.geocode_many([place_name]))[place_name]
+
+    async def geocode_many(
+        self,
+        place_names: Iterable[str],
+        on_result: Optional[Callable[[str, Optional[Dict]], None]] = None,
+    ) -> Dict[str, Optional[Dict]]:
+        """Geocode several place names concurrently, keyed by place name.
+
+        ``on_result`` is called with each name and its location (None when it
+        could not be geocoded) as soon as it is known, for progress reporting.
+        """
+        names = list(dict.fromkeys(place_names))
+        results = {}
+        if self.cache is not None:
+            results = await self.cache.get_many(names)
+            names = [name for name in names if name not in results]
+            if on_result:
+                for name, location in results.items():
+                    on_result(name, location)
+
+        async def resolve(name):
+            location = await self._geocode_uncached(name)
+            if on_result:
+                on_result(name, location)
+            return location
+
+        locations = await asyncio.gather(*(resolve(name) for name in names))
+        results.update(zip(names, locations))
+        return results
+
+
+def geocoder_from_env(cache: Optional[GeocodeCache] = None,
+                      on_request: Optional[Callable[[str, float], None]] = None) -> Geocoder:
+    return Geocoder(
+        cache=cache,
+        on_request=on_request,
+        concurrency=int(os.environ.get('GEOCODE_CONCURRENCY', '8')),
+        timeout=float(os.environ.get('GEOCODE_TIMEOUT', '10')),
+        max_retries=int(os.environ.get('GEOCODE_MAX_RETRIES', '3')),
+    )
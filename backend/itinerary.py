@@ -0,0 +1,206 @@
+import random
+import time
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from spatial import EARTH_RADIUS
+
+
+# Largest number of stops solved exactly; Held-Karp grows as 2^n * n^2
+EXACT_LIMIT = 12
+
+
+def distance_matrix(lats: Sequence[float], lngs: Sequence[float]) -> np.ndarray:
+    """Great-circle distances in meters between every pair of points"""
+    phi = np.radians(np.asarray(lats, dtype=np.float64))
+    lam = np.radians(np.asarray(lngs, dtype=np.float64))
+    dphi = phi[:, None] - phi[None, :]
+    dlam = lam[:, None] - lam[None, :]
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi[:, None]) * np.cos(phi[None, :]) * np.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def route_length(matrix: np.ndarray, order: Sequence[int], round_trip: bool = False) -> float:
+    """Length of the walk from node 0 through ``order`` (and back with ``round_trip``)"""
+    nodes = [0, *order] + ([0] if round_trip else [])
+    return float(sum(matrix[a, b] for a, b in zip(nodes, nodes[1:])))
+
+
+def stops_within(matrix: np.ndarray, order: Sequence[int], max_length: float, round_trip: bool = False) -> int:
+    """How many stops of ``order`` a walk of at most ``max_length`` reaches
+    (getting back to node 0 afterwards with ``round_trip``)"""
+    walked, previous = 0.0, 0
+    for count, node in enumerate(order):
+        walked += matrix[previous, node]
+        # The way back is never shorter by going on, so the first miss ends it
+        if walked + (matrix[node, 0] if round_trip else 0.0) > max_length:
+            return count
+        previous = node
+    return len(order)
+
+
+def held_karp(matrix: np.ndarray, round_trip: bool = False) -> List[int]:
+    """Shortest order to visit nodes 1..n starting from node 0, exactly.
+
+    The dynamic program keeps, for every subset of stops and every stop
+    ending it, the shortest walk from the start through that subset. Subsets
+    are processed by size and each (size, last stop) step is one numpy
+    operation, so 12 stops take a few milliseconds.
+    """
+    n = len(matrix) - 1
+    if n <= 1:
+        return list(range(1, n + 1))
+    between = matrix[1:, 1:]
+    size = 1 << n
+    cost = np.full((size, n), np.inf)
+    parent = np.full((size, n), -1, dtype=np.int8)
+    stops = np.arange(n)
+    cost[1 << stops, stops] = matrix[0, 1:]
+
+    masks = np.arange(size)
+    popcount = np.zeros(size, dtype=np.int8)
+    for stop in range(n):
+        popcount += (masks >> stop) & 1
+    for count in range(2, n + 1):
+        subsets = masks[popcount == count]
+        for last in range(n):
+            ending = subsets[(subsets >> last) & 1 == 1]
+            # Walks through the subset without `last`, then on to `last`
+            totals = cost[ending ^ (1 << last)] + between[:, last]
+            best = totals.argmin(axis=1)
+            cost[ending, last] = totals[np.arange(len(ending)), best]
+            parent[ending, last] = best
+
+    full = size - 1
+    totals = cost[full] + (matrix[1:, 0] if round_trip else 0.0)
+    last = int(totals.argmin())
+    order = []
+    mask = full
+    while last >= 0:
+        order.append(last + 1)
+        mask, last = mask ^ (1 << last), int(parent[mask, last])
+    return order[::-1]
+
+
+def _nearest_neighbour(dist: List[List[float]], n: int) -> List[int]:
+    order = []
+    unvisited = set(range(1, n + 1))
+    current = 0
+    while unvisited:
+        current = min(unvisited, key=dist[current].__getitem__)
+        unvisited.remove(current)
+        order.append(current)
+    return order
+
+
+def _two_opt(dist: List[List[float]], route: List[int], deadline: float) -> bool:
+    """Reverse segments while that shortens the route; returns whether it changed"""
+    improved = False
+    last = len(route) - 2
+    for i in range(1, last):
+        if time.perf_counter() > deadline:
+            break
+        for j in range(i + 1, last + 1):
+            a, b, c, d = route[i - 1], route[i], route[j], route[j + 1]
+            if dist[a][c] + dist[b][d] < dist[a][b] + dist[c][d] - 1e-7:
+                route[i:j + 1] = route[j:i - 1:-1]
+                improved = True
+    return improved
+
+
+def _or_opt(dist: List[List[float]], route: List[int], deadline: float) -> bool:
+    """Move runs of up to three stops elsewhere (possibly reversed) while that
+    shortens the route; returns whether it changed"""
+    improved = False
+    last = len(route) - 2
+    for length in (1, 2, 3):
+        i = 1
+        while i + length - 1 <= last:
+            if time.perf_counter() > deadline:
+                return improved
+            first, end = route[i], route[i + length - 1]
+            before, after = route[i - 1], route[i + length]
+            gain = dist[before][first] + dist[end][after] - dist[before][after]
+            best, target, flip = 1e-7, None, False
+            for k in range(len(route) - 1):
+                if i - 1 <= k <= i + length - 1:
+                    continue
+                p, q = route[k], route[k + 1]
+                forward = dist[p][first] + dist[end][q] - dist[p][q]
+                backward = dist[p][end] + dist[first][q] - dist[p][q]
+                if gain - forward > best:
+                    best, target, flip = gain - forward, k, False
+                if gain - backward > best:
+                    best, target, flip = gain - backward, k, True
+            if target is None:
+                i += 1
+                continue
+            segment = route[i:i + length]
+            if flip:
+                segment.reverse()
+            del route[i:i + length]
+            if target > i:
+                target -= length
+            route[target + 1:target + 1] = segment
+            improved = True
+    return improved
+
+
+def _local_search(dist: List[List[float]], route: List[int], deadline: float):
+    while time.perf_counter() < deadline:
+        changed = _two_opt(dist, route, deadline)
+        changed = _or_opt(dist, route, deadline) or changed
+        if not changed:
+            break
+
+
+def _length(dist: List[List[float]], route: List[int]) -> float:
+    return sum(dist[a][b] for a, b in zip(route, route[1:]))
+
+
+def improve_route(matrix: np.ndarray, round_trip: bool = False, time_budget: float = 0.025,
+                  patience: int = 20, seed: int = 0) -> List[int]:
+    """Short order to visit nodes 1..n from node 0 within ``time_budget`` seconds.
+
+    Starts from the nearest-neighbour walk and applies 2-opt and or-opt
+    moves until neither helps. Any time left goes to iterated local search:
+    the best route is perturbed with a random double-bridge move and
+    re-optimized, stopping after ``patience`` perturbations in a row bring
+    no improvement.
+    """
+    deadline = time.perf_counter() + time_budget
+    n = len(matrix) - 1
+    # A last node closes the route: the start again, or a free end at no cost
+    dist = np.zeros((n + 2, n + 2))
+    dist[:n + 1, :n + 1] = matrix
+    if round_trip:
+        dist[:n + 1, n + 1] = matrix[:, 0]
+    dist = dist.tolist()
+
+    route = [0, *_nearest_neighbour(dist, n), n + 1]
+    _local_search(dist, route, deadline)
+    if n < 4:
+        return route[1:-1]
+
+    rng = random.Random(seed)
+    best, best_length = route, _length(dist, route)
+    stale = 0
+    while stale < patience and time.perf_counter() < deadline:
+        a, b, c = sorted(rng.sample(range(1, n + 1), 3))
+        candidate = best[:a] + best[c:-1] + best[b:c] + best[a:b] + best[-1:]
+        _local_search(dist, candidate, deadline)
+        length = _length(dist, candidate)
+        if length < best_length - 1e-7:
+            best, best_length, stale = candidate, length, 0
+        else:
+            stale += 1
+    return best[1:-1]
+
+
+def plan_route(matrix: np.ndarray, round_trip: bool = False, time_budget: float = 0.025,
+               exact_limit: int = EXACT_LIMIT) -> Tuple[List[int], bool]:
+    """Visiting order of nodes 1..n from node 0 and whether it is proven shortest"""
+    if len(matrix) - 1 <= exact_limit:
+        return held_karp(matrix, round_trip), True
+    return improve_route(matrix, round_trip, time_budget), False
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple, TypeVar
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Job:
+    """Progress handle passed to a running job's work function.
+
+    ``stage`` starts a named stage (timing the previous one), ``advance``
+    counts processed items and ``error`` records an item that failed. The
+    calls only touch memory; the runner writes progress to MongoDB every
+    ``progress_interval`` seconds, so per-row updates are cheap.
+
+    Stages follow each other; steps measure work that interleaves within a
+    stage, such as download, parse and geocode in a streamed sync. Time is
+    charged to the innermost step running, so nested steps do not count
+    twice (see ``timed``).
+    """
+
+    def __init__(self, job_id: str, kind: str):
+        self.id = job_id
+        self.kind = kind
+        self.progress = {"stage": None, "processed": 0, "total": None}
+        self.errors: List[str] = []
+        self.timings: Dict[str, float] = {}
+        self.steps: Dict[str, float] = {}
+        self._stage_started: Optional[float] = None
+        self._running_steps: List[str] = []
+        self._step_started = 0.0
+        self.dirty = False
+
+    def stage(self, name: str, total: Optional[int] = None):
+        self._finish_stage()
+        self.progress = {"stage": name, "processed": 0, "total": total}
+        self._stage_started = time.perf_counter()
+        self.dirty = True
+
+    def advance(self, count: int = 1):
+        self.progress["processed"] += count
+        self.dirty = True
+
+    def error(self, item: str):
+        self.errors.append(item)
+        self.dirty = True
+
+    def _charge_step(self):
+        now = time.perf_counter()
+        if self._running_steps:
+            step = self._running_steps[-1]
+            self.steps[step] = self.steps.get(step, 0.0) + now - self._step_started
+        self._step_started = now
+
+    @contextmanager
+    def step(self, name: str):
+        """Charge the time spent in the block to step ``name``"""
+        self._charge_step()
+        self._running_steps.append(name)
+        try:
+            yield
+        finally:
+            self._charge_step()
+            self._running_steps.pop()
+
+    def _finish_stage(self):
+        if self._stage_started is not None:
+            elapsed = (time.perf_counter() - self._stage_started) * 1000
+            self.timings[self.progress["stage"]] = round(elapsed, 1)
+            self._stage_started = None
+
+    def snapshot(self) -> Dict:
+        return {
+            "progress": dict(self.progress),
+            "errors": list(self.errors),
+            "timings_ms": dict(self.timings),
+            "steps_ms": {step: round(seconds * 1000, 1) for step, seconds in self.steps.items()},
+        }
+
+
+async def timed(items: AsyncIterable[T], job: Job, step: str) -> AsyncIterator[T]:
+    """Pass ``items`` through, charging the time spent producing each one to ``step``"""
+    iterator = items.__aiter__()
+    while True:
+        with job.step(step):
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+        yield item
+
+
+class JobRunner:
+    """Admin operations run as background tasks, tracked in the ``jobs`` collection.
+
+    Only one job of each kind runs at a time across workers: ``submit`` takes a
+    lease on a ``job_locks`` document keyed by the kind, and while it is held,
+    submitting the same kind again returns the running job instead of starting
+    another one. The lease is renewed with every progress write and expires
+    after ``lease`` if the worker holding it dies. Finished jobs are purged
+    ``retention`` after they finish.
+    """
+
+    def __init__(self, db, lease: timedelta = timedelta(minutes=5),
+                 retention: timedelta = timedelta(days=7), progress_interval: float = 0.5,
+                 on_finish: Optional[Callable[[Job, str], None]] = None):
+        self.jobs = db.jobs
+        self.locks = db.job_locks
+        self.lease = lease
+        self.retention = retention
+        self.progress_interval = progress_interval
+        # Called with each finished job and its final status, e.g. for metrics
+        self.on_finish = on_finish
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def ensure_indexes(self):
+        await self.jobs.create_index("finished_at", expireAfterSeconds=int(self.retention.total_seconds()))
+        await self.jobs.create_index([("kind", 1), ("created_at", -1)])
+
+    async def _acquire(self, kind: str, job_id: str) -> Optional[str]:
+        """Take the lock for ``kind``; returns the holder's job id when busy"""
+        now = datetime.now(timezone.utc)
+        try:
+            await self.locks.insert_one({"_id": kind, "job_id": job_id, "expires_at": now + self.lease})
+            return None
+        except DuplicateKeyError:
+            pass
+        # Take over a lease left behind by a worker that died
+        taken = await self.locks.find_one_and_update(
+            {"_id": kind, "expires_at": {"$lte": now}},
+            {"$set": {"job_id": job_id, "expires_at": now + self.lease}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if taken is not None:
+            return None
+        holder = await self.locks.find_one({"_id": kind})
+        return holder['job_id'] if holder else await self._acquire(kind, job_id)
+
+    async def submit(self, kind: str, work: Callable[[Job], Awaitable[Dict]],
+                     params: Optional[Dict] = None) -> Tuple[Dict, bool]:
+        """Start ``work`` as a job of ``kind``.
+
+        Returns the job document and whether it was created by this call
+        (False when a job of the same kind was already running).
+        """
+        job_id = str(uuid.uuid4())
+        holder = await self._acquire(kind, job_id)
+        if holder is not None:
+            # The holder may not have written its job document yet
+            running = await self.get(holder)
+            return running or {"id": holder, "kind": kind, "status": "running"}, False
+
+        now = datetime.now(timezone.utc)
+        document = {
+            "_id": job_id,
+            "kind": kind,
+            "params": params or {},
+            "status": "running",
+            "progress": {"stage": "queued", "processed": 0, "total": None},
+            "errors": [],
+            "timings_ms": {},
+            "steps_ms": {},
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "started_at": now,
+            "finished_at": None,
+        }
+        await self.jobs.insert_one(document)
+        task = asyncio.create_task(self._run(Job(job_id, kind), work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return self._public(document), True
+
+    async def _write_progress(self, job: Job):
+        job.dirty = False
+        await self.jobs.update_one({"_id": job.id}, {"$set": job.snapshot()})
+        await self.locks.update_one(
+            {"_id": job.kind, "job_id": job.id},
+            {"$set": {"expires_at": datetime.now(timezone.utc) + self.lease}},
+        )
+
+    async def _report(self, job: Job):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            if job.dirty:
+                try:
+                    await self._write_progress(job)
+                except Exception as e:
+                    logger.warning(f"Could not record progress of job {job.id}: {str(e)}")
+
+    async def _run(self, job: Job, work: Callable[[Job], Awaitable[Dict]]):
+        reporter = asyncio.create_task(self._report(job))
+        started = time.perf_counter()
+        update = {}
+        try:
+            result = await work(job)
+            update = {"status": "succeeded", "result": result}
+        except asyncio.CancelledError:
+            update = {"status": "failed", "error": "Cancelled"}
+            raise
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.kind}) failed: {str(e)}")
+            update = {"status": "failed", "error": str(e)}
+        finally:
+            reporter.cancel()
+            job._finish_stage()
+            job.timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+            update.update(job.snapshot(), finished_at=datetime.now(timezone.utc))
+            if self.on_finish:
+                try:
+                    self.on_finish(job, update["status"])
+                except Exception as e:
+                    logger.warning(f"Finish callback failed for job {job.id}: {str(e)}")
+            await self.jobs.update_one({"_id": job.id}, {"$set": update})
+            await self.locks.delete_one({"_id": job.kind, "job_id": job.id})
+            logger.info(f"Job {job.id} ({job.kind}) {update['status']} in {job.timings['total']:.0f}ms")
+
+    @staticmethod
+    def _public(document: Dict) -> Dict:
+        document = dict(document)
+        document["id"] = document.pop("_id")
+        return document
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        document = await self.jobs.find_one({"_id": job_id})
+        return self._public(document) if document else None
+
+    async def list(self, kind: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        query = {"kind": kind} if kind else {}
+        documents = await self.jobs.find(query, {"params": 0}).sort("created_at", -1).to_list(limit)
+        return [self._public(document) for document in documents]
+
+    async def wait(self):
+        """Wait for the jobs started by this process to finish"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await self.wait()
@@ -0,0 +1,78 @@
+import json
+from typing import Dict, List, Optional
+
+try:
+    import msgpack
+except ImportError:  # MessagePack responses are offered only when msgpack is installed
+    msgpack = None
+
+
+MAPS_URL_PREFIX = "https://www.google.com/maps/search/?api=1&query="
+
+COLUMNS_MEDIA_TYPE = "application/vnd.ilheus.columns+json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+MEDIA_TYPES = {
+    "columns": COLUMNS_MEDIA_TYPE,
+    "msgpack": MSGPACK_MEDIA_TYPE,
+}
+
+
+def negotiate(accept: Optional[str], format: Optional[str] = None) -> Optional[str]:
+    """Compact format requested by `format=` or the Accept header, if any"""
+    if format in MEDIA_TYPES:
+        return format if format != "msgpack" or msgpack else None
+    accept = accept or ""
+    if msgpack and (MSGPACK_MEDIA_TYPE in accept or "application/x-msgpack" in accept):
+        return "msgpack"
+    if COLUMNS_MEDIA_TYPE in accept:
+        return "columns"
+    return None
+
+
+def to_columns(markers: List[Dict], fields: List[str]) -> Dict:
+    """Column-oriented layout of a marker list.
+
+    Field names appear once, `layer_id` is dictionary-encoded as an index into
+    `layers`, and Google Maps URLs sharing `url_prefix` keep only their
+    (percent-encoded, so never containing "://") suffix.
+    """
+    layers: Dict[str, int] = {}
+    columns: Dict[str, list] = {field: [] for field in fields}
+    for marker in markers:
+        for field in fields:
+            value = marker.get(field)
+            if field == "layer_id":
+                value = layers.setdefault(value, len(layers))
+            elif field == "google_maps_url" and value and value.startswith(MAPS_URL_PREFIX):
+                value = value[len(MAPS_URL_PREFIX):]
+            columns[field].append(value)
+    return {
+        "count": len(markers),
+        "layers": list(layers),
+        "url_prefix": MAPS_URL_PREFIX,
+        "columns": columns,
+    }
+
+
+def from_columns(payload: Dict) -> List[Dict]:
+    """Rebuild marker dicts from `to_columns` output"""
+    columns = payload["columns"]
+    layers = payload["layers"]
+    markers = []
+    for i in range(payload["count"]):
+        marker = {field: values[i] for field, values in columns.items()}
+        if "layer_id" in marker:
+            marker["layer_id"] = layers[marker["layer_id"]]
+        url = marker.get("google_maps_url")
+        if url and "://" not in url:
+            marker["google_maps_url"] = payload["url_prefix"] + url
+        markers.append(marker)
+    return markers
+
+
+def encode(markers: List[Dict], fields: List[str], format: str) -> bytes:
+    payload = to_columns(markers, fields)
+    if format == "msgpack":
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
@@ -0,0 +1,247 @@
+import bisect
+import functools
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from pymongo import monitoring
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+# Seconds; finer than Prometheus' defaults at the low end, where most routes are
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            for labels, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative ``le`` buckets, with their sum.
+
+    ``observe`` is a bisect and three additions under a lock (observations
+    may come from Motor's threads), so it is cheap enough for every request.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (last one is +Inf), sum, count]
+        self._series: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            snapshot = [(labels, list(series[0]), series[1], series[2])
+                        for labels, series in sorted(self._series.items())]
+        bounds = [f'le="{_number(bound)}"' for bound in self.buckets + (float("inf"),)]
+        for labels, counts, total, count in snapshot:
+            label_text = _labels(self.labelnames, labels)
+            prefix = f"{self.name}_bucket{label_text[:-1]}," if label_text else f"{self.name}_bucket{{"
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                lines.append(f"{prefix}{bound}}} {cumulative}")
+            lines.append(f"{self.name}_sum{label_text} {_number(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class Collected(_Metric):
+    """A counter or gauge whose values are read from ``collect`` at scrape time,
+    for statistics other objects already keep (cache hits, versions...)"""
+
+    def __init__(self, name: str, documentation: str, kind: str,
+                 collect: Callable[[], Iterable[Tuple[Tuple, float]]], labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            for labels, value in self.collect()
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def collected(self, name: str, documentation: str, kind: str,
+                  collect: Callable[[], Iterable[Tuple[Tuple, float]]],
+                  labelnames: Sequence[str] = ()) -> Collected:
+        return self.register(Collected(name, documentation, kind, collect, labelnames))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Times every HTTP request into ``histogram`` by method, route and status.
+
+    The route is the matched path template (``/api/markers/{marker_id}/nearby``)
+    so label values stay few; requests matching no route share one label.
+    Time runs until the last body chunk is sent, so streamed responses
+    count in full.
+    """
+
+    def __init__(self, app: ASGIApp, histogram: Histogram):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_timed(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            route = scope.get("route")
+            self.histogram.observe(
+                time.perf_counter() - started,
+                scope["method"], getattr(route, "path", "unmatched"), str(status),
+            )
+
+
+# Dataset versions live in collections like markers_v12_3fa2c1d0
+VERSIONED_COLLECTION_RE = re.compile(r"_v\d+_[0-9a-f]{8}$")
+
+
+@functools.lru_cache(maxsize=256)
+def dataset_name(collection: str) -> str:
+    """A collection's name with any dataset version suffix removed (bounded
+    memo, since every published version is a new collection name)"""
+    return VERSIONED_COLLECTION_RE.sub("", collection)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """pymongo command listener timing commands by collection and command name.
+
+    Versioned dataset collections are reported under the dataset's name.
+    Command names and collections are taken from the started event and
+    matched to its outcome by request id.
+    """
+
+    def __init__(self, durations: Histogram, failures: Counter):
+        self.durations = durations
+        self.failures = failures
+        self._pending: Dict[Tuple, Tuple[str, str]] = {}
+
+    def _collection(self, event: monitoring.CommandStartedEvent) -> str:
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        if not isinstance(target, str):
+            return "-"
+        return dataset_name(target)
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        self._pending[(event.connection_id, event.request_id)] = (self._collection(event), event.command_name)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        labels = self._pending.pop((event.connection_id, event.request_id), None)
+        if labels is not None:
+            self.durations.observe(event.duration_micros / 1e6, *labels)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        labels = self._pending.pop((event.connection_id, event.request_id), None)
+        if labels is not None:
+            self.durations.observe(event.duration_micros / 1e6, *labels)
+            self.failures.inc(*labels)
+
+
+def ratio(hits: float, misses: float) -> float:
+    total = hits + misses
+    return hits / total if total else 0.0
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+
+logger = logging.getLogger(__name__)
+
+
+class MigrationRegistry:
+    """Ordered, run-once data migrations recorded in the ``migrations`` collection.
+
+    Migrations are registered with the ``migration`` decorator under a
+    sortable id (``"0001_seed_sample_data"``) and ``run`` applies the ones
+    that have no record yet, in id order. A worker claims a migration by
+    inserting its record, so concurrent boots apply each migration once;
+    a failed migration releases its claim and stops the run. Once everything
+    is applied, booting costs a single ``find`` on ``migrations``.
+
+    A worker that finds a migration claimed by another waits for it to be
+    applied before going on, since later migrations may rely on it. Claims
+    hold a ``claimed_until`` lease, renewed while the migration runs, so the
+    claim of a worker that died mid-migration is taken over once it lapses.
+    """
+
+    def __init__(self, collection_name: str = "migrations", lease: timedelta = timedelta(minutes=5),
+                 poll_interval: float = 1.0):
+        self.collection_name = collection_name
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._migrations: Dict[str, Tuple[str, Callable[[], Awaitable[None]]]] = {}
+
+    def migration(self, migration_id: str, description: str = ""):
+        """Register the decorated coroutine function as a migration"""
+        def register(function: Callable[[], Awaitable[None]]):
+            if migration_id in self._migrations:
+                raise ValueError(f"Duplicate migration id {migration_id}")
+            self._migrations[migration_id] = (description or (function.__doc__ or "").strip(), function)
+            return function
+        return register
+
+    @property
+    def ids(self) -> List[str]:
+        return sorted(self._migrations)
+
+    async def applied(self, db) -> Dict[str, Dict]:
+        records = await db[self.collection_name].find({}).to_list(None)
+        return {record['_id']: record for record in records}
+
+    async def _claim(self, collection, migration_id: str, description: str) -> bool:
+        """Claim a migration, waiting while another worker holds it; False
+        when that worker applied it meanwhile"""
+        while True:
+            now = datetime.now(timezone.utc)
+            claim = {"status": "running", "started_at": now, "claimed_until": now + self.lease}
+            try:
+                await collection.insert_one({"_id": migration_id, "description": description, **claim})
+                return True
+            except DuplicateKeyError:
+                pass
+            record = await collection.find_one({"_id": migration_id})
+            if record is None:
+                # Released by a failed attempt; claim it again
+                continue
+            if record['status'] == "applied":
+                return False
+            claimed_until: Optional[datetime] = record.get('claimed_until')
+            if claimed_until is not None and claimed_until.tzinfo is None:
+                claimed_until = claimed_until.replace(tzinfo=timezone.utc)
+            if claimed_until is None or claimed_until <= now:
+                taken = await collection.update_one(
+                    {"_id": migration_id, "status": "running", "claimed_until": record.get('claimed_until')},
+                    {"$set": claim},
+                )
+                if taken.modified_count:
+                    logger.warning(f"Took over migration {migration_id} from a worker whose claim lapsed")
+                    return True
+                continue
+            logger.info(f"Waiting for migration {migration_id}, being applied by another worker")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _renew(self, collection, migration_id: str):
+        """Extend the claim's lease while the migration runs"""
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            await collection.update_one(
+                {"_id": migration_id, "status": "running"},
+                {"$set": {"claimed_until": datetime.now(timezone.utc) + self.lease}},
+            )
+
+    async def run(self, db) -> List[str]:
+        """Apply pending migrations in order; returns the ids applied here"""
+        collection = db[self.collection_name]
+        applied = await self.applied(db)
+        ran = []
+        for migration_id in self.ids:
+            if applied.get(migration_id, {}).get('status') == "applied":
+                continue
+            description, function = self._migrations[migration_id]
+            if not await self._claim(collection, migration_id, description):
+                continue
+
+            started = time.perf_counter()
+            renewal = asyncio.create_task(self._renew(collection, migration_id))
+            try:
+                await function()
+            except Exception as e:
+                await collection.delete_one({"_id": migration_id})
+                logger.error(f"Migration {migration_id} failed: {str(e)}")
+                raise
+            finally:
+                renewal.cancel()
+            duration_ms = (time.perf_counter() - started) * 1000
+            await collection.update_one(
+                {"_id": migration_id},
+                {"$set": {
+                    "status": "applied",
+                    "applied_at": datetime.now(timezone.utc),
+                    "duration_ms": round(duration_ms, 1),
+                }, "$unset": {"claimed_until": ""}},
+            )
+            logger.info(f"Applied migration {migration_id} in {duration_ms:.0f}ms")
+            ran.append(migration_id)
+        return ran
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+from cachetools import LRUCache
+
+from compression import compress
+
+
+logger = logging.getLogger(__name__)
+
+
+class CachedBody:
+    """A serialized body, its strong ETag and lazily compressed variants"""
+
+    __slots__ = ("body", "etag", "_encoded")
+
+    def __init__(self, body: bytes, etag: str):
+        self.body = body
+        self.etag = etag
+        self._encoded: Dict[str, bytes] = {}
+
+    @classmethod
+    def from_body(cls, body: bytes) -> "CachedBody":
+        """Wrap a body with a strong ETag derived from its content"""
+        return cls(body, '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"')
+
+    def encoded(self, encoding: str) -> bytes:
+        """The body compressed with `encoding`, computed once per entry"""
+        body = self._encoded.get(encoding)
+        if body is None:
+            body = self._encoded[encoding] = compress(self.body, encoding)
+        return body
+
+    def encoded_etag(self, encoding: str) -> str:
+        # Each representation needs its own strong validator
+        return f'{self.etag[:-1]}-{encoding}"'
+
+
+class ResponseCache:
+    """Pre-serialized response bodies kept in process memory.
+
+    Bodies are built once per key by ``get`` and then served as bytes without
+    touching MongoDB or Pydantic. Concurrent misses on the same key share a
+    single build, and the body's ETag is computed once alongside it.
+    ``invalidate`` drops entries; a build that was in flight when the cache
+    was invalidated is returned but not stored.
+    """
+
+    def __init__(self, maxsize: int = 256, enabled: bool = True):
+        self.enabled = enabled
+        self._entries = LRUCache(maxsize=maxsize)
+        self._building: Dict[str, asyncio.Future] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str, build: Callable[[], Awaitable[bytes]]) -> CachedBody:
+        if not self.enabled:
+            return CachedBody.from_body(await build())
+
+        body = self._entries.get(key)
+        if body is not None:
+            self.hits += 1
+            return body
+
+        self.misses += 1
+        pending = self._building.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        generation = self._generation
+        pending = asyncio.get_running_loop().create_future()
+        self._building[key] = pending
+        try:
+            body = CachedBody.from_body(await build())
+        except Exception as e:
+            pending.set_exception(e)
+            # Retrieve it so waiter-less failures are not logged as unhandled
+            pending.exception()
+            raise
+        else:
+            pending.set_result(body)
+            if generation == self._generation:
+                self._entries[key] = body
+            return body
+        finally:
+            del self._building[key]
+
+    def put(self, key: str, body: bytes) -> CachedBody:
+        """Store a body built ahead of any request (e.g. pre-rendered in bulk)"""
+        cached = CachedBody.from_body(body)
+        if self.enabled:
+            self._entries[key] = cached
+        return cached
+
+    def invalidate(self, prefix: Optional[str] = None):
+        """Drop every entry, or only those whose key starts with ``prefix``"""
+        self._generation += 1
+        if prefix is None:
+            self._entries.clear()
+        else:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,297 @@
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Fields searched, in every language, and the weight of a match in each
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "name_en": 3.0,
+    "name_es": 3.0,
+    "description": 1.0,
+    "description_en": 1.0,
+    "description_es": 1.0,
+}
+
+EARTH_RADIUS = 6371008.8
+
+
+def fold(text: str) -> str:
+    """Case- and accent-insensitive form of a text ("Ilhéus" -> "ilheus")"""
+    if text.isascii():
+        return text.casefold()
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_RE.findall(fold(text)) if text else []
+
+
+def trigrams(term: str) -> Set[str]:
+    padded = f"^{term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def haversine(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Great-circle distances in meters from one point to arrays of points"""
+    phi1, phi2 = math.radians(lat), np.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lngs - lng)
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+class SearchIndex:
+    """In-memory inverted index over marker names and descriptions.
+
+    Terms are folded (case and accents removed) and indexed from every
+    language's fields, a name match weighing more than a description match.
+    Query terms match indexed terms exactly, by prefix (so results show up
+    while typing) and, when a term is not in the vocabulary, by trigram
+    similarity to absorb typos. Scores are tf-idf style sums; with a
+    ``near`` point they are blended with a distance decay of ``near_scale``
+    meters.
+
+    Markers live in numbered slots. Postings are kept as dicts, so
+    ``update`` re-indexes only the markers that changed, and are turned
+    into numpy arrays on first use, so scoring a term found in tens of
+    thousands of markers stays a handful of vector operations.
+    """
+
+    def __init__(self, markers: Iterable[Dict] = (), near_scale: float = 2000.0,
+                 fuzzy_threshold: float = 0.4, max_expansions: int = 30, max_fuzzy: int = 5):
+        self.near_scale = near_scale
+        self.fuzzy_threshold = fuzzy_threshold
+        self.max_expansions = max_expansions
+        self.max_fuzzy = max_fuzzy
+        self.markers: Dict[str, Dict] = {}
+        self._slots: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._free: List[int] = []
+        self._lat = np.zeros(0)
+        self._lng = np.zeros(0)
+        self._layer = np.zeros(0, dtype=np.int32)
+        self._layer_codes: Dict[str, int] = {}
+        self._terms: Dict[str, Dict[str, float]] = {}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._vocabulary: List[str] = []
+        self._trigrams: Dict[str, Set[str]] = {}
+        self.apply([], list(markers))
+
+    def __len__(self) -> int:
+        return len(self.markers)
+
+    @staticmethod
+    def _document_terms(marker: Dict) -> Dict[str, float]:
+        terms: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(marker.get(field)):
+                if terms.get(term, 0.0) < weight:
+                    terms[term] = weight
+        return terms
+
+    @staticmethod
+    def _indexed_fields(marker: Dict) -> Tuple:
+        return tuple(marker.get(field) for field in FIELD_WEIGHTS) + (
+            marker.get("lat"), marker.get("lng"), marker.get("layer_id"),
+        )
+
+    def _reserve(self, count: int):
+        needed = len(self._ids) - len(self._free) + count
+        if needed > len(self._lat):
+            capacity = max(needed, 2 * len(self._lat), 64)
+            for name in ("_lat", "_lng", "_layer"):
+                array = getattr(self, name)
+                grown = np.zeros(capacity, dtype=array.dtype)
+                grown[:len(array)] = array
+                setattr(self, name, grown)
+
+    def _add(self, marker: Dict, sort_later: bool):
+        marker_id = marker["id"]
+        slot = self._free.pop() if self._free else len(self._ids)
+        if slot == len(self._ids):
+            self._ids.append(marker_id)
+        else:
+            self._ids[slot] = marker_id
+        self._slots[marker_id] = slot
+        self.markers[marker_id] = marker
+        self._lat[slot] = marker["lat"]
+        self._lng[slot] = marker["lng"]
+        self._layer[slot] = self._layer_codes.setdefault(marker["layer_id"], len(self._layer_codes))
+
+        terms = self._terms[marker_id] = self._document_terms(marker)
+        for term, weight in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if len(term) >= 3 and not term.isdigit():
+                    for gram in trigrams(term):
+                        self._trigrams.setdefault(gram, set()).add(term)
+                if not sort_later:
+                    bisect.insort(self._vocabulary, term)
+            postings[slot] = weight
+            self._arrays.pop(term, None)
+
+    def _remove(self, marker_id: str):
+        self.markers.pop(marker_id)
+        slot = self._slots.pop(marker_id)
+        self._ids[slot] = None
+        self._free.append(slot)
+        for term in self._terms.pop(marker_id):
+            self._arrays.pop(term, None)
+            postings = self._postings[term]
+            del postings[slot]
+            if postings:
+                continue
+            del self._postings[term]
+            for gram in trigrams(term):
+                grams = self._trigrams.get(gram)
+                if grams is not None:
+                    grams.discard(term)
+                    if not grams:
+                        del self._trigrams[gram]
+            index = bisect.bisect_left(self._vocabulary, term)
+            if index < len(self._vocabulary) and self._vocabulary[index] == term:
+                del self._vocabulary[index]
+
+    def changes(self, markers: List[Dict]) -> Tuple[List[str], List[Dict]]:
+        """Ids to drop and markers to (re)index to match ``markers``.
+
+        Leaves the postings untouched, so it can run off the event loop while
+        queries are served; ``apply`` then makes the (small) change.
+        """
+        incoming = {marker["id"]: marker for marker in markers}
+        removed = [marker_id for marker_id in self.markers if marker_id not in incoming]
+        added = []
+        for marker_id, marker in incoming.items():
+            current = self.markers.get(marker_id)
+            if current is None:
+                added.append(marker)
+            elif self._indexed_fields(current) != self._indexed_fields(marker):
+                removed.append(marker_id)
+                added.append(marker)
+            else:
+                # Keep the latest copy for the fields that are not indexed
+                self.markers[marker_id] = marker
+        return removed, added
+
+    def apply(self, removed: List[str], added: List[Dict]):
+        for marker_id in removed:
+            self._remove(marker_id)
+        self._reserve(len(added))
+        # Inserting many new terms one by one is quadratic; sort once instead
+        sort_later = len(added) > 1000 or not self._vocabulary
+        for marker in added:
+            self._add(marker, sort_later)
+        if sort_later:
+            self._vocabulary = sorted(self._postings)
+
+    def update(self, markers: List[Dict]) -> int:
+        """Bring the index in line with ``markers``; returns how many changed"""
+        removed, added = self.changes(markers)
+        self.apply(removed, added)
+        return len(set(removed) | {marker["id"] for marker in added})
+
+    def _posting_arrays(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings[term]
+            arrays = self._arrays[term] = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float64, count=len(postings)),
+            )
+        return arrays
+
+    def _expand(self, token: str, last: bool) -> Dict[str, float]:
+        """Indexed terms matching a query token, with a match quality in (0, 1]"""
+        expansions = {}
+        if token in self._postings:
+            expansions[token] = 1.0
+        if len(token) >= 3 or last:
+            start = bisect.bisect_left(self._vocabulary, token)
+            for term in self._vocabulary[start:start + self.max_expansions]:
+                if not term.startswith(token):
+                    break
+                expansions.setdefault(term, 0.8)
+        if expansions or len(token) < 3 or token.isdigit():
+            return expansions
+
+        query_grams = trigrams(token)
+        overlap: Dict[str, int] = {}
+        for gram in query_grams:
+            for term in self._trigrams.get(gram, ()):
+                overlap[term] = overlap.get(term, 0) + 1
+        candidates = []
+        for term, shared in overlap.items():
+            similarity = 2 * shared / (len(query_grams) + len(term))
+            if similarity >= self.fuzzy_threshold:
+                candidates.append((similarity, term))
+        for similarity, term in heapq.nlargest(self.max_fuzzy, candidates):
+            expansions[term] = 0.7 * similarity
+        return expansions
+
+    def search(self, query: str, limit: int = 20, near: Optional[Tuple[float, float]] = None,
+               layers: Optional[Iterable[str]] = None) -> List[Tuple[Dict, float, Optional[float]]]:
+        """Best matches as ``(marker, score, distance_in_meters)`` tuples"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or not self.markers:
+            return []
+        size = len(self._ids)
+        total = len(self.markers)
+        scores = np.zeros(size)
+        matched = np.zeros(size)
+        for position, token in enumerate(tokens):
+            expansions = self._expand(token, position == len(tokens) - 1)
+            if not expansions:
+                continue
+            token_scores = np.zeros(size)
+            for term, quality in expansions.items():
+                slots, weights = self._posting_arrays(term)
+                factor = quality * math.log(1 + total / len(slots))
+                # A marker matching several expansions of a token counts the best one
+                token_scores[slots] = np.maximum(token_scores[slots], weights * factor)
+            scores += token_scores
+            matched += token_scores > 0
+
+        candidates = np.flatnonzero(scores)
+        if layers:
+            codes = [self._layer_codes[layer] for layer in layers if layer in self._layer_codes]
+            candidates = candidates[np.isin(self._layer[candidates], codes)]
+        if not len(candidates):
+            return []
+
+        # Markers matching every query term come first
+        ranked = scores[candidates] * (matched[candidates] / len(tokens)) ** 2
+        distances = None
+        if near is not None:
+            if len(candidates) > limit:
+                # The distance factor is within [0.5, 1], so markers scoring under
+                # half the limit-th best text score cannot make the results
+                kth = np.partition(ranked, len(ranked) - limit)[len(ranked) - limit]
+                keep = ranked >= 0.5 * kth
+                candidates, ranked = candidates[keep], ranked[keep]
+            distances = haversine(near[0], near[1], self._lat[candidates], self._lng[candidates])
+            ranked *= 0.5 + 0.5 * np.exp(-distances / self.near_scale)
+
+        if len(candidates) > limit:
+            best = np.argpartition(-ranked, limit)[:limit]
+        else:
+            best = np.arange(len(candidates))
+        best = best[np.argsort(-ranked[best], kind="stable")]
+        return [
+            (
+                self.markers[self._ids[candidates[i]]],
+                float(ranked[i]),
+                float(distances[i]) if distances is not None else None,
+            )
+            for i in best
+        ]
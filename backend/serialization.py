@@ -0,0 +1,59 @@
+from typing import Dict, Iterable, List, Type
+
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import PydanticUndefined, to_json
+
+
+class DocumentSerializer:
+    """JSON encoding of stored documents as one response model.
+
+    Documents are validated when they are written and stored in canonical
+    form (every model field present, defaults filled in), and reads project
+    them onto the model's fields. In the default fast mode they are then
+    encoded as they come, by pydantic-core's serializer, without building a
+    model instance per document. ``strict`` validates every document through
+    the model before encoding it, as a ``response_model`` would.
+    """
+
+    def __init__(self, model: Type[BaseModel], strict: bool = False):
+        self.model = model
+        self.strict = strict
+        self.adapter = TypeAdapter(model)
+        self.list_adapter = TypeAdapter(List[model])
+        self.fields = list(model.model_fields)
+        self._defaults = {
+            name: field.default for name, field in model.model_fields.items()
+            if field.default is not PydanticUndefined
+        }
+
+    @property
+    def projection(self) -> Dict:
+        """MongoDB projection reading exactly the model's fields"""
+        return {"_id": 0, **{field: 1 for field in self.fields}}
+
+    def select(self, document: Dict) -> Dict:
+        """The model's fields of a document that holds more (in-memory indexes)"""
+        defaults = self._defaults
+        return {
+            field: document[field] if field in document or field not in defaults else defaults[field]
+            for field in self.fields
+        }
+
+    def dump(self, document: Dict) -> bytes:
+        if self.strict:
+            return self.adapter.dump_json(self.adapter.validate_python(document))
+        return to_json(document)
+
+    def dump_list(self, documents: Iterable[Dict], select: bool = False) -> bytes:
+        """A JSON array of documents; ``select`` trims them to the model first"""
+        if self.strict:
+            return self.list_adapter.dump_json(self.list_adapter.validate_python(documents))
+        if select:
+            documents = [self.select(document) for document in documents]
+        return to_json(documents)
+
+    def to_python(self, documents: List[Dict]) -> List[Dict]:
+        """Documents as plain dicts for the compact encoders"""
+        if self.strict:
+            return self.list_adapter.dump_python(self.list_adapter.validate_python(documents))
+        return documents
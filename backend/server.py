@@ -1,4 +1,5 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -6,21 +7,86 @@ import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict
+from pydantic_core import PydanticUndefined, to_json
+from typing import AsyncIterator, List, Optional, Dict
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
-import requests
+import httpx
 import asyncio
+import hashlib
+import json
+import math
+from geocoding import GeocodeCache, geocoder_from_env
+from datasets import DatasetStore
+from response_cache import CachedBody, ResponseCache
+from compression import CompressionMiddleware, choose_encoding
+import marker_formats
+from clustering import ClusterIndex
+from search import SearchIndex
+from spatial import NearestIndex
+from itinerary import distance_matrix, plan_route, stops_within
+from migrations import MigrationRegistry
+from jobs import Job, JobRunner, timed
+from events import EventBus
+from metrics import CONTENT_TYPE, CommandMetrics, MetricsMiddleware, Registry, ratio
+from serialization import DocumentSerializer
+from sheet_ingest import batched, csv_records
+from snapshots import SnapshotStore
+from broadcast import Broadcaster, EventStreamResponse
+from tiles import MEDIA_TYPE as TILE_MEDIA_TYPE, TileIndex, encode_tile
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Prometheus metrics, served at /metrics; METRICS=false turns off collecting them
+METRICS_ENABLED = os.environ.get('METRICS', 'true').lower() != 'false'
+JOB_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+metrics = Registry()
+request_duration = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"]
+)
+mongo_command_duration = metrics.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency", ["collection", "command"]
+)
+mongo_command_failures = metrics.counter(
+    "mongodb_command_failures_total", "MongoDB commands that failed", ["collection", "command"]
+)
+geocode_request_duration = metrics.histogram(
+    "geocode_request_duration_seconds", "Geocoding API request latency by API status", ["status"]
+)
+job_duration = metrics.histogram(
+    "job_duration_seconds", "Admin job duration by final status", ["kind", "status"], buckets=JOB_BUCKETS
+)
+job_stage_duration = metrics.histogram(
+    "job_stage_duration_seconds", "Admin job duration per stage", ["kind", "stage"], buckets=JOB_BUCKETS
+)
+job_step_duration = metrics.histogram(
+    "job_step_duration_seconds", "Time admin jobs spent per step (download, parse, geocode...)",
+    ["kind", "step"], buckets=JOB_BUCKETS,
+)
+
+def mongo_client_options() -> Dict:
+    """Connection pool settings; every worker process has its own pool, so a
+    deployment opens up to workers x MONGO_MAX_POOL_SIZE connections"""
+    options = {
+        "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+        "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', '0')),
+    }
+    for option, variable in (("maxIdleTimeMS", 'MONGO_MAX_IDLE_TIME_MS'),
+                             ("waitQueueTimeoutMS", 'MONGO_WAIT_QUEUE_TIMEOUT_MS')):
+        if os.environ.get(variable):
+            options[option] = int(os.environ[variable])
+    if METRICS_ENABLED:
+        options["event_listeners"] = [CommandMetrics(mongo_command_duration, mongo_command_failures)]
+    return options
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, **mongo_client_options())
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
@@ -56,215 +122,1327 @@ class Marker(BaseModel):
     google_maps_url: Optional[str] = None
 
 
+class LocalizedMarker(BaseModel):
+    """A marker with name and description resolved for one language"""
+    model_config = ConfigDict(extra="ignore")
+    
+    id: str
+    name: str
+    description: str
+    lat: float
+    lng: float
+    layer_id: str
+    google_maps_url: Optional[str] = None
+
+class MarkerChanges(BaseModel):
+    revision: int
+    reset: bool
+    upserts: List[Marker]
+    deleted: List[str]
+
+class NearbyMarker(Marker):
+    distance: float
+
+class SearchResult(LocalizedMarker):
+    score: float
+    distance: Optional[float] = None
+
+class NearbyResult(LocalizedMarker):
+    distance: float
+
+class Point(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+
+class ItineraryRequest(BaseModel):
+    marker_ids: List[str]
+    start: Point
+    round_trip: bool = False
+    # The visitor's walking time; stops that do not fit are left out
+    available_minutes: Optional[float] = None
+    # Time the optimizer may spend on routes too long to solve exactly
+    optimizer_time_ms: Optional[float] = None
+    lang: str = 'pt'
+
+class ItineraryLeg(BaseModel):
+    from_id: Optional[str] = None
+    to_id: Optional[str] = None
+    distance: float
+    walking_minutes: float
+    google_maps_url: str
+
+class Itinerary(BaseModel):
+    stops: List[LocalizedMarker]
+    legs: List[ItineraryLeg]
+    total_distance: float
+    walking_minutes: float
+    optimal: bool
+    # Stops left out to fit `available_minutes`, in the order they would follow
+    skipped: List[str] = []
+
+class Cluster(BaseModel):
+    id: str
+    lat: float
+    lng: float
+    count: int
+    layers: Dict[str, int]
+
+class ClusterResponse(BaseModel):
+    zoom: int
+    clusters: List[Cluster]
+    markers: List[Marker]
+
+
+def geo_point(lat: float, lng: float) -> Dict:
+    """GeoJSON point for a marker's 2dsphere-indexed `location` field"""
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+def canonical_marker(marker: Dict) -> Dict:
+    """A marker validated and stored with every field, as reads expect"""
+    marker = Marker.model_validate(marker).model_dump()
+    return {**marker, "location": geo_point(marker['lat'], marker['lng'])}
+
+def canonical_layer(layer: Dict) -> Dict:
+    return Layer.model_validate(layer).model_dump()
+
+MARKER_INDEXES = [
+    ([("id", 1)], {"unique": True}),
+    ([("location", "2dsphere")], {}),
+    # Keyset pagination of a single layer
+    ([("layer_id", 1), ("id", 1)], {}),
+    # Changes since a client's revision
+    ([("revision", 1)], {}),
+]
+
+# Markers are published as immutable dataset versions; reads resolve the current one
+marker_dataset = DatasetStore(
+    db,
+    "markers",
+    keep_versions=int(os.environ.get('MARKER_VERSIONS_KEEP', '3')),
+    validate=Marker.model_validate,
+    indexes=MARKER_INDEXES,
+    revisions=True,
+    tombstone_ttl=timedelta(days=float(os.environ.get('MARKER_TOMBSTONE_DAYS', '30'))),
+)
+
+# Seeding and backfills run once per database, recorded in `migrations`
+migrations = MigrationRegistry()
+
+# Tells the other workers sharing the database to refresh their caches and indexes
+events = EventBus(
+    db,
+    size=int(os.environ.get('EVENTS_COLLECTION_BYTES', str(1 << 20))),
+    poll_interval=float(os.environ.get('EVENTS_POLL_INTERVAL', '0.5')),
+)
+
+# Serialized /layers and /markers bodies, rebuilt after every dataset change
+response_cache = ResponseCache(
+    maxsize=int(os.environ.get('RESPONSE_CACHE_SIZE', '256')),
+    enabled=os.environ.get('RESPONSE_CACHE', 'true').lower() != 'false',
+)
+
+# Stored documents are canonical, so reads encode them without revalidating;
+# STRICT_SERIALIZATION=true validates each one through its model again
+STRICT_SERIALIZATION = os.environ.get('STRICT_SERIALIZATION', 'false').lower() == 'true'
+layer_serializer = DocumentSerializer(Layer, STRICT_SERIALIZATION)
+marker_serializer = DocumentSerializer(Marker, STRICT_SERIALIZATION)
+localized_marker_serializer = DocumentSerializer(LocalizedMarker, STRICT_SERIALIZATION)
+nearby_marker_serializer = DocumentSerializer(NearbyMarker, STRICT_SERIALIZATION)
+nearby_result_serializer = DocumentSerializer(NearbyResult, STRICT_SERIALIZATION)
+search_result_serializer = DocumentSerializer(SearchResult, STRICT_SERIALIZATION)
+cluster_response_serializer = DocumentSerializer(ClusterResponse, STRICT_SERIALIZATION)
+
+LANGUAGES = ('pt', 'en', 'es')
+
+def validate_lang(lang: Optional[str]):
+    if lang is not None and lang not in LANGUAGES:
+        raise HTTPException(status_code=400, detail=f"'lang' must be one of {', '.join(LANGUAGES)}")
+
+def localized_projection(lang: str) -> Dict:
+    """Project name/description for `lang`, falling back to the Portuguese
+    field when the translation is missing or empty (as getMarkerText did)"""
+    def resolve(field: str):
+        if lang == 'pt':
+            return 1
+        translated = f"${field}_{lang}"
+        return {"$cond": [{"$ne": [{"$ifNull": [translated, ""]}, ""]}, translated, f"${field}"]}
+    
+    return {
+        "_id": 0,
+        "id": 1,
+        "name": resolve("name"),
+        "description": resolve("description"),
+        "lat": 1,
+        "lng": 1,
+        "layer_id": 1,
+        "google_maps_url": 1,
+    }
+
+def localize(marker: Dict, lang: str) -> Dict:
+    """Marker fields with name and description in `lang`, falling back to Portuguese"""
+    localized = dict(marker)
+    if lang != 'pt':
+        for field in ('name', 'description'):
+            localized[field] = marker.get(f"{field}_{lang}") or marker[field]
+    return localized
+
+async def invalidate_marker_responses(version: int):
+    response_cache.invalidate("markers:")
+
+marker_dataset.add_listener(invalidate_marker_responses)
+
+# In-memory indexes over the current marker dataset, rebuilt on every version change
+marker_indexes = {
+    "version": None,
+    "clusters": ClusterIndex([]),
+    "nearest": NearestIndex([]),
+    "search": SearchIndex(),
+    "tiles": TileIndex([]),
+}
+search_index_lock = asyncio.Lock()
+
+# Larger changes rebuild the search index in a thread instead of updating it in place
+SEARCH_INCREMENTAL_LIMIT = int(os.environ.get('SEARCH_INCREMENTAL_LIMIT', '500'))
+
+async def update_search_index(version: int, markers: List[Dict]):
+    """Re-index only the markers that changed; rebuild off-loop when many did"""
+    async with search_index_lock:
+        search = marker_indexes["search"]
+        removed, added = await asyncio.to_thread(search.changes, markers)
+        rebuilt = None
+        if len(removed) + len(added) > SEARCH_INCREMENTAL_LIMIT:
+            rebuilt = await asyncio.to_thread(SearchIndex, markers)
+        # A slower listener for an older version must not undo a newer one's changes
+        if marker_dataset.version != version:
+            return
+        if rebuilt is not None:
+            marker_indexes["search"] = rebuilt
+        else:
+            search.apply(removed, added)
+
+async def rebuild_marker_indexes(version: int):
+    collection = marker_dataset.collection
+    # Exactly the Marker fields, so responses can encode indexed markers as they are
+    markers = await collection.find({}, marker_serializer.projection).to_list(None)
+    clusters = await asyncio.to_thread(
+        ClusterIndex, markers, max_zoom=int(os.environ.get('CLUSTER_MAX_ZOOM', '16'))
+    )
+    nearest = await asyncio.to_thread(NearestIndex, markers)
+    tiles = await asyncio.to_thread(TileIndex, markers, TILE_MAX_ZOOM)
+    await update_search_index(version, markers)
+    # A slower build for an older version must not replace a newer one
+    if marker_dataset.version == version:
+        marker_indexes.update(version=version, clusters=clusters, nearest=nearest, tiles=tiles)
+        logger.info(f"Rebuilt marker indexes for v{version} ({len(markers)} markers)")
+
+marker_dataset.add_listener(rebuild_marker_indexes)
+
+# Immutable snapshot files of the map data, for a CDN or nginx to serve without
+# the API; they are only written when SNAPSHOT_DIR is set
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR')
+snapshot_store = SnapshotStore(
+    Path(SNAPSHOT_DIR or ROOT_DIR / 'snapshots'),
+    base_url=os.environ.get('SNAPSHOT_BASE_URL', '/api/snapshots/'),
+    retention=float(os.environ.get('SNAPSHOT_RETENTION_DAYS', '7')) * 86400,
+)
+snapshot_lock = asyncio.Lock()
+
+async def export_snapshot(version: Optional[int] = None):
+    """Write the layers and each language's markers as snapshot files and
+    point the manifest at them; a failed export keeps the previous snapshot"""
+    version = marker_dataset.version if version is None else version
+    revision = marker_dataset.revision
+    if not SNAPSHOT_DIR or version is None:
+        return
+    try:
+        async with snapshot_lock:
+            pipeline = find_pipeline({}, layer_serializer.projection, ordered=True)
+            body = layer_serializer.dump_list(await db.layers.aggregate(pipeline).to_list(None))
+            files = {"layers": await asyncio.to_thread(snapshot_store.write, "layers", body), "markers": {}}
+            for lang in LANGUAGES:
+                pipeline = find_pipeline({}, localized_projection(lang), ordered=True)
+                markers = await marker_dataset.collection.aggregate(pipeline).to_list(None)
+                body = localized_marker_serializer.dump_list(markers)
+                files["markers"][lang] = await asyncio.to_thread(snapshot_store.write, f"markers.{lang}", body)
+            # A newer version may have been published meanwhile; its own export wins
+            if marker_dataset.version != version:
+                return
+            await asyncio.to_thread(snapshot_store.publish, version, files, revision)
+        logger.info(f"Exported snapshot of markers v{version} to {snapshot_store.directory}")
+    except Exception as e:
+        logger.error(f"Snapshot export for markers v{version} failed: {str(e)}")
+
+# Only the worker that published a version exports it
+marker_dataset.add_listener(export_snapshot, on_load=False)
+
+async def announce_dataset_version(version: int):
+    await events.publish("dataset", name=marker_dataset.name, version=version)
+
+async def reload_dataset(payload: Dict):
+    # Loading the new pointer runs the listeners above on this worker too
+    await marker_dataset.load()
+
+marker_dataset.add_listener(announce_dataset_version, on_load=False)
+events.subscribe("dataset", reload_dataset)
+
+# Live notifications for browsers: /api/events streams a `dataset` event to every
+# subscriber of this worker when the markers change, including changes published
+# by another worker (they reach this one as a dataset load)
+SSE_KEEPALIVE_SECONDS = float(os.environ.get('SSE_KEEPALIVE_SECONDS', '15'))
+# Changes to at most this many markers travel inside the event itself
+SSE_DELTA_LIMIT = int(os.environ.get('SSE_DELTA_LIMIT', '50'))
+dataset_broadcast = Broadcaster(keepalive=SSE_KEEPALIVE_SECONDS)
+
+def sse_event(kind: str, data: Dict, event_id: Optional[int] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {kind}\ndata: ".encode() + to_json(data) + b"\n\n"
+
+async def broadcast_dataset_version(version: int):
+    """Encode the event once per language; subscribers only write their copy.
+    
+    Every event has the version and revision; when few markers changed since
+    the previous event it also has the MarkerChanges delta from that revision
+    (`since`), so clients at that revision need no request to catch up.
+    """
+    revision = marker_dataset.revision
+    previous = dataset_broadcast.latest
+    event = {"version": version, "revision": revision}
+    bodies = {lang: event for lang in (None,) + LANGUAGES}
+    since = previous["revision"] if previous else None
+    if since is not None and since != revision and marker_dataset.has_changes_since(since):
+        changed = await marker_dataset.collection.count_documents({"revision": {"$gt": since}})
+        if changed + len(await marker_dataset.deleted_since(since)) <= SSE_DELTA_LIMIT:
+            for lang in bodies:
+                changes = await marker_changes(since, lang)
+                del changes["reset"]
+                bodies[lang] = {"version": version, "since": since, **changes}
+    # A slower broadcast for an older version must not replace a newer one
+    if marker_dataset.version == version:
+        dataset_broadcast.publish({
+            "revision": revision,
+            "bodies": {lang: sse_event("dataset", body, revision) for lang, body in bodies.items()},
+        })
+
+marker_dataset.add_listener(broadcast_dataset_version)
+
+# Mapbox Vector Tiles of the markers, cut from marker_indexes["tiles"] and kept
+# per index version in their own LRU cache
+TILE_MAX_ZOOM = 22
+TILE_EXTENT = 4096
+# Markers this close to a tile's edge (in tile units) are in the neighbour too
+TILE_BUFFER = int(os.environ.get('TILE_BUFFER', '64'))
+TILE_CACHE_SIZE = int(os.environ.get('TILE_CACHE_SIZE', '8192'))
+tile_cache = ResponseCache(
+    maxsize=TILE_CACHE_SIZE,
+    enabled=os.environ.get('RESPONSE_CACHE', 'true').lower() != 'false',
+)
+# TILE_PRERENDER=true renders the non-empty tiles of the box (south,west,north,east)
+# at the zoom levels below into the cache after every sync
+TILE_PRERENDER = os.environ.get('TILE_PRERENDER', 'false').lower() == 'true'
+TILE_PRERENDER_BBOX = os.environ.get('TILE_PRERENDER_BBOX', '-15.15,-39.35,-14.45,-38.95')
+TILE_PRERENDER_ZOOMS = os.environ.get('TILE_PRERENDER_ZOOMS', '10-16')
+
+def render_tile(index: TileIndex, z: int, x: int, y: int, lang: str) -> bytes:
+    """A `markers` layer of points with the id, layer_id and name in `lang`"""
+    name = "name" if lang == 'pt' else f"name_{lang}"
+    return encode_tile({"markers": [
+        (px, py, {"id": marker["id"], "layer_id": marker["layer_id"], "name": marker.get(name) or marker["name"]})
+        for marker, px, py in index.points(z, x, y, TILE_EXTENT, TILE_BUFFER)
+    ]}, TILE_EXTENT)
+
+def tile_key(version: Optional[int], lang: str, z: int, x: int, y: int) -> str:
+    return f"tiles:v{version}:{lang}:{z}/{x}/{y}"
+
+def prerender(index: TileIndex, version: int) -> Dict[str, bytes]:
+    south, west, north, east = (float(part) for part in TILE_PRERENDER_BBOX.split(','))
+    first, _, last = TILE_PRERENDER_ZOOMS.partition('-')
+    bodies = {}
+    for z in range(int(first), int(last or first) + 1):
+        for x, y in index.occupied(z, south, west, north, east):
+            for lang in LANGUAGES:
+                # Lower zooms first, so a full cache holds the most requested tiles
+                if len(bodies) == TILE_CACHE_SIZE:
+                    return bodies
+                bodies[tile_key(version, lang, z, x, y)] = render_tile(index, z, x, y, lang)
+    return bodies
+
+async def refresh_tiles(version: int):
+    """Drop tiles of older versions, then pre-render this one's if enabled"""
+    tile_cache.invalidate()
+    if not TILE_PRERENDER or marker_indexes["version"] != version:
+        return
+    started = asyncio.get_running_loop().time()
+    bodies = await asyncio.to_thread(prerender, marker_indexes["tiles"], version)
+    if marker_indexes["version"] != version:
+        return
+    for key, body in bodies.items():
+        tile_cache.put(key, body)
+    elapsed = asyncio.get_running_loop().time() - started
+    logger.info(f"Pre-rendered {len(bodies)} tiles for markers v{version} in {elapsed:.1f}s")
+
+# After rebuild_marker_indexes, which builds the tile index
+marker_dataset.add_listener(refresh_tiles)
+
+async def layers_changed():
+    response_cache.invalidate("layers")
+    await events.publish("layers")
+    await export_snapshot()
+
+async def invalidate_layer_responses(payload: Dict):
+    response_cache.invalidate("layers")
+
+events.subscribe("layers", invalidate_layer_responses)
+
+# Lets browsers and CDNs reuse a response briefly and revalidate it in the background
+READ_CACHE_CONTROL = os.environ.get('READ_CACHE_CONTROL', 'public, max-age=60, stale-while-revalidate=86400')
+
+# Cached bodies smaller than this are sent uncompressed
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get('COMPRESSION_MINIMUM_SIZE', '1024'))
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison, also accepting the validators of compressed variants"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for tag in if_none_match.split(','):
+        tag = tag.strip().removeprefix('W/')
+        for encoding in ('gzip', 'br'):
+            tag = tag.replace(f'-{encoding}"', '"')
+        if tag == etag:
+            return True
+    return False
+
+async def cached_response(request: Request, cached: CachedBody,
+                          media_type: str = "application/json") -> Response:
+    """Serve a cached body, answering 304 when the client already has it.
+    
+    Compressed variants are built once per cached body (off the event loop)
+    rather than on every request by the compression middleware.
+    """
+    encoding = choose_encoding(request.headers.get('accept-encoding'))
+    if len(cached.body) < COMPRESSION_MINIMUM_SIZE:
+        encoding = None
+    headers = {
+        "ETag": cached.encoded_etag(encoding) if encoding else cached.etag,
+        "Cache-Control": READ_CACHE_CONTROL,
+        "Vary": "Accept, Accept-Encoding",
+    }
+    if etag_matches(request.headers.get('if-none-match'), cached.etag):
+        return Response(status_code=304, headers=headers)
+    if not encoding:
+        return Response(content=cached.body, media_type=media_type, headers=headers)
+    body = await asyncio.to_thread(cached.encoded, encoding)
+    headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def json_response(body: bytes) -> Response:
+    """A JSON body that was already encoded (FastAPI would validate a returned list again)"""
+    return Response(content=body, media_type="application/json")
+
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '5000'))
+NDJSON_CHUNK_SIZE = 64 * 1024
+
+async def ndjson_stream(cursor, serializer: DocumentSerializer):
+    """Encode documents as NDJSON while they arrive from the cursor"""
+    chunk = bytearray()
+    async for document in cursor:
+        chunk += serializer.dump(document)
+        chunk += b"\n"
+        if len(chunk) >= NDJSON_CHUNK_SIZE:
+            yield bytes(chunk)
+            chunk.clear()
+    if chunk:
+        yield bytes(chunk)
+
+def find_pipeline(query: Dict, projection: Optional[Dict] = None, limit: Optional[int] = None,
+                  ordered: bool = False) -> List[Dict]:
+    """Aggregation equivalent of find(); the projection may use expressions"""
+    pipeline = [{"$match": query}]
+    if ordered:
+        pipeline.append({"$sort": {"id": 1}})
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline.append({"$project": projection or {"_id": 0}})
+    return pipeline
+
+async def list_response(request: Request, collection, query: Dict, serializer: DocumentSerializer,
+                        cache_key: str, limit: Optional[int], after: Optional[str], format: Optional[str],
+                        projection: Optional[Dict] = None) -> Response:
+    """Serve a list endpoint in one of three modes.
+    
+    `format=ndjson` (or Accept: application/x-ndjson) streams documents straight
+    from the cursor. `limit`/`after` return one keyset page ordered by id, with
+    the next cursor in X-Next-After and a Link header. Otherwise the whole list
+    comes from the response cache.
+    """
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+    if after is not None:
+        query = {**query, "id": {"$gt": after}}
+    projection = projection or serializer.projection
+    
+    if format == 'ndjson' or 'application/x-ndjson' in request.headers.get('accept', ''):
+        cursor = collection.aggregate(find_pipeline(query, projection, limit, ordered=True))
+        return StreamingResponse(ndjson_stream(cursor, serializer), media_type="application/x-ndjson")
+    
+    if limit is not None or after is not None:
+        page_size = limit or MAX_PAGE_SIZE
+        pipeline = find_pipeline(query, projection, page_size, ordered=True)
+        documents = await collection.aggregate(pipeline).to_list(None)
+        headers = {}
+        if len(documents) == page_size:
+            next_after = documents[-1]['id']
+            next_url = request.url.include_query_params(after=next_after, limit=page_size)
+            headers.update({"X-Next-After": next_after, "Link": f'<{next_url}>; rel="next"'})
+        return Response(content=serializer.dump_list(documents), media_type="application/json", headers=headers)
+    
+    async def build():
+        documents = await collection.aggregate(find_pipeline(query, projection)).to_list(None)
+        return serializer.dump_list(documents)
+    
+    return await cached_response(request, await response_cache.get(cache_key, build))
+
+
 # Routes
 @api_router.get("/")
 async def root():
     return {"message": "Ilhéus Interactive Map API"}
 
 @api_router.get("/layers", response_model=List[Layer])
-async def get_layers():
-    layers = await db.layers.find({}, {"_id": 0}).to_list(1000)
-    return layers
+async def get_layers(request: Request, limit: Optional[int] = None, after: Optional[str] = None,
+                     format: Optional[str] = None):
+    return await list_response(
+        request, db.layers, {}, layer_serializer, "layers", limit, after, format
+    )
 
 @api_router.get("/markers", response_model=List[Marker])
-async def get_markers():
-    markers = await db.markers.find({}, {"_id": 0}).to_list(1000)
-    return markers
+async def get_markers(request: Request, limit: Optional[int] = None, after: Optional[str] = None,
+                      format: Optional[str] = None, lang: Optional[str] = None):
+    """All markers. Besides JSON (paged or NDJSON, see list_response), the
+    whole list is offered in a compact columnar layout with `format=columns`
+    or `format=msgpack`, or the matching Accept media type.
+    
+    With `lang=pt|en|es` only the `name`/`description` resolved for that
+    language are returned (LocalizedMarker), using the frontend's fallback
+    to Portuguese.
+    """
+    collection = marker_dataset.collection
+    cache_key = f"markers:v{marker_dataset.version}"
+    serializer, projection = marker_serializer, None
+    validate_lang(lang)
+    if lang is not None:
+        serializer, projection = localized_marker_serializer, localized_projection(lang)
+        cache_key += f":lang:{lang}"
+    
+    compact = marker_formats.negotiate(request.headers.get('accept'), format)
+    if compact and limit is None and after is None:
+        async def build():
+            pipeline = find_pipeline({}, projection or serializer.projection)
+            markers = serializer.to_python(await collection.aggregate(pipeline).to_list(None))
+            return marker_formats.encode(markers, serializer.fields, compact)
+        
+        cached = await response_cache.get(f"{cache_key}:{compact}", build)
+        return await cached_response(request, cached, media_type=marker_formats.MEDIA_TYPES[compact])
+    
+    return await list_response(
+        request, collection, {}, serializer, cache_key, limit, after, format, projection=projection
+    )
+
+async def marker_changes(since: int, lang: Optional[str] = None) -> Dict:
+    """The MarkerChanges body for revision `since`, localized to `lang`"""
+    serializer, projection = marker_serializer, marker_serializer.projection
+    if lang is not None:
+        serializer, projection = localized_marker_serializer, localized_projection(lang)
+    collection, revision = marker_dataset.collection, marker_dataset.revision
+    reset = not marker_dataset.has_changes_since(since)
+    query = {} if reset else {"revision": {"$gt": since}}
+    upserts = await collection.aggregate(find_pipeline(query, projection, ordered=True)).to_list(None)
+    deleted = [] if reset else await marker_dataset.deleted_since(since)
+    return {
+        "revision": revision,
+        "reset": reset,
+        "upserts": serializer.to_python(upserts),
+        "deleted": deleted,
+    }
+
+@api_router.get("/markers/changes", response_model=MarkerChanges)
+async def get_marker_changes(request: Request, since: int = 0, lang: Optional[str] = None):
+    """Markers written and ids deleted after revision `since`, for clients
+    keeping a copy of the list; `lang` localizes them as in /markers.
+    
+    When the changes cannot be computed (since is older than the compacted
+    tombstones, or the markers were rolled back) `reset` is true and
+    `upserts` holds every marker, to replace the copy with.
+    """
+    validate_lang(lang)
+    reset = not marker_dataset.has_changes_since(since)
+    cache_key = f"markers:v{marker_dataset.version}:changes:{'reset' if reset else since}:{lang}"
+    
+    async def build():
+        return to_json(await marker_changes(since, lang))
+    
+    return await cached_response(request, await response_cache.get(cache_key, build))
+
+@api_router.get("/events", include_in_schema=False)
+async def stream_events(request: Request, lang: Optional[str] = None):
+    """Server-sent events: `dataset` with the new version and revision each
+    time the markers change, plus the changed markers (localized to `lang`)
+    when few changed. A client reconnecting with a Last-Event-ID other than
+    the current revision is sent the current event straight away.
+    """
+    validate_lang(lang)
+    last_event_id = request.headers.get("last-event-id")
+    latest = dataset_broadcast.latest
+    replay = last_event_id is not None and latest is not None and last_event_id != str(latest["revision"])
+    
+    def render(message: Optional[Dict]) -> bytes:
+        return b": keepalive\n\n" if message is None else message["bodies"][lang]
+    
+    return EventStreamResponse(dataset_broadcast, render, replay=replay, headers={
+        "Cache-Control": "no-cache",
+        # Stops nginx from buffering the stream
+        "X-Accel-Buffering": "no",
+    })
 
 @api_router.get("/markers/layer/{layer_id}", response_model=List[Marker])
-async def get_markers_by_layer(layer_id: str):
-    markers = await db.markers.find({"layer_id": layer_id}, {"_id": 0}).to_list(1000)
-    return markers
+async def get_markers_by_layer(request: Request, layer_id: str, limit: Optional[int] = None,
+                               after: Optional[str] = None, format: Optional[str] = None):
+    return await list_response(
+        request, marker_dataset.collection, {"layer_id": layer_id}, marker_serializer,
+        f"markers:v{marker_dataset.version}:layer:{layer_id}", limit, after, format
+    )
 
-@api_router.post("/admin/add-google-maps-urls")
-async def add_google_maps_urls():
-    """Add Google Maps URLs to existing markers that don't have them"""
+def parse_lat_lng(value: str, param: str):
     try:
-        from pymongo import UpdateOne
-        
-        markers = await db.markers.find({}, {"_id": 0}).to_list(1000)
-        bulk_operations = []
-        
-        for marker in markers:
-            if not marker.get('google_maps_url'):
-                google_maps_url = generate_google_maps_url(
-                    marker['lat'], 
-                    marker['lng'], 
-                    marker['name']
-                )
-                bulk_operations.append(
-                    UpdateOne(
-                        {"id": marker['id']},
-                        {"$set": {"google_maps_url": google_maps_url}}
-                    )
-                )
-        
-        updated_count = 0
-        if bulk_operations:
-            result = await db.markers.bulk_write(bulk_operations)
-            updated_count = result.modified_count
-        
-        return {
-            "success": True,
-            "updated_count": updated_count,
-            "message": f"Added Google Maps URLs to {updated_count} markers"
+        lat, lng = (float(part) for part in value.split(','))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"'{param}' must be 'lat,lng'")
+    return check_lat_lng(lat, lng, param)
+
+def check_lat_lng(lat: float, lng: float, param: str):
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise HTTPException(status_code=400, detail=f"'{param}' is out of range")
+    return lat, lng
+
+def parse_layers(layers: Optional[str]) -> Optional[List[str]]:
+    return [layer for layer in layers.split(',') if layer] if layers else None
+
+# Degrees of longitude between the vertices along a box's parallels, and the
+# degrees a box's polygon is widened by: more than a geodesic between two of
+# those vertices strays from the parallel (at most step² / 16 radians)
+BBOX_EDGE_STEP = 1.0
+BBOX_EDGE_MARGIN = 0.01
+# MongoDB's CRS for polygons wider than a hemisphere; the inside is on the
+# left of the ring, which runs counter-clockwise here
+BBOX_CRS = {"type": "name", "properties": {"name": "urn:x-mongodb:crs:strictwinding:EPSG:4326"}}
+
+def bbox_filter(sw: tuple, ne: tuple, layers: Optional[List[str]] = None) -> Dict:
+    """Query for markers inside the box spanned by the south-west and north-east corners.
+    
+    GeoJSON polygon edges are geodesics, which bow off the parallels of a
+    wide box, so a polygon is not an exact lat/lng rectangle. The 2dsphere
+    index narrows markers down to a slightly larger polygon, with its
+    parallels split into short edges, and the box is then applied exactly to
+    ``lat`` and ``lng``. (``$box`` is exact but flat, which a 2dsphere index
+    cannot serve.)
+    """
+    (south, west), (north, east) = sw, ne
+    query = {"lat": {"$gte": south, "$lte": north}, "lng": {"$gte": west, "$lte": east}}
+    # The margin also keeps boxes of zero width or height from being degenerate
+    west, east = max(west - BBOX_EDGE_MARGIN, -180), min(east + BBOX_EDGE_MARGIN, 180)
+    south, north = max(south - BBOX_EDGE_MARGIN, -90), min(north + BBOX_EDGE_MARGIN, 90)
+    # A box around the whole globe has no polygon (its sides would meet)
+    if east - west < 360:
+        steps = math.ceil((east - west) / BBOX_EDGE_STEP)
+        lngs = [west + (east - west) * i / steps for i in range(steps + 1)]
+
+        def parallel(lat: float, edge: List[float]) -> List[List[float]]:
+            # All of a parallel at a pole is the pole itself
+            return [[edge[0], lat]] if abs(lat) == 90 else [[lng, lat] for lng in edge]
+
+        ring = parallel(south, lngs) + parallel(north, lngs[::-1])
+        query["location"] = {
+            "$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring + ring[:1]], "crs": BBOX_CRS}}
         }
-    except Exception as e:
-        logger.error(f"Error adding Google Maps URLs: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    if layers:
+        query["layer_id"] = {"$in": layers}
+    return query
+
+def near_pipeline(lat: float, lng: float, radius: float, limit: int,
+                  layers: Optional[List[str]] = None) -> List[Dict]:
+    """Aggregation returning markers within `radius` meters, nearest first"""
+    geo_near = {
+        "near": geo_point(lat, lng),
+        "key": "location",
+        "distanceField": "distance",
+        "maxDistance": radius,
+        "spherical": True,
+    }
+    if layers:
+        geo_near["query"] = {"layer_id": {"$in": layers}}
+    return [
+        {"$geoNear": geo_near},
+        {"$limit": limit},
+        {"$project": {"_id": 0, "location": 0}},
+    ]
+
+@api_router.get("/markers/bbox", response_model=List[Marker])
+async def get_markers_in_bbox(sw: str, ne: str, layers: Optional[str] = None, limit: int = 1000):
+    """Markers inside a bounding box given as sw=lat,lng&ne=lat,lng"""
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+    (south, west), (north, east) = parse_lat_lng(sw, 'sw'), parse_lat_lng(ne, 'ne')
+    if south > north or west > east:
+        raise HTTPException(status_code=400, detail="'sw' must be south-west of 'ne'")
+    query = bbox_filter((south, west), (north, east), parse_layers(layers))
+    markers = await marker_dataset.collection.find(query, marker_serializer.projection).to_list(limit)
+    return json_response(marker_serializer.dump_list(markers))
+
+@api_router.get("/markers/near", response_model=List[NearbyMarker])
+async def get_markers_near(lat: float, lng: float, radius: float = 1000, limit: int = 50,
+                           layers: Optional[str] = None):
+    """Markers within `radius` meters of a point, nearest first"""
+    if not (0 < radius < math.inf):
+        raise HTTPException(status_code=400, detail="'radius' must be positive")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+    check_lat_lng(lat, lng, 'lat,lng')
+    pipeline = near_pipeline(lat, lng, radius, limit, parse_layers(layers))
+    markers = await marker_dataset.collection.aggregate(pipeline).to_list(limit)
+    return json_response(nearby_marker_serializer.dump_list(markers, select=True))
+
+@api_router.get("/markers/{marker_id}/nearby", response_model=List[NearbyResult])
+async def get_nearby_markers(marker_id: str, k: int = 10, layers: Optional[str] = None, lang: str = 'pt'):
+    """The k markers closest to a marker, nearest first; `distance` is in meters.
+    
+    Searches the other layers ("restaurants near this beach") unless
+    `layers` is given.
+    """
+    validate_lang(lang)
+    if not 1 <= k <= 100:
+        raise HTTPException(status_code=400, detail="'k' must be between 1 and 100")
+    nearest = marker_indexes["nearest"]
+    if nearest.get(marker_id) is None:
+        raise HTTPException(status_code=404, detail="Marker not found")
+    return json_response(nearby_result_serializer.dump_list(
+        [{**localize(marker, lang), "distance": distance}
+         for marker, distance in nearest.nearest(marker_id, k, parse_layers(layers))],
+        select=True,
+    ))
+
+@api_router.get("/clusters", response_model=ClusterResponse)
+async def get_clusters(bbox: str, zoom: int, layers: Optional[str] = None):
+    """Marker clusters for bbox=south,west,north,east at a map zoom level.
+    
+    Cells holding a single marker, and every marker once zoomed in past
+    CLUSTER_MAX_ZOOM, are returned as individual markers.
+    """
+    try:
+        south, west, north, east = (float(part) for part in bbox.split(','))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="'bbox' must be 'south,west,north,east'")
+    if not all(math.isfinite(value) for value in (south, west, north, east)):
+        raise HTTPException(status_code=400, detail="'bbox' must be finite numbers")
+    if south > north or west > east:
+        raise HTTPException(status_code=400, detail="'bbox' corners are out of order")
+    if not 0 <= zoom <= 22:
+        raise HTTPException(status_code=400, detail="'zoom' must be between 0 and 22")
+    return json_response(cluster_response_serializer.dump(
+        marker_indexes["clusters"].query(south, west, north, east, zoom, parse_layers(layers))
+    ))
+
+@api_router.get("/tiles/{z}/{x}/{y}.mvt", include_in_schema=False)
+async def get_tile(request: Request, z: int, x: int, y: int, lang: str = 'pt'):
+    """Markers of map tile z/x/y as a Mapbox Vector Tile: one `markers`
+    layer of points with id, layer_id and name in `lang`. Tiles without
+    markers have an empty body.
+    """
+    validate_lang(lang)
+    if not 0 <= z <= TILE_MAX_ZOOM:
+        raise HTTPException(status_code=400, detail=f"'z' must be between 0 and {TILE_MAX_ZOOM}")
+    if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail=f"Tile {x},{y} is outside zoom level {z}")
+    index, version = marker_indexes["tiles"], marker_indexes["version"]
+    
+    async def build():
+        return await asyncio.to_thread(render_tile, index, z, x, y, lang)
+    
+    cached = await tile_cache.get(tile_key(version, lang, z, x, y), build)
+    return await cached_response(request, cached, media_type=TILE_MEDIA_TYPE)
+
+@api_router.get("/search", response_model=List[SearchResult])
+async def search_markers(q: str, lang: str = 'pt', near: Optional[str] = None,
+                         layers: Optional[str] = None, limit: int = 20):
+    """Search marker names and descriptions in every language.
+    
+    Matching ignores case and accents, completes the last word and tolerates
+    typos. With near=lat,lng closer markers rank higher; `distance` is in meters.
+    """
+    validate_lang(lang)
+    if not 1 <= limit <= 100:
+        raise HTTPException(status_code=400, detail="'limit' must be between 1 and 100")
+    point = parse_lat_lng(near, 'near') if near else None
+    results = marker_indexes["search"].search(q, limit=limit, near=point, layers=parse_layers(layers))
+    return json_response(search_result_serializer.dump_list(
+        [{**localize(marker, lang), "score": round(score, 4), "distance": distance}
+         for marker, score, distance in results],
+        select=True,
+    ))
+
+ITINERARY_MAX_STOPS = int(os.environ.get('ITINERARY_MAX_STOPS', '50'))
+ITINERARY_OPTIMIZER_TIME_MS = float(os.environ.get('ITINERARY_OPTIMIZER_TIME_MS', '25'))
+ITINERARY_MAX_OPTIMIZER_TIME_MS = float(os.environ.get('ITINERARY_MAX_OPTIMIZER_TIME_MS', '1000'))
+# Meters per second; distances are straight lines, so walking times are lower bounds
+WALKING_SPEED = float(os.environ.get('WALKING_SPEED', '1.3'))
+
+def walking_minutes(meters: float) -> float:
+    return round(meters / WALKING_SPEED / 60, 1)
+
+@api_router.post("/itinerary", response_model=Itinerary)
+async def plan_itinerary(request: ItineraryRequest):
+    """Order to walk to the given markers from a start point, shortest first.
+    
+    Up to 12 stops are ordered exactly; longer routes are improved with
+    2-opt and or-opt moves for at most `optimizer_time_ms`. With
+    `available_minutes`, the route ends at the last stop the visitor can
+    walk to in time (and back, on a round trip); the rest are `skipped`.
+    Each leg links to Google Maps walking directions.
+    """
+    validate_lang(request.lang)
+    marker_ids = list(dict.fromkeys(request.marker_ids))
+    if not 1 <= len(marker_ids) <= ITINERARY_MAX_STOPS:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {ITINERARY_MAX_STOPS} markers are required")
+    optimizer_time = (request.optimizer_time_ms if request.optimizer_time_ms is not None
+                      else ITINERARY_OPTIMIZER_TIME_MS)
+    if not 0 < optimizer_time <= ITINERARY_MAX_OPTIMIZER_TIME_MS:
+        raise HTTPException(status_code=400,
+                            detail=f"'optimizer_time_ms' must be between 0 and {ITINERARY_MAX_OPTIMIZER_TIME_MS:g}")
+    if request.available_minutes is not None and not 0 < request.available_minutes < math.inf:
+        raise HTTPException(status_code=400, detail="'available_minutes' must be positive")
+
+    nearest = marker_indexes["nearest"]
+    markers = [nearest.get(marker_id) for marker_id in marker_ids]
+    missing = [marker_id for marker_id, marker in zip(marker_ids, markers) if marker is None]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Markers not found: {', '.join(missing)}")
+    stops = [localize(marker, request.lang) for marker in markers]
+
+    start = {"lat": request.start.lat, "lng": request.start.lng}
+    places = [start] + stops
+    matrix = distance_matrix([place['lat'] for place in places], [place['lng'] for place in places])
+    order, optimal = await asyncio.to_thread(plan_route, matrix, request.round_trip, optimizer_time / 1000)
+    skipped = []
+    if request.available_minutes is not None:
+        reachable = stops_within(matrix, order, request.available_minutes * 60 * WALKING_SPEED, request.round_trip)
+        order, skipped = order[:reachable], order[reachable:]
+
+    route = [0, *order] + ([0] if request.round_trip else [])
+    legs = []
+    for a, b in zip(route, route[1:]):
+        distance = float(matrix[a, b])
+        legs.append({
+            "from_id": places[a].get('id'),
+            "to_id": places[b].get('id'),
+            "distance": round(distance, 1),
+            "walking_minutes": walking_minutes(distance),
+            "google_maps_url": generate_google_maps_directions_url(places[a], places[b]),
+        })
+    total = sum(float(matrix[a, b]) for a, b in zip(route, route[1:]))
+    return {
+        "stops": [stops[index - 1] for index in order],
+        "legs": legs,
+        "total_distance": round(total, 1),
+        "walking_minutes": walking_minutes(total),
+        "optimal": optimal,
+        "skipped": [places[index]['id'] for index in skipped],
+    }
+
+# Long admin operations run as background jobs, one of each kind at a time
+def record_job(job: Job, status: str):
+    for stage, milliseconds in job.timings.items():
+        if stage != "total":
+            job_stage_duration.observe(milliseconds / 1000, job.kind, stage)
+    for step, seconds in job.steps.items():
+        job_step_duration.observe(seconds, job.kind, step)
+    job_duration.observe(job.timings["total"] / 1000, job.kind, status)
+
+job_runner = JobRunner(
+    db,
+    lease=timedelta(seconds=float(os.environ.get('JOB_LEASE_SECONDS', '300'))),
+    retention=timedelta(days=float(os.environ.get('JOB_RETENTION_DAYS', '7'))),
+    on_finish=record_job if METRICS_ENABLED else None,
+)
+
+async def submit_job(kind: str, work, params: Optional[Dict] = None) -> Dict:
+    job, created = await job_runner.submit(kind, work, params)
+    return {
+        "success": True,
+        "job_id": job['id'],
+        "status": job['status'],
+        "already_running": not created,
+        "message": f"{kind} job {'started' if created else 'already running'}"
+    }
+
+@api_router.get("/admin/jobs")
+async def list_jobs(kind: Optional[str] = None, limit: int = 20):
+    """Recent admin jobs, newest first"""
+    return await job_runner.list(kind, limit=min(limit, 100))
+
+@api_router.get("/admin/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, progress, errors and stage timings of an admin job"""
+    job = await job_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.post("/admin/add-google-maps-urls", status_code=202)
+async def add_google_maps_urls():
+    """Start a job adding Google Maps URLs to existing markers that don't have them"""
+    return await submit_job("add-google-maps-urls", run_add_google_maps_urls)
+
+async def run_add_google_maps_urls(job: Job) -> Dict:
+    from pymongo import UpdateOne
+    
+    job.stage("scan", total=await marker_dataset.collection.estimated_document_count())
+    projection = {"_id": 0, "id": 1, "lat": 1, "lng": 1, "name": 1, "google_maps_url": 1}
+    markers = marker_dataset.collection.find({}, projection)
+    bulk_operations = []
+    
+    async for marker in markers:
+        job.advance()
+        if not marker.get('google_maps_url'):
+            google_maps_url = generate_google_maps_url(
+                marker['lat'], 
+                marker['lng'], 
+                marker['name']
+            )
+            bulk_operations.append(
+                UpdateOne(
+                    {"id": marker['id']},
+                    {"$set": {"google_maps_url": google_maps_url, "revision": None}}
+                )
+            )
+    
+    updated_count = 0
+    if bulk_operations:
+        job.stage("publish", total=len(bulk_operations))
+        await marker_dataset.publish(bulk_operations)
+        updated_count = len(bulk_operations)
+        job.advance(updated_count)
+    
+    return {
+        "success": True,
+        "updated_count": updated_count,
+        "dataset_version": marker_dataset.version,
+        "message": f"Added Google Maps URLs to {updated_count} markers"
+    }
 
 # Helper function to generate Google Maps URL
-def generate_google_maps_url(lat: float, lng: float, name: str = None) -> str:
-    """Generate a Google Maps URL for a location"""
+def google_maps_place(lat: float, lng: float, name: str = None) -> str:
+    """URL-encoded Google Maps place: the name in Ilhéus when known, else the coordinates"""
     if name:
         # Use place name for better mobile experience
         import urllib.parse
-        query = urllib.parse.quote(f"{name}, Ilhéus, Bahia, Brazil")
-        return f"https://www.google.com/maps/search/?api=1&query={query}"
-    else:
-        # Use coordinates
-        return f"https://www.google.com/maps/search/?api=1&query={lat},{lng}"
+        return urllib.parse.quote(f"{name}, Ilhéus, Bahia, Brazil")
+    return f"{lat},{lng}"
+
+def generate_google_maps_url(lat: float, lng: float, name: str = None) -> str:
+    """Generate a Google Maps URL for a location"""
+    return f"https://www.google.com/maps/search/?api=1&query={google_maps_place(lat, lng, name)}"
+
+def generate_google_maps_directions_url(origin: Dict, destination: Dict) -> str:
+    """Generate a Google Maps walking directions URL between two places
+    given as dicts with lat, lng and an optional name"""
+    return (
+        "https://www.google.com/maps/dir/?api=1"
+        f"&origin={google_maps_place(origin['lat'], origin['lng'], origin.get('name'))}"
+        f"&destination={google_maps_place(destination['lat'], destination['lng'], destination.get('name'))}"
+        "&travelmode=walking"
+    )
+
+# Namespace for stable marker ids derived from sheet rows
+MARKER_ID_NAMESPACE = uuid.UUID("6f1c3a52-8e0b-4c8e-9d4a-2b7e5f0c1a93")
+
+def marker_id_for(name: str, category: str) -> str:
+    """Stable id for a sheet row, so unchanged rows keep their id across syncs"""
+    key = f"{category}:{' '.join(name.split()).casefold()}"
+    return str(uuid.uuid5(MARKER_ID_NAMESPACE, key))
+
+def diff_markers(current_markers: List[Dict], new_markers: List[Dict]):
+    """Compute the bulk operations turning current_markers into new_markers.
+    
+    Returns the operations and the inserted/updated/deleted/unchanged counts.
+    """
+    from pymongo import InsertOne, ReplaceOne, DeleteMany
+    
+    current_by_id = {marker['id']: marker for marker in current_markers}
+    bulk_operations = []
+    diff = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    
+    for marker in new_markers:
+        current = current_by_id.pop(marker['id'], None)
+        if current is None:
+            bulk_operations.append(InsertOne(dict(marker)))
+            diff['inserted'] += 1
+        elif current != marker:
+            bulk_operations.append(ReplaceOne({"id": marker['id']}, marker))
+            diff['updated'] += 1
+        else:
+            diff['unchanged'] += 1
+    
+    if current_by_id:
+        bulk_operations.append(DeleteMany({"id": {"$in": list(current_by_id)}}))
+        diff['deleted'] = len(current_by_id)
+    
+    return bulk_operations, diff
 
 # Geocoding helper function
-def geocode_place(place_name: str) -> Optional[Dict]:
+geocode_cache = GeocodeCache(
+    db.geocode_cache,
+    maxsize=int(os.environ.get('GEOCODE_CACHE_SIZE', '10000')),
+    ttl=timedelta(days=float(os.environ.get('GEOCODE_CACHE_TTL_DAYS', '30'))),
+    negative_ttl=timedelta(hours=float(os.environ.get('GEOCODE_NEGATIVE_TTL_HOURS', '24'))),
+)
+def record_geocode_request(status: str, seconds: float):
+    geocode_request_duration.observe(seconds, status)
+
+geocoder = geocoder_from_env(cache=geocode_cache, on_request=record_geocode_request if METRICS_ENABLED else None)
+
+async def geocode_place(place_name: str) -> Optional[Dict]:
     """Geocode a place name in Ilhéus using Google Maps Geocoding API"""
-    try:
-        api_key = os.environ.get('GOOGLE_MAPS_KEY')
-        if not api_key:
-            logger.error("GOOGLE_MAPS_KEY not found in environment")
-            return None
-            
-        # Add Ilhéus context to improve accuracy
-        query = f"{place_name}, Ilhéus, Bahia, Brazil"
-        url = f"https://maps.googleapis.com/maps/api/geocode/json"
-        params = {
-            "address": query,
-            "key": api_key
-        }
-        
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        if data['status'] == 'OK' and len(data['results']) > 0:
-            location = data['results'][0]['geometry']['location']
-            return {
-                'lat': location['lat'],
-                'lng': location['lng']
-            }
-        else:
-            logger.warning(f"Geocoding failed for '{place_name}': {data.get('status')}")
-            return None
-    except Exception as e:
-        logger.error(f"Geocoding error for '{place_name}': {str(e)}")
-        return None
+    return await geocoder.geocode(place_name)
+
+@api_router.get("/admin/geocode-cache")
+async def get_geocode_cache(q: Optional[str] = None, negative: Optional[bool] = None, limit: int = 100):
+    """Inspect cached geocoding results"""
+    entries = await geocode_cache.list_entries(q, negative=negative, limit=limit)
+    return {
+        "stats": geocode_cache.stats(),
+        "entries": entries
+    }
+
+@api_router.delete("/admin/geocode-cache")
+async def invalidate_geocode_cache(place: Optional[str] = None, negative_only: bool = False):
+    """Invalidate one cached place, or all (negative) entries when no place is given"""
+    deleted_count = await geocode_cache.invalidate(place, negative_only=negative_only)
+    await events.publish("geocode_cache", place=place, negative_only=negative_only)
+    return {
+        "success": True,
+        "deleted_count": deleted_count,
+        "message": f"Removed {deleted_count} geocode cache entries"
+    }
+
+async def forget_geocode_entries(payload: Dict):
+    geocode_cache.forget(payload.get('place'), payload.get('negative_only', False))
+
+events.subscribe("geocode_cache", forget_geocode_entries)
 
 # Google Sheets sync endpoint
-@api_router.post("/admin/sync-sheet")
+@api_router.post("/admin/sync-sheet", status_code=202)
 async def sync_google_sheet(sheet_url: str):
-    """Sync markers from Google Sheet"""
-    try:
-        # Extract sheet ID from URL
-        if '/d/' in sheet_url:
-            sheet_id = sheet_url.split('/d/')[1].split('/')[0]
-        else:
-            raise HTTPException(status_code=400, detail="Invalid Google Sheet URL")
-        
-        # Read from Google Sheets (public sheet)
-        url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/gviz/tq?tqx=out:csv"
-        response = requests.get(url)
-        
-        if response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Could not access Google Sheet. Make sure it's shared publicly.")
-        
-        # Parse CSV
-        import csv
-        import io
-        csv_data = csv.DictReader(io.StringIO(response.text))
-        
-        new_markers = []
-        geocode_errors = []
-        
-        for row in csv_data:
-            # Support both formats:
-            # Old: Name, Description, Category
-            # New: Name, Name_EN, Name_ES, Description, Description_EN, Description_ES, Category
-            name = row.get('Name', '').strip()
-            name_en = row.get('Name_EN', '').strip() or None
-            name_es = row.get('Name_ES', '').strip() or None
-            
-            description = row.get('Description', '').strip()
-            description_en = row.get('Description_EN', '').strip() or None
-            description_es = row.get('Description_ES', '').strip() or None
-            
-            category = row.get('Category', '').strip().lower()
-            
-            if not name or not category:
-                continue
-            
-            # Validate category
-            if category not in ['restaurants', 'hotels', 'beaches', 'sights']:
-                logger.warning(f"Invalid category '{category}' for '{name}', skipping")
-                continue
-            
-            # Geocode the place (use primary name)
-            location = geocode_place(name)
+    """Start a job syncing markers from a Google Sheet"""
+    # Extract sheet ID from URL
+    if '/d/' in sheet_url:
+        sheet_id = sheet_url.split('/d/')[1].split('/')[0]
+    else:
+        raise HTTPException(status_code=400, detail="Invalid Google Sheet URL")
+    
+    return await submit_job(
+        "sync-sheet", lambda job: run_sheet_sync(job, sheet_id), {"sheet_url": sheet_url}
+    )
+
+# Sheets are exported as CSV; the template gets the sheet id
+SHEET_EXPORT_URL = os.environ.get(
+    'SHEET_EXPORT_URL', "https://docs.google.com/spreadsheets/d/{sheet_id}/gviz/tq?tqx=out:csv"
+)
+# Rows geocoded and written per bulk write during a sync
+SYNC_BATCH_SIZE = int(os.environ.get('SYNC_BATCH_SIZE', '500'))
+SHEET_CATEGORIES = ['restaurants', 'hotels', 'beaches', 'sights']
+
+def parse_sheet_row(row: Dict) -> Optional[Dict]:
+    """Normalize one sheet row; None when it has no name or a bad category"""
+    # Support both formats:
+    # Old: Name, Description, Category
+    # New: Name, Name_EN, Name_ES, Description, Description_EN, Description_ES, Category
+    def cell(column):
+        return (row.get(column) or '').strip()
+    
+    name = cell('Name')
+    category = cell('Category').lower()
+    
+    if not name or not category:
+        return None
+    
+    # Validate category
+    if category not in SHEET_CATEGORIES:
+        logger.warning(f"Invalid category '{category}' for '{name}', skipping")
+        return None
+    
+    return {
+        "name": name,
+        "name_en": cell('Name_EN') or None,
+        "name_es": cell('Name_ES') or None,
+        "description": cell('Description'),
+        "description_en": cell('Description_EN') or None,
+        "description_es": cell('Description_ES') or None,
+        "category": category
+    }
+
+def marker_from_row(row: Dict, location: Dict) -> Dict:
+    name = row['name']
+    return {
+        "id": marker_id_for(name, row['category']),
+        "name": name,
+        "name_en": row['name_en'],
+        "name_es": row['name_es'],
+        "description": row['description'] or f"{name} em Ilhéus",
+        "description_en": row['description_en'],
+        "description_es": row['description_es'],
+        "lat": location['lat'],
+        "lng": location['lng'],
+        "layer_id": row['category'],
+        # Generate Google Maps URL
+        "google_maps_url": generate_google_maps_url(location['lat'], location['lng'], name),
+        "location": geo_point(location['lat'], location['lng'])
+    }
+
+async def valid_rows(records: AsyncIterator[Dict], job: Job) -> AsyncIterator[Dict]:
+    async for record in records:
+        job.advance()
+        row = parse_sheet_row(record)
+        if row is not None:
+            yield row
+
+async def geocoded_markers(rows: AsyncIterator[Dict], job: Job, batch_size: int) -> AsyncIterator[Dict]:
+    """Geocode rows a batch at a time (concurrently within a batch, using the primary name)"""
+    def geocoded(name: str, location: Optional[Dict]):
+        if location is None:
+            job.error(name)
+    
+    async for batch in batched(rows, batch_size):
+        locations = await geocoder.geocode_many((row['name'] for row in batch), on_result=geocoded)
+        for row in batch:
+            location = locations.get(row['name'])
             if location:
-                # Generate Google Maps URL
-                google_maps_url = generate_google_maps_url(location['lat'], location['lng'], name)
-                
-                marker = {
-                    "id": str(uuid.uuid4()),
-                    "name": name,
-                    "name_en": name_en,
-                    "name_es": name_es,
-                    "description": description or f"{name} em Ilhéus",
-                    "description_en": description_en,
-                    "description_es": description_es,
-                    "lat": location['lat'],
-                    "lng": location['lng'],
-                    "layer_id": category,
-                    "google_maps_url": google_maps_url
-                }
-                new_markers.append(marker)
+                yield marker_from_row(row, location)
+
+async def marker_operations(markers: AsyncIterator[Dict], job: Job, batch_size: int,
+                            diff: Dict) -> AsyncIterator[List]:
+    """Bulk operations turning the current markers into the streamed ones.
+    
+    Each batch is diffed against the current version by id, so unchanged
+    markers are not rewritten; markers missing from the stream are deleted
+    at the end. Only the ids seen so far are kept across batches.
+    """
+    from pymongo import DeleteMany, ReplaceOne
+    
+    seen = set()
+    async for batch in batched(markers, batch_size):
+        unique, repeated = {}, []
+        for marker in batch:
+            if marker['id'] in unique or marker['id'] in seen:
+                logger.warning(f"Duplicate row '{marker['name']}' in '{marker['layer_id']}', keeping the last one")
+            if marker['id'] in seen:
+                repeated.append(marker)
             else:
-                geocode_errors.append(name)
-        
-        if not new_markers:
-            return {
-                "success": False,
-                "message": "No valid markers found in sheet",
-                "geocode_errors": geocode_errors
-            }
-        
-        # Replace markers in database
-        await db.markers.delete_many({})
-        await db.markers.insert_many(new_markers)
-        
-        logger.info(f"Synced {len(new_markers)} markers from Google Sheet")
-        
+                unique[marker['id']] = marker
+        current = await marker_dataset.collection.find(
+            {"id": {"$in": list(unique)}}, {"_id": 0, "revision": 0}
+        ).to_list(None)
+        operations, batch_diff = diff_markers(current, list(unique.values()))
+        operations += [ReplaceOne({"id": marker['id']}, marker) for marker in repeated]
+        for key, count in batch_diff.items():
+            diff[key] += count
+        seen.update(unique)
+        yield operations
+    
+    diff['markers'] = len(seen)
+    if not seen:
+        return
+    
+    job.stage("delete")
+    async def stale_ids():
+        async for marker in marker_dataset.collection.find({}, {"_id": 0, "id": 1}):
+            if marker['id'] not in seen:
+                yield marker['id']
+    
+    async for ids in batched(stale_ids(), batch_size):
+        diff['deleted'] += len(ids)
+        job.advance(len(ids))
+        yield [DeleteMany({"id": {"$in": ids}})]
+    job.stage("publish")
+
+async def run_sheet_sync(job: Job, sheet_id: str, batch_size: int = None) -> Dict:
+    """Stream, geocode and publish a sheet, reporting progress on `job`.
+    
+    The CSV export is parsed while it downloads and flows through
+    parse -> validate -> geocode -> diff in batches of `batch_size` rows,
+    each written to the staging dataset version as it is ready, so memory
+    stays bounded by the batch size rather than the sheet size, apart from
+    the set of ids seen so far (about 100 bytes a row) the diff keeps to
+    find duplicates and deleted markers.
+    """
+    batch_size = batch_size or SYNC_BATCH_SIZE
+    job.stage("download")
+    # Read from Google Sheets (public sheet)
+    url = SHEET_EXPORT_URL.format(sheet_id=sheet_id)
+    diff = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "markers": 0}
+    
+    async with httpx.AsyncClient(timeout=60.0, follow_redirects=True) as http:
+        async with http.stream("GET", url) as response:
+            if response.status_code != 200:
+                raise ValueError("Could not access Google Sheet. Make sure it's shared publicly.")
+            
+            job.stage("ingest")
+            # Steps interleave as rows stream through; each is charged its own time
+            chunks = timed(response.aiter_text(), job, "download")
+            rows = timed(valid_rows(csv_records(chunks), job), job, "parse")
+            markers = timed(geocoded_markers(rows, job, batch_size), job, "geocode")
+            operations = timed(marker_operations(markers, job, batch_size, diff), job, "diff")
+            # Build and validate a new dataset version, then flip to it
+            with job.step("write"):
+                version = await marker_dataset.publish_stream(operations, skip_unchanged=True)
+    
+    markers_count = diff.pop('markers')
+    if not markers_count:
         return {
-            "success": True,
-            "markers_added": len(new_markers),
-            "geocode_errors": geocode_errors,
-            "message": f"Successfully synced {len(new_markers)} markers"
+            "success": False,
+            "message": "No valid markers found in sheet",
+            "geocode_errors": job.errors
         }
-        
-    except Exception as e:
-        logger.error(f"Error syncing sheet: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    
+    logger.info(
+        f"Synced {markers_count} markers from Google Sheet "
+        f"({diff['inserted']} inserted, {diff['updated']} updated, {diff['deleted']} deleted)"
+    )
+    
+    return {
+        "success": True,
+        "markers_added": markers_count,
+        **diff,
+        "dataset_version": version or marker_dataset.version,
+        "geocode_errors": job.errors,
+        "message": f"Successfully synced {markers_count} markers"
+    }
+
+
+@api_router.get("/snapshot")
+async def get_snapshot(request: Request):
+    """Manifest of the current snapshot files: their URLs, hashes and sizes"""
+    manifest = await asyncio.to_thread(snapshot_store.load) if SNAPSHOT_DIR else None
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="No snapshot has been exported")
+    body = json.dumps(manifest).encode()
+    headers = {"ETag": f'"{hashlib.sha256(body).hexdigest()[:16]}"', "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get('if-none-match'), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@api_router.get("/snapshots/{file_name}", include_in_schema=False)
+async def get_snapshot_file(request: Request, file_name: str):
+    """Serve a snapshot file, for deployments without a CDN or nginx in front.
+    
+    The precompressed variant is sent when the client accepts it; content
+    hashed names let every response be cached indefinitely.
+    """
+    path = snapshot_store.path(file_name) if SNAPSHOT_DIR else None
+    if path is None or not path.is_file():
+        raise HTTPException(status_code=404, detail="Snapshot file not found")
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "Vary": "Accept-Encoding"}
+    encoding = choose_encoding(request.headers.get('accept-encoding'))
+    variant = snapshot_store.path(file_name, encoding) if encoding else None
+    if variant is not None and variant.is_file():
+        path = variant
+        headers["Content-Encoding"] = encoding
+    return FileResponse(path, media_type="application/json", headers=headers)
+
+@api_router.get("/admin/markers/versions")
+async def get_marker_versions():
+    """List the kept marker dataset versions"""
+    return await marker_dataset.versions()
+
+@api_router.post("/admin/markers/rollback")
+async def rollback_markers(version: Optional[int] = None):
+    """Make a previous marker dataset version current again"""
+    try:
+        current = await marker_dataset.rollback(version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "success": True,
+        "dataset_version": current,
+        "message": f"Markers rolled back to version {current}"
+    }
+
+@api_router.get("/admin/worker")
+async def get_worker():
+    """This worker's view of the data, to check that workers agree"""
+    return {
+        "worker": events.worker,
+        "dataset_version": marker_dataset.version,
+        "index_version": marker_indexes["version"],
+        "events": events.stats(),
+        "sse_subscribers": dataset_broadcast.subscribers,
+        "response_cache": response_cache.stats(),
+        "tile_cache": tile_cache.stats(),
+    }
+
+@api_router.get("/admin/migrations")
+async def get_migrations():
+    """List registered migrations and when they were applied"""
+    applied = await migrations.applied(db)
+    return [
+        {"id": migration_id, **{k: v for k, v in applied.get(migration_id, {"status": "pending"}).items() if k != '_id'}}
+        for migration_id in migrations.ids
+    ]
 
 
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MINIMUM_SIZE,
+)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Metrics in the Prometheus text format"""
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+for cache_name, cache_stats in (("response_cache", response_cache.stats), ("geocode_cache", geocode_cache.stats),
+                                 ("tile_cache", tile_cache.stats)):
+    metrics.collected(f"{cache_name}_hits_total", f"{cache_name} lookups answered from the cache", "counter",
+                      lambda stats=cache_stats: [((), stats()["hits"])])
+    metrics.collected(f"{cache_name}_misses_total", f"{cache_name} lookups that missed", "counter",
+                      lambda stats=cache_stats: [((), stats()["misses"])])
+    metrics.collected(f"{cache_name}_hit_ratio", f"Share of {cache_name} lookups that hit since start", "gauge",
+                      lambda stats=cache_stats: [((), ratio(stats()["hits"], stats()["misses"]))])
+metrics.collected("geocode_api_calls_total", "Requests sent to the geocoding API", "counter",
+                  lambda: [((), geocoder.calls)])
+metrics.collected("marker_dataset_version", "Marker dataset version served by this worker", "gauge",
+                  lambda: [((), marker_dataset.version)])
+metrics.collected("events_total", "Cross-worker events by direction", "counter",
+                  lambda: [(("published",), events.published), (("received",), events.received)],
+                  ["direction"])
+metrics.collected("sse_subscribers", "Open /api/events streams on this worker", "gauge",
+                  lambda: [((), dataset_broadcast.subscribers)])
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-After", "Link"],
 )
 
+if METRICS_ENABLED:
+    # Outermost, so the time includes compression and CORS handling
+    app.add_middleware(MetricsMiddleware, histogram=request_duration)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -274,322 +1452,401 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # Lets open event streams finish instead of holding the shutdown up
+    dataset_broadcast.close()
+    task = getattr(app.state, 'events_task', None)
+    if task:
+        task.cancel()
+    await job_runner.shutdown()
     client.close()
+    await geocoder.aclose()
+
+@app.on_event("startup")
+async def bootstrap_database():
+    """Load the current marker version, create indexes and apply pending migrations"""
+    # Load first: the marker indexes belong on the current version's collection
+    await marker_dataset.load()
+    await ensure_indexes()
+    await migrations.run(db)
+    if marker_indexes["version"] != marker_dataset.version:
+        await rebuild_marker_indexes(marker_dataset.version)
+        await refresh_tiles(marker_dataset.version)
+    if SNAPSHOT_DIR and (snapshot_store.load() or {}).get("version") != marker_dataset.version:
+        await export_snapshot()
+
+async def ensure_indexes():
+    """Create the indexes every query relies on (idempotent, cheap when they exist)"""
+    await db.layers.create_index([("id", 1)], unique=True)
+    await marker_dataset.ensure_indexes()
+    await events.ensure_collection()
+    await geocode_cache.ensure_indexes()
+    await job_runner.ensure_indexes()
 
-# Seed data on startup
 @app.on_event("startup")
-async def seed_database():
-    # Check if data already exists
-    existing_layers = await db.layers.count_documents({})
+async def follow_events():
+    # Keeps caches and indexes in line with writes made by other workers
+    if os.environ.get('CACHE_EVENTS', 'true').lower() != 'false':
+        app.state.events_task = asyncio.create_task(events.follow())
+
+@migrations.migration("0001_seed_sample_data")
+async def seed_sample_data():
+    """Seed the sample Ilhéus layers and markers into an empty database"""
+    from pymongo import InsertOne
     
-    if existing_layers == 0:
-        logger.info("Seeding database with sample data for Ilhéus...")
-        
-        # Create layers
-        layers = [
-            {
-                "id": "restaurants",
-                "name": "Restaurantes",
-                "color": "#FF4444",
-                "icon": "restaurant",
-                "visible": True
-            },
-            {
-                "id": "hotels",
-                "name": "Hotéis",
-                "color": "#7BDCB5",
-                "icon": "hotel",
-                "visible": True
-            },
-            {
-                "id": "sights",
-                "name": "Pontos Turísticos",
-                "color": "#4A90E2",
-                "icon": "place",
-                "visible": True
-            },
-            {
-                "id": "beaches",
-                "name": "Praias",
-                "color": "#FFD93D",
-                "icon": "beach_access",
-                "visible": True
-            }
-        ]
+    if await db.layers.find_one({}, {"_id": 1}):
+        logger.info("Database already contains layers, skipping sample data")
+        return
+    
+    logger.info("Seeding database with sample data for Ilhéus...")
+    
+    # Create layers
+    layers = [
+        {
+            "id": "restaurants",
+            "name": "Restaurantes",
+            "color": "#FF4444",
+            "icon": "restaurant",
+            "visible": True
+        },
+        {
+            "id": "hotels",
+            "name": "Hotéis",
+            "color": "#7BDCB5",
+            "icon": "hotel",
+            "visible": True
+        },
+        {
+            "id": "sights",
+            "name": "Pontos Turísticos",
+            "color": "#4A90E2",
+            "icon": "place",
+            "visible": True
+        },
+        {
+            "id": "beaches",
+            "name": "Praias",
+            "color": "#FFD93D",
+            "icon": "beach_access",
+            "visible": True
+        }
+    ]
+    
+    # Create markers for Ilhéus
+    markers = [
+        # Restaurants
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Restaurante Barra Grande",
+            "description": "Culinária regional com frutos do mar frescos e vista para o mar.",
+            "lat": -14.7947,
+            "lng": -39.0447,
+            "layer_id": "restaurants"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Pizzaria Tia Déia",
+            "description": "Pizzas artesanais em forno à lenha, ambiente aconchegante.",
+            "lat": -14.7889,
+            "lng": -39.0495,
+            "layer_id": "restaurants"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Vesúvio Bar",
+            "description": "Bar histórico frequentado por Jorge Amado, petiscos tradicionais.",
+            "lat": -14.7923,
+            "lng": -39.0478,
+            "layer_id": "restaurants"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Restaurante Cabana Gabriela",
+            "description": "Moqueca baiana tradicional e pratos típicos da região.",
+            "lat": -14.7951,
+            "lng": -39.0443,
+            "layer_id": "restaurants"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Sabor da Terra",
+            "description": "Comida caseira baiana com tempero especial e acarajé delicioso.",
+            "lat": -14.7905,
+            "lng": -39.0511,
+            "layer_id": "restaurants"
+        },
         
-        # Create markers for Ilhéus
-        markers = [
-            # Restaurants
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Restaurante Barra Grande",
-                "description": "Culinária regional com frutos do mar frescos e vista para o mar.",
-                "lat": -14.7947,
-                "lng": -39.0447,
-                "layer_id": "restaurants"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Pizzaria Tia Déia",
-                "description": "Pizzas artesanais em forno à lenha, ambiente aconchegante.",
-                "lat": -14.7889,
-                "lng": -39.0495,
-                "layer_id": "restaurants"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Vesúvio Bar",
-                "description": "Bar histórico frequentado por Jorge Amado, petiscos tradicionais.",
-                "lat": -14.7923,
-                "lng": -39.0478,
-                "layer_id": "restaurants"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Restaurante Cabana Gabriela",
-                "description": "Moqueca baiana tradicional e pratos típicos da região.",
-                "lat": -14.7951,
-                "lng": -39.0443,
-                "layer_id": "restaurants"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Sabor da Terra",
-                "description": "Comida caseira baiana com tempero especial e acarajé delicioso.",
-                "lat": -14.7905,
-                "lng": -39.0511,
-                "layer_id": "restaurants"
-            },
-            
-            # Hotels
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Hotel Jardim Atlântico",
-                "description": "Hotel resort à beira-mar com piscinas, spa e restaurante.",
-                "lat": -14.8127,
-                "lng": -39.0331,
-                "layer_id": "hotels"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Pousada Vila das Pedras",
-                "description": "Pousada charmosa com arquitetura colonial e café da manhã regional.",
-                "lat": -14.7891,
-                "lng": -39.0489,
-                "layer_id": "hotels"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Ilhéus Praia Hotel",
-                "description": "Hotel moderno no centro histórico com vista para a Catedral.",
-                "lat": -14.7915,
-                "lng": -39.0485,
-                "layer_id": "hotels"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Cana Brava Resort",
-                "description": "Resort all-inclusive com praia particular e atividades aquáticas.",
-                "lat": -14.8234,
-                "lng": -39.0289,
-                "layer_id": "hotels"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Pousada dos Hibiscos",
-                "description": "Pousada boutique com jardim tropical e atendimento personalizado.",
-                "lat": -14.7967,
-                "lng": -39.0401,
-                "layer_id": "hotels"
-            },
-            
-            # Sights
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Casa de Jorge Amado",
-                "description": "Museu dedicado ao escritor Jorge Amado com acervo pessoal.",
-                "lat": -14.7919,
-                "lng": -39.0476,
-                "layer_id": "sights"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Catedral de São Sebastião",
-                "description": "Igreja histórica do século XVI com arquitetura colonial.",
-                "lat": -14.7928,
-                "lng": -39.0481,
-                "layer_id": "sights"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Bataclan (Casa de Gabriela)",
-                "description": "Cenário do romance Gabriela Cravo e Canela, bar icônico.",
-                "lat": -14.7921,
-                "lng": -39.0479,
-                "layer_id": "sights"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Praia dos Milionários",
-                "description": "Praia urbana famosa com orla arborizada e quiosques.",
-                "lat": -14.7983,
-                "lng": -39.0393,
-                "layer_id": "sights"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Fazenda Yrerê (Fazenda de Cacau)",
-                "description": "Fazenda histórica de cacau com tour pela plantação.",
-                "lat": -14.8456,
-                "lng": -39.0723,
-                "layer_id": "sights"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Teatro Municipal de Ilhéus",
-                "description": "Teatro centenário com apresentações culturais e shows.",
-                "lat": -14.7925,
-                "lng": -39.0483,
-                "layer_id": "sights"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Praia do Cristo",
-                "description": "Praia com Cristo Redentor e mirante com vista panorâmica.",
-                "lat": -14.8056,
-                "lng": -39.0341,
-                "layer_id": "sights"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Porto de Ilhéus",
-                "description": "Porto histórico do ciclo do cacau, belo pôr do sol.",
-                "lat": -14.7897,
-                "lng": -39.0493,
-                "layer_id": "sights"
-            },
-            
-            # Beaches
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Praia dos Milionários",
-                "description": "Praia urbana mais famosa de Ilhéus, com quiosques e ótima infraestrutura.",
-                "lat": -14.7995,
-                "lng": -39.0385,
-                "layer_id": "beaches"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Praia do Cristo",
-                "description": "Praia tranquila com águas calmas, ideal para famílias.",
-                "lat": -14.8045,
-                "lng": -39.0351,
-                "layer_id": "beaches"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Praia do Sul",
-                "description": "Praia extensa com areias claras e coqueirais.",
-                "lat": -14.8156,
-                "lng": -39.0298,
-                "layer_id": "beaches"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Praia dos Coqueiros",
-                "description": "Praia cercada por coqueiros, ótima para caminhadas.",
-                "lat": -14.8089,
-                "lng": -39.0321,
-                "layer_id": "beaches"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Praia do Marciano",
-                "description": "Praia rústica e preservada, perfeita para relaxar.",
-                "lat": -14.7823,
-                "lng": -39.0512,
-                "layer_id": "beaches"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Praia da Concha",
-                "description": "Praia protegida com mar calmo, ideal para banho.",
-                "lat": -14.7878,
-                "lng": -39.0468,
-                "layer_id": "beaches"
-            }
-        ]
+        # Hotels
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Hotel Jardim Atlântico",
+            "description": "Hotel resort à beira-mar com piscinas, spa e restaurante.",
+            "lat": -14.8127,
+            "lng": -39.0331,
+            "layer_id": "hotels"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Pousada Vila das Pedras",
+            "description": "Pousada charmosa com arquitetura colonial e café da manhã regional.",
+            "lat": -14.7891,
+            "lng": -39.0489,
+            "layer_id": "hotels"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Ilhéus Praia Hotel",
+            "description": "Hotel moderno no centro histórico com vista para a Catedral.",
+            "lat": -14.7915,
+            "lng": -39.0485,
+            "layer_id": "hotels"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Cana Brava Resort",
+            "description": "Resort all-inclusive com praia particular e atividades aquáticas.",
+            "lat": -14.8234,
+            "lng": -39.0289,
+            "layer_id": "hotels"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Pousada dos Hibiscos",
+            "description": "Pousada boutique com jardim tropical e atendimento personalizado.",
+            "lat": -14.7967,
+            "lng": -39.0401,
+            "layer_id": "hotels"
+        },
         
-        await db.layers.insert_many(layers)
-        await db.markers.insert_many(markers)
+        # Sights
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Casa de Jorge Amado",
+            "description": "Museu dedicado ao escritor Jorge Amado com acervo pessoal.",
+            "lat": -14.7919,
+            "lng": -39.0476,
+            "layer_id": "sights"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Catedral de São Sebastião",
+            "description": "Igreja histórica do século XVI com arquitetura colonial.",
+            "lat": -14.7928,
+            "lng": -39.0481,
+            "layer_id": "sights"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Bataclan (Casa de Gabriela)",
+            "description": "Cenário do romance Gabriela Cravo e Canela, bar icônico.",
+            "lat": -14.7921,
+            "lng": -39.0479,
+            "layer_id": "sights"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Praia dos Milionários",
+            "description": "Praia urbana famosa com orla arborizada e quiosques.",
+            "lat": -14.7983,
+            "lng": -39.0393,
+            "layer_id": "sights"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Fazenda Yrerê (Fazenda de Cacau)",
+            "description": "Fazenda histórica de cacau com tour pela plantação.",
+            "lat": -14.8456,
+            "lng": -39.0723,
+            "layer_id": "sights"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Teatro Municipal de Ilhéus",
+            "description": "Teatro centenário com apresentações culturais e shows.",
+            "lat": -14.7925,
+            "lng": -39.0483,
+            "layer_id": "sights"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Praia do Cristo",
+            "description": "Praia com Cristo Redentor e mirante com vista panorâmica.",
+            "lat": -14.8056,
+            "lng": -39.0341,
+            "layer_id": "sights"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Porto de Ilhéus",
+            "description": "Porto histórico do ciclo do cacau, belo pôr do sol.",
+            "lat": -14.7897,
+            "lng": -39.0493,
+            "layer_id": "sights"
+        },
         
-        logger.info(f"Seeded {len(layers)} layers and {len(markers)} markers")
-    else:
-        # Check if beaches layer exists, if not add it
-        beaches_layer = await db.layers.find_one({"id": "beaches"})
-        if not beaches_layer:
-            logger.info("Adding beaches layer to existing data...")
-            new_layer = {
-                "id": "beaches",
-                "name": "Praias",
-                "color": "#6EC1E4",
-                "icon": "beach_access",
-                "visible": True
-            }
-            await db.layers.insert_one(new_layer)
-            
-            # Add beach markers
-            beach_markers = [
-                {
-                    "id": str(uuid.uuid4()),
-                    "name": "Praia dos Milionários",
-                    "description": "Praia urbana mais famosa de Ilhéus, com quiosques e ótima infraestrutura.",
-                    "lat": -14.7995,
-                    "lng": -39.0385,
-                    "layer_id": "beaches"
-                },
-                {
-                    "id": str(uuid.uuid4()),
-                    "name": "Praia do Cristo",
-                    "description": "Praia tranquila com águas calmas, ideal para famílias.",
-                    "lat": -14.8045,
-                    "lng": -39.0351,
-                    "layer_id": "beaches"
-                },
-                {
-                    "id": str(uuid.uuid4()),
-                    "name": "Praia do Sul",
-                    "description": "Praia extensa com areias claras e coqueirais.",
-                    "lat": -14.8156,
-                    "lng": -39.0298,
-                    "layer_id": "beaches"
-                },
-                {
-                    "id": str(uuid.uuid4()),
-                    "name": "Praia dos Coqueiros",
-                    "description": "Praia cercada por coqueiros, ótima para caminhadas.",
-                    "lat": -14.8089,
-                    "lng": -39.0321,
-                    "layer_id": "beaches"
-                },
-                {
-                    "id": str(uuid.uuid4()),
-                    "name": "Praia do Marciano",
-                    "description": "Praia rústica e preservada, perfeita para relaxar.",
-                    "lat": -14.7823,
-                    "lng": -39.0512,
-                    "layer_id": "beaches"
-                },
-                {
-                    "id": str(uuid.uuid4()),
-                    "name": "Praia da Concha",
-                    "description": "Praia protegida com mar calmo, ideal para banho.",
-                    "lat": -14.7878,
-                    "lng": -39.0468,
-                    "layer_id": "beaches"
-                }
-            ]
-            await db.markers.insert_many(beach_markers)
-            logger.info(f"Added beaches layer with {len(beach_markers)} markers")
-        else:
-            logger.info("Database already contains beaches layer")
\ No newline at end of file
+        # Beaches
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Praia dos Milionários",
+            "description": "Praia urbana mais famosa de Ilhéus, com quiosques e ótima infraestrutura.",
+            "lat": -14.7995,
+            "lng": -39.0385,
+            "layer_id": "beaches"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Praia do Cristo",
+            "description": "Praia tranquila com águas calmas, ideal para famílias.",
+            "lat": -14.8045,
+            "lng": -39.0351,
+            "layer_id": "beaches"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Praia do Sul",
+            "description": "Praia extensa com areias claras e coqueirais.",
+            "lat": -14.8156,
+            "lng": -39.0298,
+            "layer_id": "beaches"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Praia dos Coqueiros",
+            "description": "Praia cercada por coqueiros, ótima para caminhadas.",
+            "lat": -14.8089,
+            "lng": -39.0321,
+            "layer_id": "beaches"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Praia do Marciano",
+            "description": "Praia rústica e preservada, perfeita para relaxar.",
+            "lat": -14.7823,
+            "lng": -39.0512,
+            "layer_id": "beaches"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Praia da Concha",
+            "description": "Praia protegida com mar calmo, ideal para banho.",
+            "lat": -14.7878,
+            "lng": -39.0468,
+            "layer_id": "beaches"
+        }
+    ]
+    
+    await db.layers.insert_many([canonical_layer(layer) for layer in layers])
+    await layers_changed()
+    await marker_dataset.publish([InsertOne(canonical_marker(marker)) for marker in markers])
+    
+    logger.info(f"Seeded {len(layers)} layers and {len(markers)} markers")
+
+@migrations.migration("0002_beaches_layer")
+async def add_beaches_layer():
+    """Add the beaches layer to databases seeded before it existed"""
+    from pymongo import InsertOne
+    
+    if await db.layers.find_one({"id": "beaches"}, {"_id": 1}):
+        logger.info("Database already contains beaches layer")
+        return
+    
+    logger.info("Adding beaches layer to existing data...")
+    new_layer = {
+        "id": "beaches",
+        "name": "Praias",
+        "color": "#6EC1E4",
+        "icon": "beach_access",
+        "visible": True
+    }
+    await db.layers.insert_one(canonical_layer(new_layer))
+    await layers_changed()
+    
+    # Add beach markers
+    beach_markers = [
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Praia dos Milionários",
+            "description": "Praia urbana mais famosa de Ilhéus, com quiosques e ótima infraestrutura.",
+            "lat": -14.7995,
+            "lng": -39.0385,
+            "layer_id": "beaches"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Praia do Cristo",
+            "description": "Praia tranquila com águas calmas, ideal para famílias.",
+            "lat": -14.8045,
+            "lng": -39.0351,
+            "layer_id": "beaches"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Praia do Sul",
+            "description": "Praia extensa com areias claras e coqueirais.",
+            "lat": -14.8156,
+            "lng": -39.0298,
+            "layer_id": "beaches"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Praia dos Coqueiros",
+            "description": "Praia cercada por coqueiros, ótima para caminhadas.",
+            "lat": -14.8089,
+            "lng": -39.0321,
+            "layer_id": "beaches"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Praia do Marciano",
+            "description": "Praia rústica e preservada, perfeita para relaxar.",
+            "lat": -14.7823,
+            "lng": -39.0512,
+            "layer_id": "beaches"
+        },
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Praia da Concha",
+            "description": "Praia protegida com mar calmo, ideal para banho.",
+            "lat": -14.7878,
+            "lng": -39.0468,
+            "layer_id": "beaches"
+        }
+    ]
+    await marker_dataset.publish([InsertOne(canonical_marker(marker)) for marker in beach_markers])
+    logger.info(f"Added beaches layer with {len(beach_markers)} markers")
+
+@migrations.migration("0003_marker_locations")
+async def backfill_marker_locations():
+    """Give markers written before the 2dsphere index a GeoJSON location"""
+    from pymongo import UpdateOne
+    
+    cursor = marker_dataset.collection.find({"location": {"$exists": False}}, {"_id": 0, "id": 1, "lat": 1, "lng": 1})
+    bulk_operations = [
+        UpdateOne({"id": marker['id']}, {"$set": {"location": geo_point(marker['lat'], marker['lng'])}})
+        async for marker in cursor
+    ]
+    if bulk_operations:
+        await marker_dataset.publish(bulk_operations)
+        logger.info(f"Added GeoJSON locations to {len(bulk_operations)} markers")
+
+@migrations.migration("0004_canonical_documents")
+async def canonicalize_documents():
+    """Store every layer and marker field, so reads can skip validation"""
+    from pymongo import UpdateMany
+    
+    modified = 0
+    for field, info in Layer.model_fields.items():
+        if info.default is not PydanticUndefined:
+            result = await db.layers.update_many({field: {"$exists": False}}, {"$set": {field: info.default}})
+            modified += result.modified_count
+    if modified:
+        await layers_changed()
+    
+    bulk_operations = []
+    for field, info in Marker.model_fields.items():
+        if info.default is PydanticUndefined:
+            continue
+        if await marker_dataset.collection.find_one({field: {"$exists": False}}, {"_id": 1}):
+            bulk_operations.append(UpdateMany({field: {"$exists": False}}, {"$set": {field: info.default}}))
+    if bulk_operations:
+        await marker_dataset.publish(bulk_operations)
+        logger.info(f"Filled in {len(bulk_operations)} missing marker fields")
@@ -0,0 +1,84 @@
+import csv
+from collections import deque
+from typing import AsyncIterable, AsyncIterator, Dict, List, TypeVar
+
+
+T = TypeVar("T")
+
+
+class _RecordQueue:
+    """Iterator handed to csv.reader; yields the complete records pushed so far"""
+
+    def __init__(self):
+        self.records = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.records:
+            raise StopIteration
+        return self.records.popleft()
+
+
+async def csv_records(chunks: AsyncIterable[str]) -> AsyncIterator[Dict[str, str]]:
+    """Parse CSV text arriving in arbitrary chunks into dict rows, one at a time.
+
+    Text is split into lines as it arrives and lines are joined into a record
+    until its double quotes balance, so quoted fields may contain newlines
+    and commas. Only complete records reach ``csv.DictReader``, which keeps
+    at most one record in memory regardless of the sheet size.
+    """
+    queue = _RecordQueue()
+    reader = csv.DictReader(queue)
+    buffer = ""
+    record = []
+    quotes = 0
+
+    def push(line: str):
+        nonlocal quotes
+        record.append(line)
+        quotes += line.count('"')
+        if quotes % 2:
+            return False
+        queue.records.append("".join(record))
+        record.clear()
+        quotes = 0
+        return True
+
+    def rows():
+        # The header record sets the field names and blank records yield nothing
+        try:
+            yield next(reader)
+        except StopIteration:
+            pass
+
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        end = buffer.find("\n")
+        while end != -1:
+            if push(buffer[start:end + 1]):
+                for row in rows():
+                    yield row
+            start = end + 1
+            end = buffer.find("\n", start)
+        buffer = buffer[start:]
+
+    if buffer or record:
+        record.append(buffer)
+        queue.records.append("".join(record))
+        for row in rows():
+            yield row
+
+
+async def batched(items: AsyncIterable[T], size: int) -> AsyncIterator[List[T]]:
+    """Group an async stream into lists of at most ``size`` items"""
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from compression import compress, supported_encodings
+
+
+logger = logging.getLogger(__name__)
+
+# File name suffix per content coding, as nginx's gzip_static/brotli_static expect
+ENCODING_SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+SNAPSHOT_FILE_RE = re.compile(r"^[a-z]+(\.[a-z]{2})?\.[0-9a-f]{16}\.json$")
+
+MANIFEST_NAME = "manifest.json"
+
+
+def _base_name(file_name: str) -> str:
+    """A snapshot file's name without its compression suffix"""
+    for suffix in ENCODING_SUFFIXES.values():
+        if file_name.endswith(suffix):
+            return file_name[:-len(suffix)]
+    return file_name
+
+
+def _write_atomic(path: Path, data: bytes):
+    temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    temporary.write_bytes(data)
+    os.replace(temporary, path)
+
+
+class SnapshotStore:
+    """Immutable, content-addressed JSON files for serving without the API.
+
+    ``write`` stores a body as ``{name}.{hash}.json`` next to gzip and
+    brotli variants compressed at the highest levels (done once per file,
+    not per request). Names change whenever content does, so the files can
+    be cached forever by browsers and CDNs; ``manifest.json`` points at the
+    current set. Files already on disk are not rewritten, so several
+    workers exporting the same data do the work once and never expose a
+    partial file. Files are removed ``retention`` seconds after a manifest
+    stopped referencing them (publishing touches the files it supersedes),
+    leaving time for clients holding an older manifest.
+    """
+
+    def __init__(self, directory: Path, base_url: str = "/api/snapshots/", retention: float = 7 * 86400,
+                 gzip_level: int = 9, brotli_quality: int = 11):
+        self.directory = Path(directory)
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.retention = retention
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.manifest: Optional[Dict] = None
+
+    def path(self, file_name: str, encoding: Optional[str] = None) -> Optional[Path]:
+        """Path of a snapshot file or its ``encoding`` variant; None for other names"""
+        if not SNAPSHOT_FILE_RE.match(file_name):
+            return None
+        return self.directory / (file_name + ENCODING_SUFFIXES[encoding] if encoding else file_name)
+
+    def write(self, name: str, body: bytes) -> Dict:
+        """Store ``body`` under a content-hashed name; returns its manifest entry"""
+        digest = hashlib.sha256(body).hexdigest()
+        file_name = f"{name}.{digest[:16]}.json"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / file_name
+        sizes = {}
+        for encoding in supported_encodings():
+            variant = path.with_name(file_name + ENCODING_SUFFIXES[encoding])
+            if not variant.exists():
+                _write_atomic(variant, compress(body, encoding, self.gzip_level, self.brotli_quality))
+            sizes[encoding] = variant.stat().st_size
+        # The plain file goes last: once it exists, every variant does
+        if not path.exists():
+            _write_atomic(path, body)
+        return {
+            "file": file_name,
+            "url": self.base_url + file_name,
+            "sha256": digest,
+            "bytes": len(body),
+            "encoded_bytes": sizes,
+        }
+
+    def publish(self, version: int, files: Dict, revision: int = 0) -> Dict:
+        """Make ``files`` (a nested dict of ``write`` entries) the current snapshot;
+        ``revision`` is the markers' change revision the files reflect"""
+        previous = self.load()
+        keep = set(self._referenced(files))
+        # Retention counts from now for the files this manifest supersedes
+        if previous:
+            self._touch(set(self._referenced(previous.get("files", {}))) - keep)
+        manifest = {
+            "version": version,
+            "revision": revision,
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "files": files,
+        }
+        _write_atomic(self.directory / MANIFEST_NAME, json.dumps(manifest, indent=2).encode())
+        self.manifest = manifest
+        self.prune(keep)
+        return manifest
+
+    def load(self) -> Optional[Dict]:
+        """Read the manifest left by a previous run (or another worker)"""
+        try:
+            self.manifest = json.loads((self.directory / MANIFEST_NAME).read_bytes())
+        except (OSError, ValueError):
+            self.manifest = None
+        return self.manifest
+
+    @staticmethod
+    def _referenced(files: Dict) -> Iterable[str]:
+        for entry in files.values():
+            if "file" in entry:
+                yield entry["file"]
+            else:
+                yield from SnapshotStore._referenced(entry)
+
+    def _touch(self, file_names: Iterable[str]):
+        for file_name in file_names:
+            for suffix in ("", *ENCODING_SUFFIXES.values()):
+                try:
+                    os.utime(self.directory / (file_name + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def prune(self, keep: Iterable[str]):
+        keep = set(keep)
+        cutoff = time.time() - self.retention
+        for path in self.directory.iterdir():
+            base = _base_name(path.name)
+            if base in keep or not SNAPSHOT_FILE_RE.match(base):
+                continue
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
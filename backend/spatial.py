@@ -0,0 +1,151 @@
+import heapq
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+EARTH_RADIUS = 6371008.8
+
+
+def unit_vectors(lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Points on the unit sphere; their chord distance orders like great-circle distance"""
+    phi, lam = np.radians(lats), np.radians(lngs)
+    return np.column_stack((np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam), np.sin(phi)))
+
+
+def chord_to_meters(chord_squared: float) -> float:
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(chord_squared) / 2))
+
+
+class KDTree:
+    """Static 3-d tree over unit vectors with buckets of ``leaf_size`` points.
+
+    Built once with numpy (median splits on the widest axis) and queried in
+    plain Python: a k-nearest query descends to the nearest bucket first and
+    only visits other branches whose splitting plane is closer than the
+    current k-th neighbour, touching a few buckets instead of every point.
+    """
+
+    def __init__(self, points: np.ndarray, leaf_size: int = 16):
+        self.leaf_size = leaf_size
+        order = np.arange(len(points))
+        # Node arrays: split axis (-1 for leaves), split value, children, bucket range
+        self.axis: List[int] = []
+        self.split: List[float] = []
+        self.left: List[int] = []
+        self.right: List[int] = []
+        self.start: List[int] = []
+        self.end: List[int] = []
+        if len(points):
+            self._build(points, order, 0, len(points))
+        self.order = order.tolist()
+        self.coords = [tuple(point) for point in points[order].tolist()]
+
+    def _node(self) -> int:
+        for values in (self.axis, self.split, self.left, self.right, self.start, self.end):
+            values.append(-1)
+        return len(self.axis) - 1
+
+    def _build(self, points: np.ndarray, order: np.ndarray, start: int, end: int) -> int:
+        node = self._node()
+        self.start[node], self.end[node] = start, end
+        if end - start <= self.leaf_size:
+            return node
+        subset = points[order[start:end]]
+        axis = int(np.argmax(subset.max(axis=0) - subset.min(axis=0)))
+        middle = (end - start) // 2
+        partition = np.argpartition(subset[:, axis], middle)
+        order[start:end] = order[start:end][partition]
+        self.axis[node] = axis
+        self.split[node] = float(points[order[start + middle], axis])
+        self.left[node] = self._build(points, order, start, start + middle)
+        self.right[node] = self._build(points, order, start + middle, end)
+        return node
+
+    def query(self, point: Tuple[float, float, float], k: int,
+              exclude: Optional[int] = None) -> List[Tuple[float, int]]:
+        """The ``k`` nearest points as ``(squared chord, index)``, nearest first"""
+        if not self.axis or k <= 0:
+            return []
+        px, py, pz = point
+        heap: List[Tuple[float, int]] = []  # max-heap of (-distance, index)
+        coords, order = self.coords, self.order
+        axis_of, split_of, left_of, right_of = self.axis, self.split, self.left, self.right
+
+        def visit(node: int):
+            axis = axis_of[node]
+            if axis < 0:
+                for position in range(self.start[node], self.end[node]):
+                    index = order[position]
+                    if index == exclude:
+                        continue
+                    x, y, z = coords[position]
+                    distance = (x - px) ** 2 + (y - py) ** 2 + (z - pz) ** 2
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-distance, index))
+                    elif distance < -heap[0][0]:
+                        heapq.heapreplace(heap, (-distance, index))
+                return
+            delta = point[axis] - split_of[node]
+            near, far = (left_of[node], right_of[node]) if delta < 0 else (right_of[node], left_of[node])
+            visit(near)
+            if len(heap) < k or delta * delta < -heap[0][0]:
+                visit(far)
+
+        visit(0)
+        return sorted((-distance, index) for distance, index in heap)
+
+
+class NearestIndex:
+    """k-nearest-neighbour lookups over markers, with one KD-tree per layer.
+
+    Queries for a set of layers search each layer's tree and merge the
+    results, so filtering by layer never scans markers of other layers.
+    """
+
+    def __init__(self, markers: List[Dict], leaf_size: int = 16):
+        self.markers = markers
+        self.by_id = {marker['id']: index for index, marker in enumerate(markers)}
+        self.trees: Dict[str, Tuple[KDTree, List[int]]] = {}
+        if not markers:
+            return
+        lats = np.fromiter((marker['lat'] for marker in markers), dtype=np.float64, count=len(markers))
+        lngs = np.fromiter((marker['lng'] for marker in markers), dtype=np.float64, count=len(markers))
+        self.points = unit_vectors(lats, lngs)
+        members: Dict[str, List[int]] = {}
+        # Position of each marker within its layer's tree
+        self.local: List[int] = []
+        for index, marker in enumerate(markers):
+            layer = members.setdefault(marker['layer_id'], [])
+            self.local.append(len(layer))
+            layer.append(index)
+        for layer_id, indexes in members.items():
+            self.trees[layer_id] = (KDTree(self.points[indexes], leaf_size), indexes)
+
+    def get(self, marker_id: str) -> Optional[Dict]:
+        index = self.by_id.get(marker_id)
+        return self.markers[index] if index is not None else None
+
+    def nearest(self, marker_id: str, k: int = 10,
+                layers: Optional[Iterable[str]] = None) -> List[Tuple[Dict, float]]:
+        """The ``k`` markers closest to a marker as ``(marker, meters)``.
+
+        Searches ``layers`` (every other layer than the marker's own by
+        default); the marker itself is never returned.
+        """
+        origin = self.by_id[marker_id]
+        point = tuple(self.points[origin].tolist())
+        if layers is None:
+            layers = [layer for layer in self.trees if layer != self.markers[origin]['layer_id']]
+        found = []
+        for layer_id in dict.fromkeys(layers):
+            if layer_id not in self.trees:
+                continue
+            tree, indexes = self.trees[layer_id]
+            exclude = self.local[origin] if self.markers[origin]['layer_id'] == layer_id else None
+            found.extend((distance, indexes[i]) for distance, i in tree.query(point, k, exclude=exclude))
+        return [
+            (self.markers[index], chord_to_meters(distance))
+            for distance, index in heapq.nsmallest(k, found)
+        ]
@@ -0,0 +1,286 @@
+import struct
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from clustering import project
+
+
+MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+# Mapbox Vector Tile 2.1 protobuf field numbers
+TILE_LAYERS = 3
+LAYER_NAME, LAYER_FEATURES, LAYER_KEYS, LAYER_VALUES, LAYER_EXTENT, LAYER_VERSION = 1, 2, 3, 4, 5, 15
+FEATURE_TAGS, FEATURE_TYPE, FEATURE_GEOMETRY = 2, 3, 4
+VALUE_STRING, VALUE_DOUBLE, VALUE_UINT, VALUE_SINT, VALUE_BOOL = 1, 3, 5, 6, 7
+POINT = 1
+MOVE_TO = 1
+
+VARINT, LENGTH_DELIMITED, FIXED64 = 0, 2, 1
+
+Feature = Tuple[int, int, Dict]
+
+
+def _varint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def _field(out: bytearray, number: int, payload: bytes):
+    """A length-delimited field (string, message or packed varints)"""
+    _varint(out, number << 3 | LENGTH_DELIMITED)
+    _varint(out, len(payload))
+    out += payload
+
+
+def _uint_field(out: bytearray, number: int, value: int):
+    _varint(out, number << 3 | VARINT)
+    _varint(out, value)
+
+
+def _packed(values: Iterable[int]) -> bytearray:
+    out = bytearray()
+    for value in values:
+        _varint(out, value)
+    return out
+
+
+def _value(value) -> bytearray:
+    out = bytearray()
+    if isinstance(value, bool):
+        _uint_field(out, VALUE_BOOL, int(value))
+    elif isinstance(value, int):
+        if value >= 0:
+            _uint_field(out, VALUE_UINT, value)
+        else:
+            _uint_field(out, VALUE_SINT, _zigzag(value))
+    elif isinstance(value, float):
+        _varint(out, VALUE_DOUBLE << 3 | FIXED64)
+        out += struct.pack("<d", value)
+    else:
+        _field(out, VALUE_STRING, str(value).encode())
+    return out
+
+
+def encode_layer(name: str, features: Iterable[Feature], extent: int = 4096) -> bytes:
+    """One MVT layer of point features given as ``(x, y, properties)`` in
+    tile coordinates; keys and values are shared between features"""
+    keys: Dict[str, int] = {}
+    values: Dict[Tuple[type, object], int] = {}
+    encoded = bytearray()
+    for x, y, properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+        feature = bytearray()
+        _field(feature, FEATURE_TAGS, _packed(tags))
+        _uint_field(feature, FEATURE_TYPE, POINT)
+        _field(feature, FEATURE_GEOMETRY, _packed((MOVE_TO | 1 << 3, _zigzag(x), _zigzag(y))))
+        _field(encoded, LAYER_FEATURES, feature)
+
+    layer = bytearray()
+    _uint_field(layer, LAYER_VERSION, 2)
+    _field(layer, LAYER_NAME, name.encode())
+    layer += encoded
+    for key in keys:
+        _field(layer, LAYER_KEYS, key.encode())
+    for _, value in values:
+        _field(layer, LAYER_VALUES, _value(value))
+    _uint_field(layer, LAYER_EXTENT, extent)
+    return bytes(layer)
+
+
+def encode_tile(layers: Dict[str, List[Feature]], extent: int = 4096) -> bytes:
+    """A tile of point layers; layers without features are left out, so an
+    empty tile is an empty body"""
+    tile = bytearray()
+    for name, features in layers.items():
+        if features:
+            _field(tile, TILE_LAYERS, encode_layer(name, features, extent))
+    return bytes(tile)
+
+
+def _read_varint(data: bytes, position: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+
+def _fields(data: bytes) -> Iterable[Tuple[int, object]]:
+    position = 0
+    while position < len(data):
+        key, position = _read_varint(data, position)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == VARINT:
+            value, position = _read_varint(data, position)
+        elif wire_type == FIXED64:
+            value, position = data[position:position + 8], position + 8
+        elif wire_type == LENGTH_DELIMITED:
+            length, position = _read_varint(data, position)
+            value, position = data[position:position + length], position + length
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+        yield number, value
+
+
+def _unpacked(data: bytes) -> List[int]:
+    values, position = [], 0
+    while position < len(data):
+        value, position = _read_varint(data, position)
+        values.append(value)
+    return values
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def decode_tile(data: bytes) -> Dict[str, Dict]:
+    """Point layers of a tile as ``{name: {extent, features: [{x, y, properties}]}}``,
+    for tests and tools"""
+    layers = {}
+    for number, payload in _fields(data):
+        if number != TILE_LAYERS:
+            continue
+        name, extent, keys, values, features = None, 4096, [], [], []
+        for field, value in _fields(payload):
+            if field == LAYER_NAME:
+                name = value.decode()
+            elif field == LAYER_EXTENT:
+                extent = value
+            elif field == LAYER_KEYS:
+                keys.append(value.decode())
+            elif field == LAYER_VALUES:
+                for kind, content in _fields(value):
+                    if kind == VALUE_STRING:
+                        values.append(content.decode())
+                    elif kind == VALUE_DOUBLE:
+                        values.append(struct.unpack("<d", content)[0])
+                    elif kind == VALUE_SINT:
+                        values.append(_unzigzag(content))
+                    elif kind == VALUE_BOOL:
+                        values.append(bool(content))
+                    else:
+                        values.append(content)
+            elif field == LAYER_FEATURES:
+                features.append(dict(_fields(value)))
+        decoded = []
+        for feature in features:
+            tags = _unpacked(feature.get(FEATURE_TAGS, b""))
+            command, x, y = _unpacked(feature[FEATURE_GEOMETRY])
+            if feature.get(FEATURE_TYPE) != POINT or command != MOVE_TO | 1 << 3:
+                raise ValueError("Only single points are supported")
+            decoded.append({
+                "x": _unzigzag(x),
+                "y": _unzigzag(y),
+                "properties": {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)},
+            })
+        layers[name] = {"extent": extent, "features": decoded}
+    return layers
+
+
+def project_points(lats: np.ndarray, lngs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """clustering.project for arrays of points"""
+    sin_lat = np.sin(np.radians(np.clip(lats, -85.05112878, 85.05112878)))
+    return (lngs + 180.0) / 360.0, 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)
+
+
+def _spread_bits(values: np.ndarray) -> np.ndarray:
+    """Insert a zero bit above each of the low 32 bits (for Morton codes)"""
+    values = values.astype(np.uint64)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                        (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+def morton(x: int, y: int, bits: int) -> int:
+    """Interleave the bits of tile coordinates: x on even bits, y on odd"""
+    code = 0
+    for bit in range(bits):
+        code |= ((x >> bit) & 1) << (2 * bit) | ((y >> bit) & 1) << (2 * bit + 1)
+    return code
+
+
+class TileIndex:
+    """Markers sorted along a Z-order curve, for cutting vector tiles.
+
+    Each marker gets the Morton code of the ``max_zoom`` tile that holds it;
+    every tile at a lower zoom covers one contiguous range of those codes, so
+    a tile's markers are found with two binary searches however many markers
+    there are. ``buffer`` (in tile units) also takes in markers just over a
+    tile's edges, so symbols crossing the edge are drawn on both tiles.
+    """
+
+    def __init__(self, markers: List[Dict], max_zoom: int = 22):
+        self.max_zoom = max_zoom
+        size = len(markers)
+        lats = np.fromiter((marker['lat'] for marker in markers), dtype=np.float64, count=size)
+        lngs = np.fromiter((marker['lng'] for marker in markers), dtype=np.float64, count=size)
+        x, y = project_points(lats, lngs)
+        limit = 2 ** max_zoom - 1
+        codes = (_spread_bits(np.clip(x * 2 ** max_zoom, 0, limit).astype(np.int64))
+                 | _spread_bits(np.clip(y * 2 ** max_zoom, 0, limit).astype(np.int64)) << np.uint64(1))
+        order = np.argsort(codes, kind="stable")
+        self.codes = codes[order]
+        self.x, self.y = x[order], y[order]
+        self.markers = [markers[index] for index in order]
+
+    def __len__(self) -> int:
+        return len(self.markers)
+
+    def _range(self, z: int, x: int, y: int) -> Tuple[int, int]:
+        shift = 2 * (self.max_zoom - z)
+        start = morton(x, y, z) << shift
+        end = start + (1 << shift)
+        return (int(np.searchsorted(self.codes, np.uint64(start))),
+                int(np.searchsorted(self.codes, np.uint64(end))))
+
+    def points(self, z: int, x: int, y: int, extent: int = 4096, buffer: int = 0) -> List[Tuple[Dict, int, int]]:
+        """``(marker, tile_x, tile_y)`` for the markers in tile z/x/y and
+        within ``buffer`` of it, in tile coordinates from 0 to ``extent``"""
+        if not 0 <= z <= self.max_zoom:
+            raise ValueError(f"zoom must be between 0 and {self.max_zoom}")
+        tiles = 2 ** z
+        neighbours = (-1, 0, 1) if buffer > 0 else (0,)
+        found = []
+        for dy in neighbours:
+            for dx in neighbours:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < tiles and 0 <= ny < tiles):
+                    continue
+                start, end = self._range(z, nx, ny)
+                if start == end:
+                    continue
+                px = np.round((self.x[start:end] * tiles - x) * extent).astype(np.int64)
+                py = np.round((self.y[start:end] * tiles - y) * extent).astype(np.int64)
+                inside = np.flatnonzero((px >= -buffer) & (px < extent + buffer)
+                                        & (py >= -buffer) & (py < extent + buffer))
+                found.extend((self.markers[start + i], int(px[i]), int(py[i])) for i in inside)
+        return found
+
+    def occupied(self, z: int, south: float, west: float, north: float, east: float) -> List[Tuple[int, int]]:
+        """The tiles at zoom z, inside the bounding box, that hold markers"""
+        tiles = 2 ** z
+        x0, y0 = project(north, west)
+        x1, y1 = project(south, east)
+        tx = np.floor(self.x * tiles).astype(np.int64)
+        ty = np.floor(self.y * tiles).astype(np.int64)
+        inside = ((tx >= int(x0 * tiles)) & (tx <= int(x1 * tiles))
+                  & (ty >= int(y0 * tiles)) & (ty <= int(y1 * tiles)))
+        pairs = np.unique(np.column_stack((tx[inside], ty[inside])), axis=0)
+        return [(int(x), int(y)) for x, y in pairs]
@@ -0,0 +1,368 @@
+"""Throughput and p50/p95/p99 latency of the main read endpoints and of a
+sheet sync, for synthetic datasets of several sizes, written to a JSON file
+so runs on different commits can be compared.
+
+    python benchmarks/bench_api.py --sizes 100 10000 100000 --concurrency 1 16 64 \\
+        --output before.json
+    python benchmarks/bench_api.py --output after.json --compare before.json
+
+The app runs in-process against the MongoDB at MONGO_URL when given,
+otherwise an in-memory mongomock. Syncs read the sheet from a local HTTP
+server and geocode with a stub (``--geocode-latency`` simulates the API's
+latency); each sync edits every hundredth row, like a day's changes to the
+sheet. Then ``--subscribers`` idle /api/events streams are opened, for the
+memory each one holds and the time a sync's event takes to reach them all.
+
+mongomock checks unique indexes by scanning, so loading and syncing slow
+down quadratically with size there (10k markers take minutes); measure
+100k markers against a real MongoDB.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("DB_NAME", "ilheus_bench_api")
+
+MONGO = "mongodb" if "MONGO_URL" in os.environ else "mongomock"
+if MONGO == "mongomock":
+    import motor.motor_asyncio
+    from mongomock_motor import AsyncMongoMockClient
+
+    os.environ["MONGO_URL"] = "mongodb://localhost:27017"
+    motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+import httpx
+from pymongo import DeleteMany, InsertOne, UpdateOne
+
+import server
+
+logging.getLogger().setLevel(logging.WARNING)
+
+LAYERS = ["restaurants", "hotels", "beaches", "sights"]
+SHEET_HEADER = "Name,Name_EN,Name_ES,Description,Description_EN,Description_ES,Category\n"
+
+
+def synthetic_rows(count, seed=21):
+    """Sheet rows for ``count`` places around Ilhéus, with their locations"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        rows.append({
+            "name": f"Ponto {i}",
+            "name_en": f"Spot {i}",
+            "name_es": f"Lugar {i}",
+            "description": f"Ponto {i} em Ilhéus",
+            "description_en": f"Spot {i} in Ilhéus",
+            "description_es": f"Lugar {i} en Ilhéus",
+            "category": LAYERS[i % len(LAYERS)],
+            "location": {"lat": rng.uniform(-15.2, -14.4), "lng": rng.uniform(-39.3, -38.9)},
+        })
+    return rows
+
+
+def csv_cell(value):
+    return f'"{value}"' if "," in value else value
+
+
+def sheet_csv(rows, run):
+    """The sheet as exported on sync ``run``, with every hundredth row edited"""
+    lines = [SHEET_HEADER]
+    for i, row in enumerate(rows):
+        description = row["description"] + (f" (edição {run})" if run and i % 100 == run % 100 else "")
+        cells = [row["name"], row["name_en"], row["name_es"], description,
+                 row["description_en"], row["description_es"], row["category"]]
+        lines.append(",".join(csv_cell(cell) for cell in cells) + "\n")
+    return "".join(lines).encode()
+
+
+class SheetHandler(BaseHTTPRequestHandler):
+    body = b""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv; charset=utf-8")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubGeocoder:
+    """Answers from the synthetic locations after ``latency`` seconds per batch"""
+
+    def __init__(self, locations, latency):
+        self.locations = locations
+        self.latency = latency
+        self.calls = 0
+
+    async def aclose(self):
+        pass
+
+    async def geocode_many(self, place_names, on_result=None):
+        names = list(dict.fromkeys(place_names))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls += len(names)
+        results = {}
+        for name in names:
+            results[name] = self.locations.get(name)
+            if on_result:
+                on_result(name, results[name])
+        return results
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(latencies, elapsed, errors, **fields):
+    return {
+        **fields,
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "mean_ms": 1000 * sum(latencies) / len(latencies) if latencies else None,
+        "p50_ms": 1000 * percentile(latencies, 0.50) if latencies else None,
+        "p95_ms": 1000 * percentile(latencies, 0.95) if latencies else None,
+        "p99_ms": 1000 * percentile(latencies, 0.99) if latencies else None,
+        "max_ms": 1000 * max(latencies) if latencies else None,
+    }
+
+
+async def load_dataset(rows):
+    markers = [server.marker_from_row(row, row["location"]) for row in rows]
+    await server.marker_dataset.publish([DeleteMany({}), *(InsertOne(marker) for marker in markers)])
+
+
+async def drive(client, paths, total, concurrency):
+    """``total`` GETs cycling through ``paths`` from ``concurrency`` clients"""
+    queue = iter(range(total))
+    latencies, errors = [], 0
+
+    async def user():
+        nonlocal errors
+        for i in queue:
+            started = time.perf_counter()
+            try:
+                response = await client.get(paths[i % len(paths)])
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+            except httpx.HTTPError:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started, errors
+
+
+async def run_sync(client, timeout=600.0):
+    started = time.perf_counter()
+    response = await client.post("/api/admin/sync-sheet",
+                                 params={"sheet_url": "https://docs.google.com/spreadsheets/d/bench/edit"})
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    while True:
+        job = (await client.get(f"/api/admin/jobs/{job_id}")).json()
+        if job["status"] != "running":
+            break
+        if time.perf_counter() - started > timeout:
+            raise RuntimeError(f"sync job {job_id} did not finish")
+        await asyncio.sleep(0.005)
+    return time.perf_counter() - started, job
+
+
+def endpoints():
+    return {
+        "GET /api/layers": ["/api/layers"],
+        "GET /api/markers": ["/api/markers"],
+        "GET /api/markers?lang=en": ["/api/markers?lang=en"],
+        "GET /api/markers/layer/{layer_id}": [f"/api/markers/layer/{layer}" for layer in LAYERS],
+    }
+
+
+async def bench_size(client, size, args):
+    rows = synthetic_rows(size)
+    started = time.perf_counter()
+    await load_dataset(rows)
+    print(f"\n{size} markers (loaded in {time.perf_counter() - started:.1f} s)")
+    results = []
+    for name, paths in endpoints().items():
+        # Fill the response cache the way real traffic would before measuring
+        for path in paths:
+            (await client.get(path)).raise_for_status()
+        for concurrency in args.concurrency:
+            latencies, elapsed, errors = await drive(client, paths, args.requests, concurrency)
+            results.append(summarize(latencies, elapsed, errors,
+                                     dataset=size, endpoint=name, concurrency=concurrency))
+            report(results[-1])
+
+    if args.sync_runs:
+        server.geocoder = StubGeocoder({row["name"]: row["location"] for row in rows}, args.geocode_latency)
+        latencies, steps, errors = [], {}, 0
+        for run in range(1, args.sync_runs + 1):
+            SheetHandler.body = sheet_csv(rows, run)
+            seconds, job = await run_sync(client)
+            if job["status"] != "succeeded" or not (job.get("result") or {}).get("success"):
+                errors += 1
+                continue
+            latencies.append(seconds)
+            for step, ms in job.get("steps_ms", {}).items():
+                steps[step] = steps.get(step, 0) + ms / args.sync_runs
+        results.append(summarize(latencies, sum(latencies), errors, dataset=size,
+                                 endpoint="POST /api/admin/sync-sheet", concurrency=1,
+                                 rows_per_second=size * len(latencies) / sum(latencies) if latencies else 0.0,
+                                 steps_ms={step: round(ms, 1) for step, ms in steps.items()}))
+        report(results[-1])
+
+    if args.subscribers:
+        results.append({"dataset": size, **await bench_events(args.subscribers)})
+        report(results[-1])
+    return results
+
+
+async def bench_events(subscribers):
+    """Memory per idle /api/events stream and delivery latency of one event.
+    
+    Streams are driven straight through the ASGI app (httpx's ASGI transport
+    waits for whole bodies), so the memory is the app's side of a connection.
+    """
+    disconnected = asyncio.Event()
+    published, delivered = [], []
+
+    async def receive():
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message.get("body", b"").startswith(b"id:"):
+            delivered.append(time.perf_counter())
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/api/events", "raw_path": b"/api/events", "root_path": "",
+        "query_string": b"lang=en", "server": ("bench", 80), "client": ("bench", 1234),
+        "headers": [(b"accept-encoding", b"gzip, br")],
+    }
+    broadcast = server.dataset_broadcast
+    publish = broadcast.publish
+    broadcast.publish = lambda message: published.append(time.perf_counter()) or publish(message)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tasks = [asyncio.create_task(server.app(dict(scope), receive, send)) for _ in range(subscribers)]
+    try:
+        while broadcast.subscribers < subscribers:
+            await asyncio.sleep(0.01)
+        gc.collect()
+        per_stream = (tracemalloc.get_traced_memory()[0] - before) / subscribers
+        tracemalloc.stop()
+
+        await server.marker_dataset.publish([UpdateOne({}, {"$set": {"revision": None}})])
+        while len(delivered) < subscribers:
+            await asyncio.sleep(0.005)
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        broadcast.publish = publish
+        disconnected.set()
+        await asyncio.gather(*tasks)
+    latencies = [at - published[-1] for at in delivered]
+    return summarize(latencies, max(latencies), 0, endpoint="GET /api/events", concurrency=subscribers,
+                     bytes_per_stream=round(per_stream))
+
+
+def report(result):
+    def ms(value):
+        return f"{value:>9.2f}" if value is not None else f"{'-':>9}"
+
+    print(f"  {result['endpoint']:<34} c={result['concurrency']:<3} {result['throughput']:>9.1f} req/s"
+          f" p50 {ms(result['p50_ms'])} p95 {ms(result['p95_ms'])} p99 {ms(result['p99_ms'])} ms"
+          + (f"  {result['rows_per_second']:.0f} rows/s" if "rows_per_second" in result else "")
+          + (f"  {result['bytes_per_stream'] / 1024:.1f} KiB/stream" if "bytes_per_stream" in result else "")
+          + (f"  errors {result['errors']}" if result["errors"] else ""))
+
+
+def compare(results, baseline_path):
+    """Print the change in throughput and p95 against an earlier run's file"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    before = {(r["dataset"], r["endpoint"], r["concurrency"]): r for r in baseline["results"]}
+    print(f"\nAgainst {baseline_path} ({baseline.get('commit') or 'unknown commit'}):")
+    for result in results:
+        old = before.get((result["dataset"], result["endpoint"], result["concurrency"]))
+        if not old or not old["throughput"] or old["p95_ms"] is None or result["p95_ms"] is None:
+            continue
+        print(f"  {result['dataset']:>6} {result['endpoint']:<34} c={result['concurrency']:<3}"
+              f" throughput {result['throughput'] / old['throughput'] - 1:>+7.1%}"
+              f"   p95 {result['p95_ms'] / old['p95_ms'] - 1:>+7.1%}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args):
+    if MONGO == "mongomock" and max(args.sizes) > 10_000:
+        print("warning: datasets over 10k markers take very long on mongomock; set MONGO_URL")
+    sheet = ThreadingHTTPServer(("127.0.0.1", 0), SheetHandler)
+    threading.Thread(target=sheet.serve_forever, daemon=True).start()
+    server.SHEET_EXPORT_URL = f"http://127.0.0.1:{sheet.server_address[1]}/{{sheet_id}}"
+
+    await server.bootstrap_database()
+    transport = httpx.ASGITransport(app=server.app)
+    results = []
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            for size in args.sizes:
+                results.extend(await bench_size(client, size, args))
+    finally:
+        sheet.shutdown()
+        await server.job_runner.shutdown()
+
+    output = {
+        "benchmark": "bench_api",
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "mongo": MONGO,
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(output, indent=2))
+    print(f"\nWrote {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint and concurrency")
+    parser.add_argument("--sync-runs", type=int, default=3, help="sheet syncs per dataset (0 skips them)")
+    parser.add_argument("--subscribers", type=int, default=5000, help="idle event streams (0 skips them)")
+    parser.add_argument("--geocode-latency", type=float, default=0.0, help="seconds per geocoded batch")
+    parser.add_argument("--output", default="bench_api.json")
+    parser.add_argument("--compare", help="an earlier --output file to compare against")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,62 @@
+"""Walking itinerary planning time and route length by number of stops:
+Held-Karp (exact, up to 12 stops) versus 2-opt/or-opt local search.
+
+    python benchmarks/bench_itinerary.py --stops 5 10 12 15 30 50 --runs 20
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from itinerary import EXACT_LIMIT, distance_matrix, held_karp, improve_route, route_length
+
+
+# Centro histórico of Ilhéus and the beaches south of it
+REGION = (-14.86, -39.06, -14.77, -39.02)
+
+
+def synthetic_stops(count, seed):
+    rng = random.Random(seed)
+    south, west, north, east = REGION
+    lats = [rng.uniform(south, north) for _ in range(count + 1)]
+    lngs = [rng.uniform(west, east) for _ in range(count + 1)]
+    return distance_matrix(lats, lngs)
+
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stops", type=int, nargs="+", default=[5, 10, 12, 15, 30, 50])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=25.0)
+    args = parser.parse_args()
+
+    print(f"{'stops':>5} {'method':>10} {'p50 ms':>8} {'max ms':>8} {'length vs exact':>16}")
+    for count in args.stops:
+        exact_times, heuristic_times, gaps = [], [], []
+        for run in range(args.runs):
+            matrix = synthetic_stops(count, seed=run)
+            heuristic, elapsed = timed(improve_route, matrix, time_budget=args.budget_ms / 1000)
+            heuristic_times.append(elapsed)
+            if count <= EXACT_LIMIT:
+                exact, elapsed = timed(held_karp, matrix)
+                exact_times.append(elapsed)
+                gaps.append(route_length(matrix, heuristic) / route_length(matrix, exact) - 1)
+        if exact_times:
+            print(f"{count:>5} {'exact':>10} {statistics.median(exact_times):>8.2f} {max(exact_times):>8.2f}")
+        gap = f"+{100 * max(gaps):.2f}% worst" if gaps else ""
+        print(f"{count:>5} {'heuristic':>10} {statistics.median(heuristic_times):>8.2f} "
+              f"{max(heuristic_times):>8.2f} {gap:>16}")
+
+
+if __name__ == "__main__":
+    main()
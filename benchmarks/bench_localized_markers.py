@@ -0,0 +1,84 @@
+"""Bytes and serialization time of the full /api/markers payload versus the
+language-projected one (`?lang=`).
+
+    python benchmarks/bench_localized_markers.py --sizes 1000 10000 100000
+
+The projection itself runs inside MongoDB; this measures what the API and the
+client pay per response: validating and dumping the documents, and the bytes
+on the wire (raw and gzip).
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "ilheus_bench")
+
+import server
+from bench_payload_formats import synthetic_markers
+
+
+def project(marker, lang):
+    """What localized_projection(lang) yields for one document"""
+    def resolve(field):
+        return marker.get(f"{field}_{lang}") or marker[field] if lang != "pt" else marker[field]
+
+    return {
+        "id": marker["id"],
+        "name": resolve("name"),
+        "description": resolve("description"),
+        "lat": marker["lat"],
+        "lng": marker["lng"],
+        "layer_id": marker["layer_id"],
+        "google_maps_url": marker["google_maps_url"],
+    }
+
+
+def translate(markers):
+    for marker in markers:
+        marker["name_en"] = marker["name_en"] or f"{marker['name']} (en)"
+        marker["name_es"] = f"{marker['name']} (es)"
+        marker["description_en"] = "Regional seafood with a sea view and live music on weekends."
+        marker["description_es"] = "Mariscos regionales con vista al mar y música en vivo los fines de semana."
+    return markers
+
+
+def best_of(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return result, min(timings)
+
+
+def main(args):
+    print(f"{'markers':>8} {'payload':<8} {'bytes':>12} {'gzip':>11} {'serialize ms':>13}")
+    for size in args.sizes:
+        markers = translate(synthetic_markers(size))
+        repeat = args.repeat if size <= 10000 else 1
+        full_adapter = server.marker_serializer.list_adapter
+        localized_adapter = server.localized_marker_serializer.list_adapter
+
+        body, elapsed = best_of(lambda: full_adapter.dump_json(full_adapter.validate_python(markers)), repeat)
+        full_size = len(body)
+        print(f"{size:>8} {'full':<8} {len(body):>12,} {len(gzip.compress(body, 6)):>11,} {elapsed * 1000:>13.1f}")
+
+        for lang in ("pt", "en"):
+            projected = [project(marker, lang) for marker in markers]
+            body, elapsed = best_of(
+                lambda: localized_adapter.dump_json(localized_adapter.validate_python(projected)), repeat
+            )
+            print(f"{size:>8} {'lang=' + lang:<8} {len(body):>12,} {len(gzip.compress(body, 6)):>11,} "
+                  f"{elapsed * 1000:>13.1f}   ({len(body) / full_size:.0%} of full)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    main(parser.parse_args())
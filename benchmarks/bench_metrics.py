@@ -0,0 +1,127 @@
+"""Cost of the metrics instrumentation: per-call cost of the primitives, and
+requests/second for cheap cached routes with METRICS on and off (the worst
+case, where the instrumentation is the largest share of a request).
+
+    python benchmarks/bench_metrics.py --requests 3000
+
+Uses the MongoDB at MONGO_URL when given, otherwise an in-memory mongomock
+(which does not emit command events, so the Mongo listener only shows up in
+the per-call numbers).
+"""
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("DB_NAME", "ilheus_bench")
+
+if "MONGO_URL" not in os.environ:
+    import motor.motor_asyncio
+    from mongomock_motor import AsyncMongoMockClient
+
+    os.environ["MONGO_URL"] = "mongodb://localhost:27017"
+    motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+import httpx
+
+from metrics import CommandMetrics, Counter, Histogram, MetricsMiddleware, Registry
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+PATHS = ["/api/layers", "/api/markers?lang=en", "/api/clusters?bbox=-14.9,-39.1,-14.7,-38.9&zoom=13"]
+
+
+def per_call(function, repeat=200_000):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1e9
+
+
+def primitives():
+    histogram = Histogram("h", "", ["method", "route", "status"])
+    listener = CommandMetrics(Histogram("m", "", ["collection", "command"]), Counter("f", "", ["collection", "command"]))
+    started = SimpleNamespace(connection_id=("db", 27017), request_id=1, command_name="find",
+                              command={"find": "markers_v3_0a1b2c3d"})
+    succeeded = SimpleNamespace(connection_id=("db", 27017), request_id=1, duration_micros=800)
+
+    def command():
+        listener.started(started)
+        listener.succeeded(succeeded)
+
+    registry = Registry()
+    for route in range(30):
+        for status in ("200", "304", "404"):
+            for value in (0.0004, 0.002, 0.03):
+                histogram.observe(value, "GET", f"/api/route{route}", status)
+    registry.register(histogram)
+
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def sent(message):
+        pass
+
+    async def requests(app, count=50_000):
+        scope = {"type": "http", "method": "GET", "path": "/api/markers"}
+        started = time.perf_counter()
+        for _ in range(count):
+            await app(scope, None, sent)
+        return (time.perf_counter() - started) / count * 1e9
+
+    bare = asyncio.run(requests(endpoint))
+    wrapped = asyncio.run(requests(MetricsMiddleware(endpoint, Histogram("r", "", ["method", "route", "status"]))))
+
+    print(f"middleware per request {wrapped - bare:>8.0f} ns")
+    print(f"histogram observe      {per_call(lambda: histogram.observe(0.0021, 'GET', '/api/markers', '200')):>8.0f} ns")
+    print(f"mongo command events   {per_call(command):>8.0f} ns")
+    print(f"render 90 series       {per_call(registry.render, 500) / 1000:>8.0f} us")
+
+
+async def throughput(server, requests, concurrency):
+    await server.bootstrap_database()
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in PATHS:
+            await client.get(path)
+        queue = iter(range(requests))
+
+        async def worker():
+            for i in queue:
+                response = await client.get(PATHS[i % len(PATHS)])
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - started)
+
+
+def main(args):
+    primitives()
+    import server
+
+    results = {}
+    for _ in range(args.rounds):
+        for enabled in ("false", "true"):
+            os.environ["METRICS"] = enabled
+            server = importlib.reload(server)
+            rate = asyncio.run(throughput(server, args.requests, args.concurrency))
+            results[enabled] = max(results.get(enabled, 0), rate)
+    off, on = results["false"], results["true"]
+    print(f"METRICS=false {off:>9.0f} req/s")
+    print(f"METRICS=true  {on:>9.0f} req/s   {1e6 / on - 1e6 / off:+.1f} us/request ({on / off - 1:+.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=3, help="best of this many runs per setting")
+    main(parser.parse_args())
@@ -0,0 +1,108 @@
+"""k-nearest markers from a marker: per-layer KD-trees versus scanning every
+marker with haversine, in plain Python and vectorized with numpy.
+
+    python benchmarks/bench_nearby.py --sizes 10000 100000 --k 10
+"""
+import argparse
+import heapq
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from spatial import EARTH_RADIUS, NearestIndex
+
+
+LAYERS = ["restaurants", "hotels", "sights", "beaches"]
+# Costa do Cacau, Itacaré to Canavieiras
+REGION = (-15.7, -39.4, -14.2, -38.9)
+
+
+def synthetic_markers(count, seed=7):
+    rng = random.Random(seed)
+    south, west, north, east = REGION
+    return [
+        {
+            "id": f"m{i}",
+            "lat": rng.uniform(south, north),
+            "lng": rng.uniform(west, east),
+            "layer_id": rng.choice(LAYERS),
+        }
+        for i in range(count)
+    ]
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+def naive_python(markers, origin, k):
+    return heapq.nsmallest(k, (
+        (haversine(origin["lat"], origin["lng"], marker["lat"], marker["lng"]), marker["id"])
+        for marker in markers if marker["layer_id"] != origin["layer_id"]
+    ))
+
+
+def naive_numpy(lats, lngs, layers, origin_index, k):
+    phi1, phi2 = np.radians(lats[origin_index]), np.radians(lats)
+    a = (np.sin((phi2 - phi1) / 2) ** 2
+         + np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(lngs - lngs[origin_index]) / 2) ** 2)
+    distances = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+    distances[layers == layers[origin_index]] = np.inf
+    best = np.argpartition(distances, k)[:k]
+    return best[np.argsort(distances[best])]
+
+
+def timed(function, origins):
+    timings = []
+    for origin in origins:
+        started = time.perf_counter()
+        function(origin)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000, timings[int(len(timings) * 0.99)] * 1000
+
+
+def main(args):
+    print(f"{'markers':>8} {'method':<14} {'p50 ms':>9} {'p99 ms':>9}")
+    for size in args.sizes:
+        markers = synthetic_markers(size)
+        started = time.perf_counter()
+        index = NearestIndex(markers)
+        build = (time.perf_counter() - started) * 1000
+        lats = np.array([marker["lat"] for marker in markers])
+        lngs = np.array([marker["lng"] for marker in markers])
+        layers = np.array([LAYERS.index(marker["layer_id"]) for marker in markers])
+        rng = random.Random(1)
+        origins = rng.sample(range(size), min(args.queries, size))
+
+        # Same neighbours from every method
+        for origin in origins[:5]:
+            expected = [marker_id for _, marker_id in naive_python(markers, markers[origin], args.k)]
+            assert [marker["id"] for marker, _ in index.nearest(markers[origin]["id"], args.k)] == expected
+
+        results = {
+            "kd-tree": timed(lambda i: index.nearest(markers[i]["id"], args.k), origins),
+            "scan (numpy)": timed(lambda i: naive_numpy(lats, lngs, layers, i, args.k), origins),
+            "scan (python)": timed(lambda i: naive_python(markers, markers[i], args.k), origins[:50]),
+        }
+        for method, (p50, p99) in results.items():
+            speedup = results["scan (python)"][0] / p50
+            print(f"{size:>8} {method:<14} {p50:>9.3f} {p99:>9.3f}   x{speedup:,.0f} vs python scan")
+        print(f"{size:>8} kd-tree build {build:.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    main(parser.parse_args())
@@ -0,0 +1,105 @@
+"""Payload size and encode time of /api/markers bodies per format and
+content coding, for synthetic datasets of 1k, 10k and 100k markers.
+
+    python benchmarks/bench_payload_formats.py --sizes 1000 10000 100000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+from typing import List, Optional
+
+import marker_formats
+from compression import compress, supported_encodings
+
+
+# Mirrors server.Marker without importing the app (and its MongoDB client)
+class Marker(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    id: str
+    name: str
+    name_en: Optional[str] = None
+    name_es: Optional[str] = None
+    description: str
+    description_en: Optional[str] = None
+    description_es: Optional[str] = None
+    lat: float
+    lng: float
+    layer_id: str
+    google_maps_url: Optional[str] = None
+
+
+marker_list_adapter = TypeAdapter(List[Marker])
+FIELDS = list(Marker.model_fields)
+
+
+def synthetic_markers(count, seed=1):
+    import urllib.parse
+
+    rng = random.Random(seed)
+    markers = []
+    for i in range(count):
+        name = f"Restaurante {rng.choice(['Cabana', 'Sabor', 'Vila', 'Bar'])} {i}"
+        markers.append({
+            "id": f"{rng.getrandbits(128):032x}",
+            "name": name,
+            "name_en": f"{name} (en)" if rng.random() < 0.5 else None,
+            "name_es": None,
+            "description": "Culinária regional com frutos do mar frescos e vista para o mar.",
+            "description_en": "Regional seafood with a sea view." if rng.random() < 0.5 else None,
+            "description_es": None,
+            "lat": rng.uniform(-15.7, -14.2),
+            "lng": rng.uniform(-39.4, -38.9),
+            "layer_id": rng.choice(["restaurants", "hotels", "sights", "beaches"]),
+            "google_maps_url": marker_formats.MAPS_URL_PREFIX + urllib.parse.quote(f"{name}, Ilhéus, Bahia, Brazil"),
+        })
+    return markers
+
+
+def timed(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def main(args):
+    formats = {
+        "json": lambda markers: marker_list_adapter.dump_json(marker_list_adapter.validate_python(markers)),
+        "columns": lambda markers: marker_formats.encode(markers, FIELDS, "columns"),
+    }
+    if marker_formats.msgpack:
+        formats["msgpack"] = lambda markers: marker_formats.encode(markers, FIELDS, "msgpack")
+
+    print(f"{'markers':>8} {'format':<8} {'coding':<13} {'bytes':>12} {'ratio':>7} {'encode ms':>10}")
+    for size in args.sizes:
+        markers = synthetic_markers(size)
+        repeat = max(1, args.repeat if size <= 10000 else 1)
+        baseline = None
+        for name, encoder in formats.items():
+            body, encode_time = timed(lambda: encoder(markers), repeat)
+            baseline = baseline or len(body)
+            print(f"{size:>8} {name:<8} {'identity':<13} {len(body):>12,} {len(body) / baseline:>7.2f} {encode_time * 1000:>10.1f}")
+            for encoding in supported_encodings():
+                for label, level in (("dynamic", {"gzip_level": 6, "brotli_quality": 4}),
+                                     ("cached", {})):
+                    compressed, compress_time = timed(lambda: compress(body, encoding, **level), repeat)
+                    coding = f"{encoding}/{label}"
+                    total_ms = (encode_time + compress_time) * 1000
+                    print(f"{size:>8} {name:<8} {coding:<13} {len(compressed):>12,} "
+                          f"{len(compressed) / baseline:>7.2f} {total_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,92 @@
+"""Requests/second for /api/layers and /api/markers with and without the
+response cache.
+
+    python benchmarks/bench_read_cache.py --markers 1000 --requests 500
+
+Uses the MongoDB at MONGO_URL when given, otherwise an in-memory mongomock.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("DB_NAME", "ilheus_bench")
+
+if "MONGO_URL" not in os.environ:
+    import motor.motor_asyncio
+    from mongomock_motor import AsyncMongoMockClient
+
+    os.environ["MONGO_URL"] = "mongodb://localhost:27017"
+    motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+import httpx
+from pymongo import InsertOne
+
+import server
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def synthetic_marker(i):
+    layer_id = random.choice(["restaurants", "hotels", "sights", "beaches"])
+    name = f"Ponto {i}"
+    return {
+        "id": f"bench-{i:06d}",
+        "name": name,
+        "name_en": f"Spot {i}",
+        "name_es": f"Lugar {i}",
+        "description": f"{name} em Ilhéus",
+        "description_en": f"{name} in Ilhéus",
+        "description_es": f"{name} en Ilhéus",
+        "lat": -14.79 + random.uniform(-0.05, 0.05),
+        "lng": -39.04 + random.uniform(-0.05, 0.05),
+        "layer_id": layer_id,
+        "google_maps_url": server.generate_google_maps_url(0, 0, name),
+    }
+
+
+async def drive(client, path, total, concurrency):
+    queue = iter(range(total))
+
+    async def worker():
+        for _ in queue:
+            response = await client.get(path)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - started)
+
+
+async def main(args):
+    await server.bootstrap_database()
+    await server.marker_dataset.publish(
+        [InsertOne(synthetic_marker(i)) for i in range(args.markers - 24)]
+    )
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{args.markers} markers, {args.requests} requests, concurrency {args.concurrency}")
+        for path in ["/api/layers", "/api/markers"]:
+            results = {}
+            for enabled in (False, True):
+                server.response_cache.enabled = enabled
+                server.response_cache.invalidate()
+                results[enabled] = await drive(client, path, args.requests, args.concurrency)
+            print(
+                f"{path:<16} uncached {results[False]:>9.1f} req/s   "
+                f"cached {results[True]:>9.1f} req/s   x{results[True] / results[False]:.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--markers", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,113 @@
+"""Latency of /api/search queries against the in-memory index, and the
+cost of building and incrementally updating it.
+
+    python benchmarks/bench_search.py --markers 100000 --queries 2000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from search import SearchIndex
+
+
+KINDS = {
+    "restaurants": ["Restaurante", "Barraca", "Bar", "Pizzaria", "Cantina"],
+    "hotels": ["Pousada", "Hotel", "Resort", "Hostel", "Chalés"],
+    "sights": ["Igreja", "Museu", "Mirante", "Casa", "Teatro", "Fazenda"],
+    "beaches": ["Praia", "Prainha", "Enseada", "Ponta"],
+}
+NAMES = [
+    "do Sul", "dos Coqueiros", "Gabriela", "Jorge Amado", "São Sebastião", "Bataclan", "Vesúvio",
+    "do Cristo", "da Concha", "dos Milionários", "Itacaré", "Olivença", "Serra Grande", "Canavieiras",
+    "Pontal", "Malhado", "Iguape", "Cururupe", "do Norte", "Boa Vista", "Sapucaia", "Cacau", "Tia Déia",
+    "Marciano", "Avenida", "do Porto", "Mar Aberto", "Sol Nascente", "Beira-Mar", "Vila Velha",
+]
+PHRASES = [
+    "Moqueca baiana tradicional", "frutos do mar frescos", "vista para o mar", "acarajé e abará",
+    "frequentado por Jorge Amado", "arquitetura colonial", "águas calmas", "ideal para famílias",
+    "quiosques e boa infraestrutura", "trilha na mata atlântica", "chocolate artesanal de cacau",
+    "música ao vivo nos fins de semana", "café da manhã regional", "piscina e jardim tropical",
+    "história do ciclo do cacau", "pôr do sol no rio Cachoeira", "passeios de barco", "surf e coqueirais",
+]
+PHRASES_EN = [
+    "Traditional Bahian moqueca", "fresh seafood", "sea view", "colonial architecture",
+    "calm waters", "family friendly", "Atlantic forest trail", "handmade cocoa chocolate",
+]
+# Costa do Cacau, Itacaré to Canavieiras
+REGION = (-15.7, -39.4, -14.2, -38.9)
+
+
+def synthetic_pois(count, seed=11):
+    rng = random.Random(seed)
+    south, west, north, east = REGION
+    markers = []
+    for i in range(count):
+        layer_id = rng.choice(list(KINDS))
+        name = f"{rng.choice(KINDS[layer_id])} {rng.choice(NAMES)} {rng.choice(NAMES).split()[-1]} {i}"
+        markers.append({
+            "id": f"m{i}",
+            "name": name,
+            "name_en": None,
+            "name_es": None,
+            "description": f"{rng.choice(PHRASES)}, {rng.choice(PHRASES).lower()}.",
+            "description_en": rng.choice(PHRASES_EN) if rng.random() < 0.4 else None,
+            "description_es": None,
+            "lat": rng.uniform(south, north),
+            "lng": rng.uniform(west, east),
+            "layer_id": layer_id,
+        })
+    return markers
+
+
+QUERIES = [
+    "moqueca", "jorge amado", "Ilheus", "praia do sul", "pousada", "mqoueca", "itacare", "sao sebastiao",
+    "chocolate", "seafood", "vesuvio", "praia", "igreja colonial", "coqueir", "sunset", "gabriela",
+]
+
+
+def percentile(timings, p):
+    return timings[min(len(timings) - 1, int(len(timings) * p))]
+
+
+def main(args):
+    markers = synthetic_pois(args.markers)
+    started = time.perf_counter()
+    index = SearchIndex(markers)
+    print(f"{args.markers} markers indexed in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    rng = random.Random(5)
+    south, west, north, east = REGION
+    timings = {"text": [], "near": []}
+    for i in range(args.queries):
+        query = rng.choice(QUERIES)
+        near = (rng.uniform(south, north), rng.uniform(west, east)) if i % 2 else None
+        started = time.perf_counter()
+        index.search(query, limit=20, near=near)
+        timings["near" if near else "text"].append(time.perf_counter() - started)
+    for kind, values in timings.items():
+        values.sort()
+        print(f"  {kind:<5} p50 {percentile(values, 0.5) * 1000:6.2f}ms  "
+              f"p95 {percentile(values, 0.95) * 1000:6.2f}ms  p99 {percentile(values, 0.99) * 1000:6.2f}ms")
+
+    # A sync that touches 1% of the markers
+    changed = [dict(marker) for marker in markers]
+    for marker in rng.sample(changed, len(changed) // 100):
+        marker["description"] = "Nova descrição com moqueca de camarão."
+    started = time.perf_counter()
+    removed, added = index.changes(changed)
+    diffed = time.perf_counter() - started
+    started = time.perf_counter()
+    index.apply(removed, added)
+    print(f"incremental update of {len(added)} markers: diff {diffed * 1000:.0f}ms (off-loop), "
+          f"apply {(time.perf_counter() - started) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--markers", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    main(parser.parse_args())
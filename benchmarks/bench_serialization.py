@@ -0,0 +1,93 @@
+"""CPU time to encode marker lists and /clusters responses: FastAPI's
+response_model path, strict mode (validate through the model, dump with its
+TypeAdapter) and the default fast mode (encode canonical documents directly).
+
+    python benchmarks/bench_serialization.py --sizes 100 10000 100000
+
+Documents are canonical markers as read with the model's projection. The
+response_model column is what a route returning the list costs: validation,
+conversion to JSON-compatible Python, then json.dumps in JSONResponse.
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "ilheus_bench")
+
+from bench_payload_formats import synthetic_markers, timed
+from serialization import DocumentSerializer
+
+import server
+
+
+def response_model(serializer):
+    adapter = serializer.list_adapter
+
+    def encode(documents):
+        content = adapter.dump_python(adapter.validate_python(documents), mode="json")
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+    return encode
+
+
+def ndjson(serializer):
+    def encode(documents):
+        return b"".join(serializer.dump(document) + b"\n" for document in documents)
+
+    return encode
+
+
+def bench_clusters(size, repeat):
+    """A /clusters response zoomed past the cluster levels: every marker in view"""
+    from clustering import ClusterIndex
+
+    markers = synthetic_markers(size)
+    result = ClusterIndex(markers, max_zoom=16).query(-15.7, -39.4, -14.2, -38.9, 20)
+    strict = DocumentSerializer(server.ClusterResponse, strict=True)
+    fast = server.cluster_response_serializer
+    adapter = strict.adapter
+
+    def response_model():
+        content = adapter.dump_python(adapter.validate_python(result), mode="json")
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+    def encode(serializer):
+        return lambda: serializer.dump(result)
+
+    results = [timed(function, repeat) for function in (response_model, encode(strict), encode(fast))]
+    assert json.loads(results[1][0]) == json.loads(results[2][0])
+    ms = [1000 * elapsed for _, elapsed in results]
+    print(f"{size:>8} {'clusters z20':<13} {ms[0]:>15.2f} {ms[1]:>9.2f} {ms[2]:>9.2f} {ms[0] / ms[2]:>12.1f}x")
+
+
+def main(args):
+    models = {"markers": server.Marker, "markers?lang": server.LocalizedMarker}
+    print(f"{'markers':>8} {'payload':<13} {'response_model':>15} {'strict':>9} {'fast':>9} {'fast speedup':>13}"
+          f" {'ndjson strict':>14} {'ndjson fast':>12}")
+    for size in args.sizes:
+        markers = synthetic_markers(size)
+        for payload, model in models.items():
+            strict, fast = DocumentSerializer(model, strict=True), DocumentSerializer(model)
+            documents = [{field: marker[field] for field in fast.fields} for marker in markers]
+            repeat = max(3, args.repeat * 1000 // size)
+            results = [
+                timed(lambda: encode(documents), repeat)
+                for encode in (response_model(strict), strict.dump_list, fast.dump_list,
+                               ndjson(strict), ndjson(fast))
+            ]
+            assert json.loads(results[1][0]) == json.loads(results[2][0])
+            ms = [1000 * elapsed for _, elapsed in results]
+            print(f"{size:>8} {payload:<13} {ms[0]:>15.2f} {ms[1]:>9.2f} {ms[2]:>9.2f}"
+                  f" {ms[0] / ms[2]:>12.1f}x {ms[3]:>14.2f} {ms[4]:>12.2f}")
+        bench_clusters(size, max(3, args.repeat * 1000 // size))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=50, help="repetitions at 1000 markers (fewer when larger)")
+    main(parser.parse_args())
@@ -0,0 +1,75 @@
+"""Vector tile cost per zoom level: time to cut and encode one tile, and tile
+sizes raw and gzipped, over the non-empty tiles of the Ilhéus bounding box
+(TILE_PRERENDER_BBOX) at the pre-rendered zooms.
+
+    python benchmarks/bench_tiles.py --sizes 1000 10000 100000 --zooms 10 16
+
+Markers are spread over the Costa do Cacau, so the box holds a share of them.
+The last line per size is what pre-rendering one version costs (every
+language, capped at TILE_CACHE_SIZE tiles).
+"""
+import argparse
+import gzip
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "ilheus_bench")
+
+from bench_payload_formats import synthetic_markers
+from tiles import TileIndex
+
+import server
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main(args):
+    south, west, north, east = (float(part) for part in server.TILE_PRERENDER_BBOX.split(','))
+    for size in args.sizes:
+        markers = synthetic_markers(size)
+        started = time.perf_counter()
+        index = TileIndex(markers, server.TILE_MAX_ZOOM)
+        print(f"\n{size} markers (index built in {1000 * (time.perf_counter() - started):.1f} ms)")
+        print(f"{'zoom':>4} {'tiles':>6} {'features':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}"
+              f" {'mean B':>8} {'max B':>8} {'mean gz B':>10}")
+        for z in range(args.zooms[0], args.zooms[1] + 1):
+            tiles = index.occupied(z, south, west, north, east)[:args.max_tiles]
+            times, sizes, gzipped, features = [], [], [], []
+            for x, y in tiles:
+                started = time.perf_counter()
+                body = server.render_tile(index, z, x, y, args.lang)
+                times.append(1000 * (time.perf_counter() - started))
+                sizes.append(len(body))
+                gzipped.append(len(gzip.compress(body, 6)))
+                features.append(len(index.points(z, x, y, server.TILE_EXTENT, server.TILE_BUFFER)))
+            if not tiles:
+                print(f"{z:>4} {0:>6}")
+                continue
+            print(f"{z:>4} {len(tiles):>6} {statistics.mean(features):>9.1f} {percentile(times, 0.5):>8.2f}"
+                  f" {percentile(times, 0.95):>8.2f} {max(times):>8.2f} {statistics.mean(sizes):>8.0f}"
+                  f" {max(sizes):>8} {statistics.mean(gzipped):>10.0f}")
+        if args.prerender:
+            started = time.perf_counter()
+            bodies = server.prerender(index, 1)
+            elapsed = time.perf_counter() - started
+            print(f"pre-render: {len(bodies)} tiles, {sum(map(len, bodies.values())) / 1024:.0f} KiB"
+                  f" in {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    parser.add_argument("--zooms", type=int, nargs=2, default=[10, 16], metavar=("MIN", "MAX"))
+    parser.add_argument("--lang", default="en")
+    parser.add_argument("--max-tiles", type=int, default=2000, help="tiles timed per zoom level")
+    parser.add_argument("--no-prerender", dest="prerender", action="store_false",
+                        help="skip timing a full pre-render")
+    main(parser.parse_args())
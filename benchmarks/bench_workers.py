@@ -0,0 +1,176 @@
+"""Throughput of the API served by 1..N uvicorn workers, and how long a write
+takes to reach every worker through the events collection.
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_workers.py --workers 1 2 4 --clients 4
+
+Needs a real MongoDB (workers are separate processes sharing it) and should
+run on a machine with at least max(workers) + clients cores, or the load
+generator competes with the workers it measures. Requests mix cached marker
+lists with search, nearby and cluster queries, which are CPU-bound in the
+worker and so show how well extra workers scale.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+SEARCHES = ["praia", "restaurante", "jorge amado", "moqueca", "hotel centro", "catedral"]
+
+
+def start_workers(count, port, db_name):
+    env = dict(os.environ, DB_NAME=db_name)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--workers", str(count),
+         "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+
+
+def wait_until_ready(base_url, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/api/layers", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"workers at {base_url} did not start")
+
+
+def request_paths(marker_ids):
+    rng = random.Random()
+    while True:
+        choice = rng.random()
+        if choice < 0.4:
+            yield f"/api/markers?lang={rng.choice(['pt', 'en', 'es'])}"
+        elif choice < 0.7:
+            yield f"/api/search?q={rng.choice(SEARCHES)}&limit=10"
+        elif choice < 0.85:
+            yield f"/api/markers/{rng.choice(marker_ids)}/nearby?k=10"
+        else:
+            yield "/api/clusters?bbox=-14.9,-39.1,-14.7,-38.9&zoom=13"
+
+
+async def client_load(base_url, marker_ids, concurrency, duration):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    paths = request_paths(marker_ids)
+
+    async def user(client):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await client.get(next(paths))
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(user(client) for _ in range(concurrency)))
+    return latencies, errors
+
+
+def client_process(base_url, marker_ids, concurrency, duration, results):
+    results.put(asyncio.run(client_load(base_url, marker_ids, concurrency, duration)))
+
+
+def run_load(base_url, marker_ids, clients, concurrency, duration):
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=client_process,
+                                args=(base_url, marker_ids, concurrency, duration, results))
+        for _ in range(clients)
+    ]
+    for process in processes:
+        process.start()
+    latencies, errors = [], 0
+    for _ in processes:
+        client_latencies, client_errors = results.get()
+        latencies.extend(client_latencies)
+        errors += client_errors
+    for process in processes:
+        process.join()
+    return latencies, errors
+
+
+def measure_convergence(base_url, workers, timeout=30.0):
+    """Roll the markers back on one worker and time until every worker serves the result"""
+    before = httpx.get(f"{base_url}/api/admin/markers/versions").json()["current"]
+    started = time.perf_counter()
+    target = httpx.post(f"{base_url}/api/admin/markers/rollback").json()["dataset_version"]
+    seen = {}
+    try:
+        while time.perf_counter() - started < timeout:
+            # A new connection per request lets the kernel spread them over the workers
+            state = httpx.get(f"{base_url}/api/admin/worker", headers={"Connection": "close"}).json()
+            seen[state["worker"]] = state["index_version"]
+            if len(seen) >= workers and all(version == target for version in seen.values()):
+                return (time.perf_counter() - started) * 1000
+        return None
+    finally:
+        httpx.post(f"{base_url}/api/admin/markers/rollback", params={"version": before})
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=4, help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="connections per client process")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per worker count")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db-name", default="ilheus_bench_workers")
+    args = parser.parse_args()
+
+    if "MONGO_URL" not in os.environ:
+        parser.error("MONGO_URL must point at a MongoDB shared by the workers")
+    if (os.cpu_count() or 1) < max(args.workers) + args.clients:
+        print(f"warning: {os.cpu_count()} cores for {max(args.workers)} workers and {args.clients} "
+              "client processes; results will understate scaling")
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    baseline = None
+    print(f"{'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6} {'scaling':>8} "
+          f"{'converge ms':>11}")
+    for count in args.workers:
+        process = start_workers(count, args.port, args.db_name)
+        try:
+            wait_until_ready(base_url)
+            marker_ids = [marker["id"] for marker in httpx.get(f"{base_url}/api/markers").json()]
+            # Warm every worker's caches and indexes before measuring
+            run_load(base_url, marker_ids, args.clients, args.concurrency, 2.0)
+            latencies, errors = run_load(base_url, marker_ids, args.clients, args.concurrency, args.duration)
+            throughput = len(latencies) / args.duration
+            baseline = baseline or throughput / count
+            convergence = measure_convergence(base_url, count)
+        finally:
+            process.terminate()
+            process.wait()
+        print(f"{count:>7} {throughput:>9.0f} {1000 * statistics.median(latencies):>8.1f} "
+              f"{1000 * percentile(latencies, 0.99):>8.1f} {errors:>6} "
+              f"{throughput / (baseline * count):>8.0%} "
+              f"{'n/a' if convergence is None else f'{convergence:.0f}':>11}")
+
+
+if __name__ == "__main__":
+    main()
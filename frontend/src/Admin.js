@@ -1,4 +1,4 @@
-import { useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import axios from "axios";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
@@ -9,6 +9,7 @@ import { getBrowserLanguage, useTranslation } from "./translations";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const JOB_POLL_INTERVAL = 1000;
 
 export default function Admin() {
   const [sheetUrl, setSheetUrl] = useState("");
@@ -19,6 +20,45 @@ export default function Admin() {
   
   const { t } = useTranslation(language);
 
+  const [progress, setProgress] = useState(null);
+  const pollTimer = useRef(null);
+
+  useEffect(() => () => clearTimeout(pollTimer.current), []);
+
+  const finishJob = (job) => {
+    setSyncing(false);
+    setProgress(null);
+    if (job.status === "succeeded") {
+      setResult(job.result);
+      if (job.result.success) {
+        toast.success(job.result.message);
+      } else {
+        toast.error(job.result.message);
+      }
+    } else {
+      const errorMsg = job.error || t('syncError');
+      toast.error(errorMsg);
+      setResult({ success: false, message: errorMsg, geocode_errors: job.errors });
+    }
+  };
+
+  const pollJob = async (jobId) => {
+    try {
+      const response = await axios.get(`${API}/admin/jobs/${jobId}`);
+      const job = response.data;
+      if (job.status === "running") {
+        setProgress({ ...job.progress, errors: job.errors || [] });
+        pollTimer.current = setTimeout(() => pollJob(jobId), JOB_POLL_INTERVAL);
+      } else {
+        finishJob(job);
+      }
+    } catch (error) {
+      console.error("Job polling error:", error);
+      // Keep polling through transient failures; the job runs server-side
+      pollTimer.current = setTimeout(() => pollJob(jobId), JOB_POLL_INTERVAL * 2);
+    }
+  };
+
   const handleSync = async () => {
     if (!sheetUrl.trim()) {
       toast.error(t('syncError'));
@@ -28,24 +68,21 @@ export default function Admin() {
     try {
       setSyncing(true);
       setResult(null);
+      setProgress(null);
 
       const response = await axios.post(`${API}/admin/sync-sheet`, null, {
         params: { sheet_url: sheetUrl }
       });
 
-      setResult(response.data);
-      
-      if (response.data.success) {
-        toast.success(response.data.message);
-      } else {
-        toast.error(response.data.message);
+      if (response.data.already_running) {
+        toast.info(t('syncAlreadyRunning'));
       }
+      pollJob(response.data.job_id);
     } catch (error) {
       console.error("Sync error:", error);
       const errorMsg = error.response?.data?.detail || t('syncError');
       toast.error(errorMsg);
       setResult({ success: false, message: errorMsg });
-    } finally {
       setSyncing(false);
     }
   };
@@ -109,6 +146,23 @@ export default function Admin() {
             </Button>
           </div>
 
+          {progress && (
+            <div className="sync-progress" data-testid="sync-progress">
+              <p>
+                {t('syncStages')[progress.stage] || progress.stage}
+                {progress.total
+                  ? ` — ${progress.processed}/${progress.total}`
+                  : progress.processed > 0 ? ` — ${progress.processed}` : ""}
+              </p>
+              {progress.total > 0 && (
+                <progress value={progress.processed} max={progress.total} />
+              )}
+              {progress.errors.length > 0 && (
+                <p>{t('geocodingErrors')} {progress.errors.length}</p>
+              )}
+            </div>
+          )}
+
           {result && (
             <div className={`result ${result.success ? "success" : "error"}`} data-testid="sync-result">
               <div className="result-header">
@@ -13,6 +13,122 @@ const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 const GOOGLE_MAPS_KEY = process.env.REACT_APP_GOOGLE_MAPS_KEY;
 
+// GET that remembers the last body and ETag in localStorage, so reloads only
+// revalidate (304 Not Modified) and a failed request falls back to the copy
+const cachedGet = async (url, storageKey = `api-cache:${url}`) => {
+  let cached = null;
+  try {
+    cached = JSON.parse(localStorage.getItem(storageKey));
+  } catch (error) {
+    cached = null;
+  }
+
+  let response;
+  try {
+    response = await axios.get(url, {
+      headers: cached?.etag ? { "If-None-Match": cached.etag } : {},
+      validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+    });
+  } catch (error) {
+    if (cached) return cached.data;
+    throw error;
+  }
+
+  if (response.status === 304) {
+    return cached ? cached.data : (await axios.get(url)).data;
+  }
+
+  const etag = response.headers.etag;
+  if (etag) {
+    try {
+      localStorage.setItem(storageKey, JSON.stringify({ etag, data: response.data }));
+    } catch (error) {
+      // Storage full or unavailable; the next load simply downloads again
+    }
+  }
+  return response.data;
+};
+
+const absoluteUrl = (url) => (/^https?:/.test(url) ? url : `${BACKEND_URL}${url}`);
+
+const readStored = (storageKey) => {
+  try {
+    return JSON.parse(localStorage.getItem(storageKey));
+  } catch (error) {
+    return null;
+  }
+};
+
+const writeStored = (storageKey, value) => {
+  try {
+    localStorage.setItem(storageKey, JSON.stringify(value));
+  } catch (error) {
+    // Storage full or unavailable; the next load simply downloads again
+  }
+};
+
+// Drop deleted and rewritten markers, then add the rewritten ones
+const applyChanges = (markers, { upserts, deleted }) => {
+  const replaced = new Set([...deleted, ...upserts.map((marker) => marker.id)]);
+  return markers.filter((marker) => !replaced.has(marker.id)).concat(upserts);
+};
+
+// Markers in `lang`, kept in localStorage with the revision they reflect so
+// later visits only download what changed since then. The first visit takes
+// the snapshot file when the backend exports one
+const fetchMarkers = async (lang, manifest) => {
+  const storageKey = `markers:${lang}`;
+  const stored = readStored(storageKey);
+  let markers;
+  let revision;
+  try {
+    if (!stored && manifest) {
+      markers = (await axios.get(absoluteUrl(manifest.files.markers[lang].url))).data;
+      revision = manifest.revision ?? 0;
+    } else {
+      const { data } = await axios.get(`${API}/markers/changes`, {
+        params: { since: stored?.revision ?? 0, lang },
+      });
+      markers = stored && !data.reset ? applyChanges(stored.markers, data) : data.upserts;
+      revision = data.revision;
+    }
+  } catch (error) {
+    if (stored) return stored.markers;
+    throw error;
+  }
+  writeStored(storageKey, { revision, markers });
+  return markers;
+};
+
+// A pushed `dataset` event carries the changes when few markers changed;
+// otherwise, or when the stored copy is at another revision, fetch them
+const applyDatasetEvent = async (lang, event) => {
+  const storageKey = `markers:${lang}`;
+  const stored = readStored(storageKey);
+  if (stored?.revision === event.revision) return stored.markers;
+  if (stored && event.upserts && stored.revision === event.since) {
+    const markers = applyChanges(stored.markers, event);
+    writeStored(storageKey, { revision: event.revision, markers });
+    return markers;
+  }
+  return fetchMarkers(lang, null);
+};
+
+// Layers from the static snapshot file when the backend exports them (served
+// by a CDN and cached for good), otherwise from the API
+const fetchMapData = async (lang) => {
+  let manifest = null;
+  try {
+    manifest = await cachedGet(`${API}/snapshot`);
+  } catch (error) {
+    manifest = null;
+  }
+  const layers = manifest
+    ? cachedGet(absoluteUrl(manifest.files.layers.url), "snapshot:layers")
+    : cachedGet(`${API}/layers`);
+  return Promise.all([layers, fetchMarkers(lang, manifest)]);
+};
+
 const mapContainerStyle = {
   width: "100%",
   height: "100vh",
@@ -77,6 +193,7 @@ function MapView() {
   const [layers, setLayers] = useState([]);
   const [markers, setMarkers] = useState([]);
   const [selectedMarker, setSelectedMarker] = useState(null);
+  const [nearby, setNearby] = useState([]);
   const [loading, setLoading] = useState(true);
   const [language, setLanguage] = useState(getBrowserLanguage());
   const navigate = useNavigate();
@@ -91,19 +208,57 @@ function MapView() {
     sights: { icon: Landmark, label: t('sights'), customIcon: "camera-icon.png" }
   };
 
+  // Markers come with name/description already resolved for the selected
+  // language, so switching language fetches (or revalidates) that variant
   useEffect(() => {
-    fetchData();
-  }, []);
+    fetchData(language);
+  }, [language]);
 
-  const fetchData = async () => {
+  // Show markers changed by a sync without a reload
+  useEffect(() => {
+    const source = new EventSource(`${API}/events?lang=${language}`);
+    source.addEventListener("dataset", async (event) => {
+      try {
+        setMarkers(await applyDatasetEvent(language, JSON.parse(event.data)));
+      } catch (error) {
+        console.error("Error applying marker changes:", error);
+      }
+    });
+    return () => source.close();
+  }, [language]);
+
+  // Closest places in other categories, shown under the selected marker
+  useEffect(() => {
+    setNearby([]);
+    if (!selectedMarker) return;
+    let cancelled = false;
+    axios
+      .get(`${API}/markers/${selectedMarker.id}/nearby?k=5&lang=${language}`)
+      .then((response) => {
+        if (!cancelled) setNearby(response.data);
+      })
+      .catch((error) => console.error("Error fetching nearby places:", error));
+    return () => {
+      cancelled = true;
+    };
+  }, [selectedMarker, language]);
+
+  const formatDistance = (meters) =>
+    meters < 1000 ? `${Math.round(meters)} m` : `${(meters / 1000).toFixed(1)} km`;
+
+  const fetchData = async (lang) => {
     try {
-      setLoading(true);
-      const [layersRes, markersRes] = await Promise.all([
-        axios.get(`${API}/layers`),
-        axios.get(`${API}/markers`),
-      ]);
-      setLayers(layersRes.data);
-      setMarkers(markersRes.data);
+      const [layersData, markersData] = await fetchMapData(lang);
+      // Keep the user's layer toggles when only the language changed
+      setLayers((prev) => (prev.length > 0 ? prev : layersData));
+      setMarkers(markersData);
+      // Close and reopen the info window to show the translated text
+      if (selectedMarker) {
+        const translated = markersData.find((marker) => marker.id === selectedMarker.id);
+        setSelectedMarker(null);
+        // Reopen with slight delay to force re-render
+        if (translated) setTimeout(() => setSelectedMarker(translated), 50);
+      }
     } catch (error) {
       console.error("Error fetching data:", error);
       toast.error(t('errorLoading'));
@@ -120,16 +275,6 @@ function MapView() {
     );
   }, []);
 
-  // Close and reopen info window when language changes to show translated text
-  useEffect(() => {
-    if (selectedMarker) {
-      const temp = selectedMarker;
-      setSelectedMarker(null);
-      // Reopen with slight delay to force re-render
-      setTimeout(() => setSelectedMarker(temp), 50);
-    }
-  }, [language]);
-
   const getVisibleMarkers = useCallback(() => {
     const visibleLayerIds = layers
       .filter((layer) => layer.visible)
@@ -222,26 +367,9 @@ function MapView() {
     }
   }, [layers]);
 
-  const getMarkerText = (marker, field) => {
-    // Return text based on selected language
-    const enField = `${field}_en`;
-    const esField = `${field}_es`;
-    
-    console.log(`Getting ${field} for language ${language}:`, {
-      pt: marker[field]?.substring(0, 30),
-      en: marker[enField]?.substring(0, 30),
-      es: marker[esField]?.substring(0, 30)
-    });
-    
-    if (language === 'en' && marker[enField]) {
-      return marker[enField];
-    }
-    if (language === 'es' && marker[esField]) {
-      return marker[esField];
-    }
-    // Default to Portuguese
-    return marker[field];
-  };
+  // The API already resolved the text for the selected language (with the
+  // Portuguese fallback), see GET /api/markers?lang=
+  const getMarkerText = (marker, field) => marker[field];
 
   const createCustomIcon = (layerId) => {
     if (!markerIcons[layerId]) return null;
@@ -362,6 +490,21 @@ function MapView() {
                       {t('openInGoogleMaps')}
                     </a>
                   )}
+                  {nearby.length > 0 && (
+                    <div className="nearby" data-testid="nearby-list">
+                      <h4>{t('nearby')}</h4>
+                      <ul>
+                        {nearby.map((place) => (
+                          <li key={place.id}>
+                            <button type="button" onClick={() => setSelectedMarker(place)}>
+                              {place.name}
+                            </button>
+                            <span>{formatDistance(place.distance)}</span>
+                          </li>
+                        ))}
+                      </ul>
+                    </div>
+                  )}
                 </div>
               </InfoWindow>
             )}
@@ -16,6 +16,7 @@ export const translations = {
     
     // Info Window
     openInGoogleMaps: "Open in Google Maps →",
+    nearby: "Nearby",
     
     // Loading
     loadingMap: "Loading map of Ilhéus...",
@@ -43,6 +44,14 @@ export const translations = {
     markersVisible: "markers visible",
     markersAdded: "markers added",
     geocodingErrors: "Geocoding errors:",
+    syncAlreadyRunning: "A sync is already running, showing its progress",
+    syncStages: {
+      queued: "Queued",
+      download: "Downloading sheet",
+      ingest: "Reading and geocoding rows",
+      delete: "Removing markers no longer in the sheet",
+      publish: "Publishing markers",
+    },
   },
   
   es: {
@@ -60,6 +69,7 @@ export const translations = {
     
     // Info Window
     openInGoogleMaps: "Abrir en Google Maps →",
+    nearby: "Cerca de aquí",
     
     // Loading
     loadingMap: "Cargando mapa de Ilhéus...",
@@ -87,6 +97,14 @@ export const translations = {
     markersVisible: "marcadores visibles",
     markersAdded: "marcadores agregados",
     geocodingErrors: "Errores de geocodificación:",
+    syncAlreadyRunning: "Ya hay una sincronización en curso, mostrando su progreso",
+    syncStages: {
+      queued: "En cola",
+      download: "Descargando la hoja",
+      ingest: "Leyendo y geocodificando filas",
+      delete: "Eliminando marcadores que ya no están en la hoja",
+      publish: "Publicando marcadores",
+    },
   },
   
   pt: {
@@ -104,6 +122,7 @@ export const translations = {
     
     // Info Window
     openInGoogleMaps: "Abrir no Google Maps →",
+    nearby: "Por perto",
     
     // Loading
     loadingMap: "Carregando mapa de Ilhéus...",
@@ -131,6 +150,14 @@ export const translations = {
     markersVisible: "marcadores visíveis",
     markersAdded: "marcadores adicionados",
     geocodingErrors: "Erros de geocodificação:",
+    syncAlreadyRunning: "Já existe uma sincronização em andamento, mostrando o progresso dela",
+    syncStages: {
+      queued: "Na fila",
+      download: "Baixando a planilha",
+      ingest: "Lendo e geocodificando linhas",
+      delete: "Removendo marcadores que não estão mais na planilha",
+      publish: "Publicando marcadores",
+    },
   }
 };
 
@@ -0,0 +1,54 @@
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "ilheus_test")
+os.environ.setdefault("GOOGLE_MAPS_KEY", "test-key")
+
+
+@pytest.fixture
+def server_module(monkeypatch):
+    """A freshly imported server module backed by an in-memory MongoDB"""
+    import motor.motor_asyncio
+    from mongomock_motor import AsyncMongoMockClient
+
+    monkeypatch.setattr(motor.motor_asyncio, "AsyncIOMotorClient", AsyncMongoMockClient)
+    import server
+    return importlib.reload(server)
+
+
+@pytest.fixture
+def api(server_module):
+    """Test client for the app; startup seeding has run on entering"""
+    from starlette.testclient import TestClient
+
+    with TestClient(server_module.app) as client:
+        yield client
+
+
+@pytest.fixture
+def run_job(api):
+    """Submit an admin job through the API and wait for it to finish"""
+    import time
+
+    def run(method, path, timeout=10.0, **kwargs):
+        response = api.request(method, path, **kwargs)
+        assert response.status_code == 202, response.text
+        job_id = response.json()["job_id"]
+        deadline = time.monotonic() + timeout
+        while True:
+            job = api.get(f"/api/admin/jobs/{job_id}").json()
+            if job["status"] != "running":
+                return job
+            assert time.monotonic() < deadline, f"job {job_id} did not finish"
+            time.sleep(0.01)
+
+    return run
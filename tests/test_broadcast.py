@@ -0,0 +1,212 @@
+import asyncio
+import gc
+import json
+import time
+import tracemalloc
+
+from pymongo import DeleteMany, UpdateOne
+
+from broadcast import Broadcaster
+
+
+SUBSCRIBERS = 5000
+
+
+class EventStreams:
+    """/api/events requests driven straight through the ASGI app, since the
+    test client reads whole bodies and cannot follow an endless stream"""
+
+    def __init__(self, app):
+        self.app = app
+        self.chunks = {}
+        self.delivered = []
+        self.disconnected = asyncio.Event()
+        self.tasks = []
+
+    def open(self, query: str = "", headers=()):
+        index = len(self.tasks)
+        self.chunks[index] = []
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": "/api/events", "raw_path": b"/api/events", "root_path": "",
+            "query_string": query.encode(), "server": ("test", 80), "client": ("test", 1234),
+            "headers": [(b"accept-encoding", b"gzip, br"), *headers],
+        }
+
+        async def receive():
+            await self.disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message.get("body"):
+                self.chunks[index].append(message["body"])
+                if message["body"].startswith((b"id:", b"event:")):
+                    self.delivered.append(time.perf_counter())
+
+        self.tasks.append(asyncio.create_task(self.app(scope, receive, send)))
+
+    def events(self, index: int):
+        found = []
+        for chunk in self.chunks[index]:
+            fields = dict(line.split(": ", 1) for line in chunk.decode().strip().split("\n") if line[:1] != ":")
+            if fields:
+                found.append({**fields, "data": json.loads(fields["data"])})
+        return found
+
+    async def wait_for(self, delivered: int, timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        while len(self.delivered) < delivered:
+            assert time.monotonic() < deadline, f"{len(self.delivered)} of {delivered} events delivered"
+            await asyncio.sleep(0.005)
+
+    async def close(self):
+        self.disconnected.set()
+        await asyncio.gather(*self.tasks)
+
+
+def test_subscribers_get_the_latest_message_only():
+    async def scenario():
+        broadcaster = Broadcaster()
+        received = []
+
+        async def deliver(message):
+            received.append(message)
+            await asyncio.sleep(0.05)
+
+        broadcaster.subscribe(deliver)
+        broadcaster.publish(1)
+        await asyncio.sleep(0.01)
+        broadcaster.publish(2)
+        broadcaster.publish(3)
+        await asyncio.sleep(0.15)
+        return received
+
+    assert asyncio.run(scenario()) == [1, 3]
+
+
+def test_replay_starts_with_the_latest_message():
+    async def scenario():
+        broadcaster = Broadcaster()
+        broadcaster.publish("v1")
+        received = []
+
+        async def deliver(message):
+            received.append(message)
+
+        broadcaster.subscribe(deliver, replay=True)
+        broadcaster.subscribe(deliver)
+        await asyncio.sleep(0.01)
+        return received
+
+    assert asyncio.run(scenario()) == ["v1"]
+
+
+def test_keepalives_close_and_failed_deliveries():
+    async def scenario():
+        broadcaster = Broadcaster(keepalive=0.01)
+        received, closed = [], []
+
+        async def deliver(message):
+            received.append(message)
+
+        async def fail(message):
+            raise ConnectionError
+
+        async def on_close():
+            closed.append(True)
+
+        broadcaster.subscribe(deliver, on_close)
+        broadcaster.subscribe(fail)
+        await asyncio.sleep(0.035)
+        # The failing subscriber is dropped at its first keepalive
+        subscribers = broadcaster.subscribers
+        broadcaster.close()
+        await asyncio.sleep(0.01)
+        return received, subscribers, closed, broadcaster.subscribers, broadcaster._timer
+
+    received, subscribers, closed, remaining, timer = asyncio.run(scenario())
+    assert len(received) >= 2 and set(received) == {None}
+    assert subscribers == 1
+    assert closed == [True] and remaining == 0 and timer is None
+
+
+def test_sync_pushes_version_and_delta(server_module, api):
+    revision = api.get("/api/markers/changes").json()["revision"]
+    renamed, removed = sorted(marker["id"] for marker in api.get("/api/markers").json())[:2]
+
+    async def scenario():
+        streams = EventStreams(server_module.app)
+        streams.open("lang=en")
+        streams.open()
+        streams.open(headers=[(b"last-event-id", str(revision - 1).encode())])
+        await streams.wait_for(1)
+        await server_module.marker_dataset.publish([
+            UpdateOne({"id": renamed}, {"$set": {"name_en": "Renamed", "revision": None}}),
+            DeleteMany({"id": removed}),
+        ])
+        await streams.wait_for(4)
+        await streams.close()
+        return [streams.events(index) for index in range(3)]
+
+    english, default, replayed = api.portal.call(scenario)
+    assert english[0]["event"] == "dataset"
+    assert english[0]["id"] == str(revision + 1)
+    event = english[0]["data"]
+    assert event["version"] == server_module.marker_dataset.version
+    assert event["since"] == revision and event["revision"] == revision + 1
+    assert [marker["name"] for marker in event["upserts"]] == ["Renamed"]
+    assert event["deleted"] == [removed]
+    assert default[0]["data"]["upserts"][0]["name_en"] == "Renamed"
+    # Reconnecting behind the current revision gets the current event first
+    assert [event["data"]["revision"] for event in replayed] == [revision, revision + 1]
+
+
+def test_large_changes_only_announce_the_version(server_module, api, monkeypatch):
+    monkeypatch.setattr(server_module, "SSE_DELTA_LIMIT", 0)
+
+    async def scenario():
+        streams = EventStreams(server_module.app)
+        streams.open()
+        await asyncio.sleep(0.01)
+        await server_module.marker_dataset.publish([UpdateOne({}, {"$set": {"revision": None}})])
+        await streams.wait_for(1)
+        await streams.close()
+        return streams.events(0)
+
+    (event,) = api.portal.call(scenario)
+    assert set(event["data"]) == {"version", "revision"}
+
+
+def test_events_validation(api):
+    assert api.get("/api/events", params={"lang": "fr"}).status_code == 400
+
+
+def test_event_reaches_5k_idle_streams(server_module, api):
+    """Delivery to every stream, and a loose bound on the memory an idle stream
+    holds; benchmarks/bench_api.py reports fan-out latency"""
+    async def scenario():
+        streams = EventStreams(server_module.app)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            for _ in range(SUBSCRIBERS):
+                streams.open()
+            while server_module.dataset_broadcast.subscribers < SUBSCRIBERS:
+                await asyncio.sleep(0.01)
+            gc.collect()
+            per_stream = (tracemalloc.get_traced_memory()[0] - before) / SUBSCRIBERS
+        finally:
+            tracemalloc.stop()
+        await server_module.marker_dataset.publish([UpdateOne({}, {"$set": {"revision": None}})])
+        await streams.wait_for(SUBSCRIBERS, timeout=60.0)
+        await streams.close()
+        revisions = {event["data"]["revision"] for index in range(SUBSCRIBERS) for event in streams.events(index)}
+        return revisions, per_stream
+
+    revisions, per_stream = api.portal.call(scenario)
+    assert revisions == {server_module.marker_dataset.revision}
+    assert server_module.dataset_broadcast.subscribers == 0
+    # About 12 KiB counting this test's side of the connection, most of it the
+    # framework's middleware; a task and generators per stream took twice that
+    assert per_stream < 16 * 1024, f"{per_stream / 1024:.1f} KiB per idle stream"
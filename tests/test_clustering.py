@@ -0,0 +1,126 @@
+import random
+import time
+
+from clustering import ClusterIndex, project
+
+
+LAYERS = ["restaurants", "hotels", "sights", "beaches"]
+# Costa do Cacau, Itacaré to Canavieiras
+REGION = (-15.7, -39.4, -14.2, -38.9)
+
+
+def synthetic_markers(count, seed=7):
+    rng = random.Random(seed)
+    south, west, north, east = REGION
+    return [
+        {
+            "id": f"m{i}",
+            "lat": rng.uniform(south, north),
+            "lng": rng.uniform(west, east),
+            "layer_id": rng.choice(LAYERS),
+        }
+        for i in range(count)
+    ]
+
+
+def total(result):
+    return sum(cluster["count"] for cluster in result["clusters"]) + len(result["markers"])
+
+
+def test_every_marker_is_counted_once_per_zoom():
+    markers = synthetic_markers(2000)
+    index = ClusterIndex(markers, max_zoom=14)
+
+    for zoom in range(0, 15):
+        result = index.query(*REGION, zoom)
+        assert total(result) == 2000
+        for cluster in result["clusters"]:
+            assert sum(cluster["layers"].values()) == cluster["count"]
+
+    assert len(index.query(*REGION, 0)["clusters"]) == 1
+
+
+def test_layer_filter_and_individual_markers():
+    markers = synthetic_markers(2000)
+    index = ClusterIndex(markers, max_zoom=14)
+
+    result = index.query(*REGION, 8, layers=["hotels"])
+    assert total(result) == sum(1 for marker in markers if marker["layer_id"] == "hotels")
+    assert all(set(cluster["layers"]) == {"hotels"} for cluster in result["clusters"])
+
+    box = (-14.80, -39.06, -14.70, -38.95)
+    zoomed = index.query(*box, 15)
+    assert zoomed["clusters"] == []
+    inside = {m["id"] for m in markers if box[0] <= m["lat"] <= box[2] and box[1] <= m["lng"] <= box[3]}
+    assert {marker["id"] for marker in zoomed["markers"]} == inside
+
+
+def test_centroid_of_a_cluster():
+    markers = [
+        {"id": "a", "lat": -14.7919, "lng": -39.0476, "layer_id": "sights"},
+        {"id": "b", "lat": -14.7928, "lng": -39.0481, "layer_id": "sights"},
+        {"id": "c", "lat": -14.7923, "lng": -39.0478, "layer_id": "restaurants"},
+    ]
+    result = ClusterIndex(markers).query(*REGION, 10)
+
+    assert result["markers"] == []
+    [cluster] = result["clusters"]
+    assert cluster["count"] == 3
+    assert cluster["layers"] == {"sights": 2, "restaurants": 1}
+    assert abs(cluster["lat"] - (-14.7919 - 14.7928 - 14.7923) / 3) < 1e-9
+
+
+def viewport(lat, lng, zoom, width=1280, height=800):
+    """Bounding box of a width x height pixel map centered on a point"""
+    import math
+
+    world = 256 * 2 ** zoom
+    x, y = project(lat, lng)
+
+    def unproject(px, py):
+        lng = px / world * 360 - 180
+        lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * py / world))))
+        return lat, lng
+
+    north, west = unproject(x * world - width / 2, y * world - height / 2)
+    south, east = unproject(x * world + width / 2, y * world + height / 2)
+    return south, west, north, east
+
+
+def test_p99_latency_at_100k_markers():
+    index = ClusterIndex(synthetic_markers(100000))
+    rng = random.Random(3)
+    south, west, north, east = REGION
+
+    timings = []
+    for _ in range(500):
+        zoom = rng.randint(6, 18)
+        box = viewport(rng.uniform(south, north), rng.uniform(west, east), zoom)
+        layers = rng.choice([None, ["restaurants"], ["hotels", "beaches"]])
+        started = time.perf_counter()
+        index.query(*box, zoom, layers=layers)
+        timings.append(time.perf_counter() - started)
+
+    timings.sort()
+    assert timings[int(len(timings) * 0.99)] < 0.010
+
+
+def test_clusters_endpoint(api):
+    markers = api.get("/api/markers").json()
+    region = ",".join(str(value) for value in REGION)
+    far = api.get("/api/clusters", params={"bbox": region, "zoom": 12}).json()
+    assert far["clusters"] and total(far) == len(markers)
+
+    centro = (-14.80, -39.06, -14.78, -39.03)
+    params = {"bbox": ",".join(str(value) for value in centro), "zoom": 19, "layers": "sights"}
+    near = api.get("/api/clusters", params=params).json()
+    assert near["clusters"] == []
+    assert sorted(marker["id"] for marker in near["markers"]) == sorted(
+        marker["id"] for marker in markers
+        if marker["layer_id"] == "sights"
+        and centro[0] <= marker["lat"] <= centro[2] and centro[1] <= marker["lng"] <= centro[3]
+    )
+
+    assert api.get("/api/clusters", params={"bbox": "1,2,3", "zoom": 12}).status_code == 400
+    for bbox in ("nan,nan,nan,nan", "-15,-40,-14,inf", "-inf,-40,-14,-39"):
+        assert api.get("/api/clusters", params={"bbox": bbox, "zoom": 12}).status_code == 400
@@ -0,0 +1,47 @@
+import gzip
+
+import brotli
+import msgpack
+
+from marker_formats import from_columns
+
+
+def test_columns_and_msgpack_round_trip(api):
+    markers = api.get("/api/markers").json()
+
+    columns = api.get("/api/markers", params={"format": "columns"})
+    assert columns.headers["content-type"] == "application/vnd.ilheus.columns+json"
+    payload = columns.json()
+    assert sorted(payload["layers"]) == ["beaches", "hotels", "restaurants", "sights"]
+    assert from_columns(payload) == markers
+
+    packed = api.get("/api/markers", headers={"Accept": "application/msgpack"})
+    assert packed.headers["content-type"] == "application/msgpack"
+    assert from_columns(msgpack.unpackb(packed.content)) == markers
+    assert len(packed.content) < len(columns.content) < len(api.get("/api/markers").content)
+
+
+def test_cached_bodies_are_precompressed(api):
+    plain = api.get("/api/markers", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+    for encoding, decompress in (("gzip", gzip.decompress), ("br", brotli.decompress)):
+        response = api.get("/api/markers", headers={"Accept-Encoding": encoding})
+        assert response.headers["content-encoding"] == encoding
+        assert response.headers["etag"] == plain.headers["etag"][:-1] + f'-{encoding}"'
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert response.content == plain.content  # decoded by the client
+        raw = api.get("/api/markers", headers={"Accept-Encoding": encoding, "If-None-Match": response.headers["etag"]})
+        assert raw.status_code == 304
+
+
+def test_middleware_compresses_dynamic_responses(api):
+    streamed = api.get("/api/markers", params={"format": "ndjson"}, headers={"Accept-Encoding": "gzip"})
+    assert streamed.headers["content-encoding"] == "gzip"
+    assert len(streamed.content.splitlines()) == 24
+
+    page = api.get("/api/markers", params={"limit": 20}, headers={"Accept-Encoding": "br;q=1, gzip;q=0.5"})
+    assert page.headers["content-encoding"] == "br"
+
+    tiny = api.get("/api/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in tiny.headers
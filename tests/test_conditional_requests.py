@@ -0,0 +1,39 @@
+import asyncio
+
+
+def test_etag_round_trip_answers_304(api):
+    for path in ["/api/layers", "/api/markers", "/api/markers/layer/hotels"]:
+        first = api.get(path)
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert etag.startswith('"') and etag.endswith('"')
+        assert "stale-while-revalidate" in first.headers["cache-control"]
+
+        second = api.get(path, headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["etag"] == etag
+
+        assert api.get(path, headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_304_is_answered_without_mongo(server_module, api):
+    etag = api.get("/api/markers").headers["etag"]
+    asyncio.run(server_module.marker_dataset.collection.drop())
+
+    assert api.get("/api/markers", headers={"If-None-Match": f'W/{etag}, "other"'}).status_code == 304
+
+
+def test_marker_write_changes_the_etag(api, run_job):
+    etag = api.get("/api/markers").headers["etag"]
+    layer_etag = api.get("/api/markers/layer/beaches").headers["etag"]
+    layers_etag = api.get("/api/layers").headers["etag"]
+
+    run_job("POST", "/api/admin/add-google-maps-urls")
+
+    changed = api.get("/api/markers", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert api.get("/api/markers/layer/beaches", headers={"If-None-Match": layer_etag}).status_code == 200
+    # Layers did not change, so their validator still matches
+    assert api.get("/api/layers", headers={"If-None-Match": layers_etag}).status_code == 304
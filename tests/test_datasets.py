@@ -0,0 +1,167 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from pymongo import DeleteMany, InsertOne, UpdateOne
+
+from datasets import DatasetStore
+
+
+def marker(marker_id, name):
+    return {"id": marker_id, "name": name, "layer_id": "sights"}
+
+
+async def names(store):
+    documents = await store.collection.find({}, {"_id": 0}).sort("id", 1).to_list(None)
+    return [document["name"] for document in documents]
+
+
+def test_publish_flips_pointer_and_keeps_old_versions():
+    async def run():
+        db = AsyncMongoMockClient()["ilheus_test"]
+        store = DatasetStore(db, "markers", keep_versions=2)
+        await store.load()
+
+        assert await store.publish([InsertOne(marker("a", "Catedral")), InsertOne(marker("b", "Bataclan"))]) == 1
+        assert await store.publish([UpdateOne({"id": "a"}, {"$set": {"name": "Catedral de São Sebastião"}})]) == 2
+        assert await names(store) == ["Catedral de São Sebastião", "Bataclan"]
+
+        # A fresh worker resolves the same current version
+        other = DatasetStore(db, "markers")
+        await other.load()
+        assert (other.version, other.collection_name) == (store.version, store.collection_name)
+
+        assert await store.rollback() == 1
+        assert await names(store) == ["Catedral", "Bataclan"]
+        assert await store.rollback(2) == 2
+
+        await store.publish([DeleteMany({"id": "b"})])
+        await store.publish([InsertOne(marker("c", "Teatro Municipal"))])
+        versions = await store.versions()
+        assert [entry["version"] for entry in versions["versions"]] == [4, 3, 2]
+        collections = await db.list_collection_names()
+        assert not any(name.startswith("markers_v1_") for name in collections)
+
+    asyncio.run(run())
+
+
+def test_reads_see_previous_version_until_flip():
+    async def run():
+        db = AsyncMongoMockClient()["ilheus_test"]
+        seen_during_build = []
+
+        def validate(document):
+            seen_during_build.append(store.collection_name)
+
+        store = DatasetStore(db, "markers", validate=validate)
+        await store.publish([InsertOne(marker("a", "Catedral"))])
+        published = store.collection_name
+        seen_during_build.clear()
+
+        await store.publish([InsertOne(marker("b", "Bataclan"))])
+        assert set(seen_during_build) == {published}
+        assert store.collection_name != published
+
+    asyncio.run(run())
+
+
+def test_invalid_dataset_is_not_published():
+    async def run():
+        db = AsyncMongoMockClient()["ilheus_test"]
+
+        def validate(document):
+            if not document.get("name"):
+                raise ValueError("marker without a name")
+
+        store = DatasetStore(db, "markers", validate=validate)
+        await store.publish([InsertOne(marker("a", "Catedral"))])
+        current = store.collection_name
+
+        with pytest.raises(ValueError):
+            await store.publish([InsertOne(marker("b", ""))])
+        with pytest.raises(ValueError):
+            await store.publish([DeleteMany({})])
+
+        assert store.collection_name == current
+        assert await names(store) == ["Catedral"]
+        assert sorted(await db.list_collection_names()) == sorted(["datasets", current])
+
+    asyncio.run(run())
+
+
+def test_legacy_markers_collection_is_adopted():
+    async def run():
+        db = AsyncMongoMockClient()["ilheus_test"]
+        await db.markers.insert_one(marker("a", "Porto de Ilhéus"))
+        store = DatasetStore(db, "markers")
+        await store.load()
+        assert await names(store) == ["Porto de Ilhéus"]
+
+        await store.publish([InsertOne(marker("b", "Praia do Sul"))])
+        assert await names(store) == ["Porto de Ilhéus", "Praia do Sul"]
+        assert await store.rollback() == 0
+        assert store.collection_name == "markers"
+
+    asyncio.run(run())
+
+
+async def revisions(store):
+    documents = await store.collection.find({}, {"_id": 0}).sort("id", 1).to_list(None)
+    return {document["id"]: document["revision"] for document in documents}
+
+
+def test_revisions_stamp_written_documents_and_tombstone_deleted_ones():
+    async def run():
+        db = AsyncMongoMockClient()["ilheus_test"]
+        store = DatasetStore(db, "markers", revisions=True)
+        await store.ensure_indexes()
+
+        await store.publish([InsertOne(marker("a", "Catedral")), InsertOne(marker("b", "Bataclan"))])
+        await store.publish([UpdateOne({"id": "a"}, {"$set": {"name": "Catedral de São Sebastião", "revision": None}}),
+                             InsertOne(marker("c", "Teatro Municipal"))])
+        # An update leaving the revision alone (say, a backfill) is not a change
+        await store.publish([UpdateOne({"id": "b"}, {"$set": {"location": [0, 0]}})])
+        await store.publish([DeleteMany({"id": "c"})])
+
+        assert store.revision == 4
+        assert await revisions(store) == {"a": 2, "b": 1}
+        assert await store.deleted_since(1) == ["c"]
+        assert await store.deleted_since(4) == []
+        assert store.has_changes_since(0) and store.has_changes_since(4)
+        assert not store.has_changes_since(5)
+
+        # Re-adding a deleted id supersedes its tombstone
+        await store.publish([InsertOne(marker("c", "Teatro"))])
+        assert await store.deleted_since(1) == []
+
+        other = DatasetStore(db, "markers", revisions=True)
+        await other.load()
+        assert (other.revision, other.changes_floor) == (5, 0)
+
+    asyncio.run(run())
+
+
+def test_rollback_and_compaction_raise_the_changes_floor():
+    async def run():
+        db = AsyncMongoMockClient()["ilheus_test"]
+        store = DatasetStore(db, "markers", revisions=True)
+        await store.publish([InsertOne(marker("a", "Catedral")), InsertOne(marker("b", "Bataclan"))])
+        await store.publish([DeleteMany({"id": "b"})])
+
+        assert await store.rollback() == 1
+        assert (store.revision, store.changes_floor) == (3, 3)
+        assert not store.has_changes_since(2)
+        assert store.has_changes_since(3)
+        assert await revisions(store) == {"a": 1, "b": 1}
+
+        # Stored dates have millisecond precision, so a tombstone written in the
+        # same millisecond would not yet be older than a zero ttl
+        store.tombstone_ttl = timedelta(seconds=-1)
+        await store.publish([DeleteMany({"id": "a"})])
+        assert await db.markers_tombstones.count_documents({}) == 0
+        assert store.changes_floor == 4
+        assert not store.has_changes_since(3)
+        assert (await store.versions())["changes_floor"] == 4
+
+    asyncio.run(run())
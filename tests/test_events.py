@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+from mongomock_motor import AsyncMongoMockClient
+from pymongo import InsertOne
+
+from datasets import DatasetStore
+from events import EventBus
+
+
+def test_events_reach_other_workers_once():
+    async def run():
+        db = AsyncMongoMockClient()["ilheus_test"]
+        first = EventBus(db, worker="first", poll_interval=0.01)
+        second = EventBus(db, worker="second", poll_interval=0.01)
+        for bus in (first, second):
+            await bus.ensure_collection()
+        received = {"first": [], "second": []}
+        first.subscribe("dataset", lambda payload: _append(received["first"], payload))
+        second.subscribe("dataset", lambda payload: _append(received["second"], payload))
+        followers = [asyncio.create_task(bus.follow()) for bus in (first, second)]
+
+        await first.publish("dataset", version=2)
+        await first.publish("layers")
+        await second.publish("dataset", version=3)
+        await asyncio.sleep(0.1)
+        for follower in followers:
+            follower.cancel()
+        await asyncio.gather(*followers, return_exceptions=True)
+
+        # Events are re-read inside the resume window but handled once
+        assert received == {"first": [{"version": 3}], "second": [{"version": 2}]}
+        assert second.stats()["received"] == 2 and second.stats()["published"] == 1
+
+    asyncio.run(run())
+
+
+async def _append(items, payload):
+    items.append(payload)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "workers did not converge"
+        time.sleep(0.02)
+
+
+def test_worker_follows_another_workers_writes(api, server_module):
+    server = server_module
+    # A second worker sharing the database, with its own in-process state
+    other_dataset = DatasetStore(server.db, "markers", indexes=server.MARKER_INDEXES)
+    other_events = EventBus(server.db, worker="other-worker")
+    server.events.poll_interval = 0.01
+
+    markers = api.get("/api/markers").json()
+    new_marker = {**markers[0], "id": "published-elsewhere", "name": "Quiosque Zabumba"}
+    version_before = api.get("/api/admin/worker").json()["dataset_version"]
+
+    async def publish():
+        await other_dataset.load()
+        version = await other_dataset.publish([InsertOne(server.canonical_marker(new_marker))])
+        await other_events.publish("dataset", name="markers", version=version)
+        await other_events.publish("layers")
+        return version
+
+    version = api.portal.call(publish)
+    wait_for(lambda: api.get("/api/admin/worker").json()["index_version"] == version)
+
+    worker = api.get("/api/admin/worker").json()
+    assert worker["dataset_version"] == version > version_before
+    assert worker["events"]["received"] >= 2
+    assert any(marker["id"] == "published-elsewhere" for marker in api.get("/api/markers").json())
+    assert api.get("/api/search", params={"q": "zabumba"}).json()[0]["id"] == "published-elsewhere"
+
+    async def echoes():
+        return await server.db.events.count_documents({"worker": server.events.worker, "payload.version": version})
+
+    # Picking up another worker's version is not announced again
+    assert api.portal.call(echoes) == 0
+
+
+def test_writes_are_announced_to_other_workers(api, server_module, run_job):
+    server = server_module
+    run_job("POST", "/api/admin/add-google-maps-urls")
+    api.post("/api/admin/markers/rollback")
+
+    async def announced():
+        return await server.db.events.find({}, {"_id": 0, "kind": 1, "payload": 1}).to_list(None)
+
+    events = api.portal.call(announced)
+    kinds = [event["kind"] for event in events]
+    assert "layers" in kinds
+    versions = [event["payload"]["version"] for event in events if event["kind"] == "dataset"]
+    assert versions[-1] == api.get("/api/admin/worker").json()["dataset_version"]
+    assert len(versions) >= 3
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import os
+import random
+
+import pytest
+from pymongo import InsertOne
+
+from datasets import DatasetStore
+from server import MARKER_INDEXES, bbox_filter, near_pipeline, canonical_marker
+
+
+# Query plans need a real MongoDB; mongomock has no geospatial support
+TEST_MONGO_URL = os.environ.get("TEST_MONGO_URL")
+pytestmark = pytest.mark.skipif(not TEST_MONGO_URL, reason="TEST_MONGO_URL not set")
+
+MARKER_COUNT = 50000
+
+
+def synthetic_marker(i):
+    return canonical_marker({
+        "id": f"geo-{i}",
+        "name": f"Ponto {i}",
+        "description": "Costa do Cacau",
+        # Ilhéus to Itacaré and Canavieiras
+        "lat": random.uniform(-15.7, -14.2),
+        "lng": random.uniform(-39.4, -38.9),
+        "layer_id": random.choice(["restaurants", "hotels", "sights", "beaches"]),
+    })
+
+
+def plan_stages(explain):
+    text = json.dumps(explain, default=str)
+    return {stage for stage in ("COLLSCAN", "IXSCAN", "GEO_NEAR_2DSPHERE") if stage in text}
+
+
+def test_bbox_and_near_use_the_2dsphere_index():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def run():
+        client = AsyncIOMotorClient(TEST_MONGO_URL)
+        db = client["ilheus_geo_test"]
+        await client.drop_database("ilheus_geo_test")
+        try:
+            store = DatasetStore(db, "markers", indexes=MARKER_INDEXES)
+            await store.publish([InsertOne(synthetic_marker(i)) for i in range(MARKER_COUNT)])
+
+            query = bbox_filter((-14.80, -39.06), (-14.78, -39.03), ["restaurants", "sights"])
+            explain = await store.collection.find(query).explain()
+            assert plan_stages(explain) == {"IXSCAN"}
+            assert await store.collection.count_documents(query) < MARKER_COUNT
+
+            pipeline = near_pipeline(-14.7928, -39.0481, 500, 20, ["restaurants"])
+            explain = await db.command("aggregate", store.collection_name, pipeline=pipeline, explain=True)
+            assert "COLLSCAN" not in plan_stages(explain)
+            assert plan_stages(explain) & {"GEO_NEAR_2DSPHERE", "IXSCAN"}
+
+            nearest = await store.collection.aggregate(pipeline).to_list(None)
+            distances = [marker["distance"] for marker in nearest]
+            assert distances == sorted(distances) and all(distance <= 500 for distance in distances)
+        finally:
+            await client.drop_database("ilheus_geo_test")
+            client.close()
+
+    asyncio.run(run())
+
+
+def test_wide_bbox_is_an_exact_lat_lng_rectangle():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    # The geodesic between (10, -60) and (10, 60) reaches 19.4 degrees north,
+    # so a plain polygon would take in the markers north of the box at lng 0
+    markers = [canonical_marker({"id": f"edge-{lng}-{lat}", "name": "Borda", "description": "",
+                                 "lat": lat, "lng": lng, "layer_id": "sights"})
+               for lat in (-10.5, -9.5, 9.5, 10.5, 15) for lng in (-50, 0, 50)]
+
+    async def run():
+        client = AsyncIOMotorClient(TEST_MONGO_URL)
+        db = client["ilheus_geo_test"]
+        await client.drop_database("ilheus_geo_test")
+        try:
+            store = DatasetStore(db, "markers", indexes=MARKER_INDEXES)
+            await store.publish([InsertOne(marker) for marker in markers])
+            found = await store.collection.find(bbox_filter((-10, -60), (10, 60))).to_list(None)
+            everywhere = await store.collection.count_documents(bbox_filter((-90, -180), (90, 180)))
+            return {marker["lat"] for marker in found}, everywhere
+        finally:
+            await client.drop_database("ilheus_geo_test")
+            client.close()
+
+    lats, everywhere = asyncio.run(run())
+    assert lats == {-9.5, 9.5}
+    assert everywhere == len(markers)
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from geocoding import GeocodeCache, Geocoder, geocode_query
+
+
+STUB_DELAY = 0.05
+
+
+class StubGeocoderHandler(BaseHTTPRequestHandler):
+    """Answers like the Google Geocoding API after a fixed delay"""
+
+    over_limit_once = set()
+    calls = []
+
+    def do_GET(self):
+        address = parse_qs(urlparse(self.path).query)["address"][0]
+        self.calls.append(address)
+        time.sleep(STUB_DELAY)
+
+        if address.startswith("Busy") and address not in self.over_limit_once:
+            self.over_limit_once.add(address)
+            payload = {"status": "OVER_QUERY_LIMIT", "results": []}
+        elif address.startswith("Nowhere"):
+            payload = {"status": "ZERO_RESULTS", "results": []}
+        else:
+            location = {"lat": -14.79, "lng": -39.04}
+            payload = {"status": "OK", "results": [{"geometry": {"location": location}}]}
+
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    request_queue_size = 128
+    daemon_threads = True
+
+
+@pytest.fixture
+def stub_url():
+    StubGeocoderHandler.calls = []
+    StubGeocoderHandler.over_limit_once = set()
+    server = StubServer(("127.0.0.1", 0), StubGeocoderHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/geocode/json"
+    server.shutdown()
+    server.server_close()
+
+
+def run_batch(url, names, concurrency, **kwargs):
+    async def run():
+        geocoder = Geocoder(api_key="test", concurrency=concurrency, url=url, **kwargs)
+        try:
+            started = time.perf_counter()
+            results = await geocoder.geocode_many(names)
+            return results, time.perf_counter() - started
+        finally:
+            await geocoder.aclose()
+
+    return asyncio.run(run())
+
+
+def test_wall_time_scales_with_concurrency_not_row_count(stub_url):
+    names = [f"Place {i}" for i in range(40)]
+
+    results, serial_like = run_batch(stub_url, names, concurrency=4)
+    assert all(results[name] == {"lat": -14.79, "lng": -39.04} for name in names)
+    # 40 rows at 4 in flight is ~10 rounds of STUB_DELAY, far below 40 serial calls
+    assert serial_like < len(names) * STUB_DELAY * 0.6
+
+    _, wide = run_batch(stub_url, names, concurrency=20)
+    assert wide < serial_like * 0.6
+
+
+def test_over_query_limit_is_retried(stub_url):
+    results, _ = run_batch(stub_url, ["Busy Place", "Nowhere Land"], concurrency=2, backoff_base=0.01)
+
+    assert results["Busy Place"] == {"lat": -14.79, "lng": -39.04}
+    assert results["Nowhere Land"] is None
+    assert sum(1 for call in StubGeocoderHandler.calls if call.startswith("Busy Place")) == 2
+
+
+def test_timeout_gives_up(stub_url):
+    results, elapsed = run_batch(stub_url, ["Slow Place"], concurrency=1, timeout=0.01, max_retries=1, backoff_base=0.01)
+
+    assert results["Slow Place"] is None
+    assert elapsed < 1
+
+
+def run_cached(url, cache, names):
+    async def run():
+        geocoder = Geocoder(api_key="test", cache=cache, concurrency=8, url=url, backoff_base=0.01)
+        try:
+            results = await geocoder.geocode_many(names)
+            return results, geocoder.calls
+        finally:
+            await geocoder.aclose()
+
+    return asyncio.run(run())
+
+
+def test_unchanged_resync_makes_no_outbound_calls(stub_url):
+    collection = AsyncMongoMockClient()["ilheus_test"]["geocode_cache"]
+    names = [f"Place {i}" for i in range(10)] + ["Nowhere Land"]
+
+    first, calls = run_cached(stub_url, GeocodeCache(collection), names)
+    assert calls == len(names)
+    assert first["Nowhere Land"] is None
+
+    # Same process, then a fresh process whose LRU is empty and reads Mongo
+    second, calls = run_cached(stub_url, GeocodeCache(collection), names)
+    assert calls == 0
+    assert second == first
+
+    # Keys are normalized, so case and spacing changes still hit the cache
+    _, calls = run_cached(stub_url, GeocodeCache(collection), ["  place   3 "])
+    assert calls == 0
+
+
+def test_negative_entries_expire_sooner(stub_url):
+    collection = AsyncMongoMockClient()["ilheus_test"]["geocode_cache"]
+    cache = GeocodeCache(collection, ttl=timedelta(days=1), negative_ttl=timedelta(seconds=-1))
+
+    run_cached(stub_url, cache, ["Place 1", "Nowhere Land"])
+    _, calls = run_cached(stub_url, cache, ["Place 1", "Nowhere Land"])
+
+    assert calls == 1
+    assert StubGeocoderHandler.calls.count(geocode_query("Nowhere Land")) == 2
+
+
+def test_invalidate_forces_a_new_lookup(stub_url):
+    collection = AsyncMongoMockClient()["ilheus_test"]["geocode_cache"]
+    cache = GeocodeCache(collection)
+    run_cached(stub_url, cache, ["Place 1", "Place 2"])
+
+    assert asyncio.run(cache.invalidate("PLACE 1")) == 1
+    _, calls = run_cached(stub_url, cache, ["Place 1", "Place 2"])
+    assert calls == 1
+
+    entries = asyncio.run(cache.list_entries("place"))
+    assert {entry["query"] for entry in entries} == {geocode_query("Place 1"), geocode_query("Place 2")}
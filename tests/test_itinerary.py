@@ -0,0 +1,123 @@
+import itertools
+import random
+import time
+import urllib.parse
+
+import pytest
+
+from itinerary import distance_matrix, held_karp, improve_route, plan_route, route_length, stops_within
+
+
+def random_matrix(count, seed):
+    rng = random.Random(seed)
+    lats = [rng.uniform(-14.86, -14.77) for _ in range(count + 1)]
+    lngs = [rng.uniform(-39.06, -39.02) for _ in range(count + 1)]
+    return distance_matrix(lats, lngs)
+
+
+@pytest.mark.parametrize("round_trip", [False, True])
+def test_held_karp_finds_the_shortest_order(round_trip):
+    for seed in range(20):
+        count = 1 + seed % 8
+        matrix = random_matrix(count, seed)
+        shortest = min(
+            route_length(matrix, order, round_trip) for order in itertools.permutations(range(1, count + 1))
+        )
+        order = held_karp(matrix, round_trip)
+        assert sorted(order) == list(range(1, count + 1))
+        assert route_length(matrix, order, round_trip) == pytest.approx(shortest)
+
+
+@pytest.mark.parametrize("round_trip", [False, True])
+def test_local_search_matches_exact_routes(round_trip):
+    for seed in range(5):
+        matrix = random_matrix(11, seed)
+        exact = route_length(matrix, held_karp(matrix, round_trip), round_trip)
+        heuristic = improve_route(matrix, round_trip, time_budget=0.1)
+        assert sorted(heuristic) == list(range(1, 12))
+        assert route_length(matrix, heuristic, round_trip) <= exact * 1.02
+
+
+def test_thirty_stops_within_budget():
+    matrix = random_matrix(30, seed=1)
+    started = time.perf_counter()
+    order, optimal = plan_route(matrix, time_budget=0.025)
+    elapsed = time.perf_counter() - started
+    assert sorted(order) == list(range(1, 31)) and not optimal
+    assert elapsed < 0.05
+    # Far better than visiting the stops in the order they were picked
+    assert route_length(matrix, order) < 0.5 * route_length(matrix, range(1, 31))
+
+
+@pytest.mark.parametrize("round_trip", [False, True])
+def test_stops_within_a_walking_distance(round_trip):
+    matrix = random_matrix(10, seed=3)
+    order = held_karp(matrix, round_trip)
+    for max_length in (0, 500, 1500, 3000, 1e9):
+        count = stops_within(matrix, order, max_length, round_trip)
+        assert route_length(matrix, order[:count], round_trip) <= max_length
+        if count < len(order):
+            assert route_length(matrix, order[:count + 1], round_trip) > max_length
+
+
+def test_itinerary_endpoint(api):
+    sights = api.get("/api/markers/layer/sights").json()
+    start = {"lat": -14.7935, "lng": -39.0460}
+    response = api.post("/api/itinerary", json={
+        "marker_ids": [marker["id"] for marker in sights], "start": start, "lang": "en",
+    })
+    assert response.status_code == 200, response.text
+    itinerary = response.json()
+    assert itinerary["optimal"]
+    assert sorted(stop["id"] for stop in itinerary["stops"]) == sorted(marker["id"] for marker in sights)
+
+    legs = itinerary["legs"]
+    assert len(legs) == len(sights)
+    assert legs[0]["from_id"] is None
+    assert [leg["to_id"] for leg in legs] == [stop["id"] for stop in itinerary["stops"]]
+    assert sum(leg["distance"] for leg in legs) == pytest.approx(itinerary["total_distance"], abs=1)
+    first = urllib.parse.parse_qs(urllib.parse.urlparse(legs[0]["google_maps_url"]).query)
+    assert first["origin"] == [f"{start['lat']},{start['lng']}"]
+    assert first["destination"] == [f"{itinerary['stops'][0]['name']}, Ilhéus, Bahia, Brazil"]
+    assert first["travelmode"] == ["walking"]
+
+    round_trip = api.post("/api/itinerary", json={
+        "marker_ids": [marker["id"] for marker in sights], "start": start, "round_trip": True,
+    }).json()
+    assert len(round_trip["legs"]) == len(sights) + 1
+    assert round_trip["legs"][-1]["to_id"] is None
+    assert round_trip["total_distance"] >= itinerary["total_distance"]
+
+
+def test_itinerary_validation(api):
+    sights = api.get("/api/markers/layer/sights").json()
+    start = {"lat": -14.79, "lng": -39.04}
+    assert api.post("/api/itinerary", json={"marker_ids": [], "start": start}).status_code == 400
+    missing = api.post("/api/itinerary", json={"marker_ids": [sights[0]["id"], "nope"], "start": start})
+    assert missing.status_code == 404 and "nope" in missing.json()["detail"]
+    assert api.post("/api/itinerary", json={
+        "marker_ids": [sights[0]["id"]], "start": start, "optimizer_time_ms": 0,
+    }).status_code == 400
+    assert api.post("/api/itinerary", json={
+        "marker_ids": [sights[0]["id"]], "start": {"lat": 120, "lng": 0},
+    }).status_code == 422
+    assert api.post("/api/itinerary", json={
+        "marker_ids": [sights[0]["id"]], "start": start, "available_minutes": 0,
+    }).status_code == 400
+
+
+@pytest.mark.parametrize("round_trip", [False, True])
+def test_itinerary_fits_the_available_time(api, round_trip):
+    sights = api.get("/api/markers/layer/sights").json()
+    request = {"marker_ids": [marker["id"] for marker in sights], "start": {"lat": -14.7935, "lng": -39.0460},
+               "round_trip": round_trip}
+    full = api.post("/api/itinerary", json=request).json()
+    assert full["skipped"] == []
+
+    available = full["walking_minutes"] / 2
+    trimmed = api.post("/api/itinerary", json={**request, "available_minutes": available}).json()
+    assert 0 < len(trimmed["stops"]) < len(sights)
+    assert trimmed["walking_minutes"] <= available + 0.05  # rounded to 0.1
+    assert [stop["id"] for stop in trimmed["stops"]] + trimmed["skipped"] == [stop["id"] for stop in full["stops"]]
+    assert len(trimmed["legs"]) == len(trimmed["stops"]) + round_trip
+    assert api.post("/api/itinerary", json={**request, "available_minutes": full["walking_minutes"] + 1}).json() == full
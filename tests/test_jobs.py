@@ -0,0 +1,118 @@
+import asyncio
+from datetime import timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+from jobs import JobRunner
+
+
+def test_job_reports_progress_errors_and_timings():
+    async def run():
+        runner = JobRunner(AsyncMongoMockClient()["ilheus_test"], progress_interval=0.01)
+        midway = asyncio.Event()
+        resume = asyncio.Event()
+
+        async def work(job):
+            job.stage("geocode", total=4)
+            for name in ["Vesúvio Bar", "Nowhere", "Praia do Sul"]:
+                job.advance()
+                if name == "Nowhere":
+                    job.error(name)
+            midway.set()
+            await resume.wait()
+            job.advance()
+            job.stage("publish")
+            return {"markers_added": 3}
+
+        job, created = await runner.submit("sync-sheet", work, {"sheet_url": "https://example.test"})
+        assert created and job["status"] == "running"
+
+        await midway.wait()
+        await asyncio.sleep(0.05)
+        running = await runner.get(job["id"])
+        assert running["progress"] == {"stage": "geocode", "processed": 3, "total": 4}
+        assert running["errors"] == ["Nowhere"]
+
+        resume.set()
+        await runner.wait()
+        done = await runner.get(job["id"])
+        assert done["status"] == "succeeded"
+        assert done["result"] == {"markers_added": 3}
+        assert set(done["timings_ms"]) == {"geocode", "publish", "total"}
+        assert done["finished_at"] is not None
+
+    asyncio.run(run())
+
+
+def test_one_job_per_kind_runs_at_a_time():
+    async def run():
+        runner = JobRunner(AsyncMongoMockClient()["ilheus_test"])
+        release = asyncio.Event()
+        started = []
+
+        async def work(job):
+            started.append(job.id)
+            await release.wait()
+            return {}
+
+        first, created = await runner.submit("sync-sheet", work)
+        second, created_again = await runner.submit("sync-sheet", work)
+        other, other_created = await runner.submit("add-google-maps-urls", work)
+        assert created and not created_again and other_created
+        assert second["id"] == first["id"]
+
+        release.set()
+        await runner.wait()
+        assert sorted(started) == sorted([first["id"], other["id"]])
+
+        # The lock is released once the job finishes
+        third, created = await runner.submit("sync-sheet", work)
+        assert created and third["id"] != first["id"]
+        await runner.wait()
+
+    asyncio.run(run())
+
+
+def test_failed_job_records_error_and_releases_lock():
+    async def run():
+        runner = JobRunner(AsyncMongoMockClient()["ilheus_test"])
+
+        async def work(job):
+            job.stage("download")
+            raise ValueError("Could not access Google Sheet")
+
+        job, _ = await runner.submit("sync-sheet", work)
+        await runner.wait()
+        failed = await runner.get(job["id"])
+        assert failed["status"] == "failed"
+        assert failed["error"] == "Could not access Google Sheet"
+        assert await runner.locks.count_documents({}) == 0
+
+    asyncio.run(run())
+
+
+def test_expired_lease_is_taken_over():
+    async def run():
+        db = AsyncMongoMockClient()["ilheus_test"]
+        crashed = JobRunner(db, lease=timedelta(seconds=-1))
+        # A worker died holding the lock; its lease is already expired
+        await crashed._acquire("sync-sheet", "dead-job")
+
+        async def work(job):
+            return {}
+
+        job, created = await JobRunner(db).submit("sync-sheet", work)
+        assert created and job["id"] != "dead-job"
+
+    asyncio.run(run())
+
+
+def test_admin_job_endpoints(api, run_job):
+    job = run_job("POST", "/api/admin/add-google-maps-urls")
+    assert job["kind"] == "add-google-maps-urls"
+    assert job["progress"]["processed"] == 24
+    assert job["result"]["updated_count"] == 24
+
+    assert api.get("/api/admin/jobs").json()[0]["id"] == job["id"]
+    assert api.get("/api/admin/jobs/unknown").status_code == 404
+    assert api.post("/api/admin/sync-sheet", params={"sheet_url": "not a sheet"}).status_code == 400
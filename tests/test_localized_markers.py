@@ -0,0 +1,69 @@
+import asyncio
+
+from pymongo import InsertOne
+
+
+def add_translated_markers(server_module):
+    markers = [
+        {
+            "id": "vesuvio",
+            "name": "Vesúvio Bar",
+            "name_en": "Vesuvius Bar",
+            "name_es": "Bar Vesubio",
+            "description": "Bar histórico frequentado por Jorge Amado.",
+            "description_en": "Historic bar Jorge Amado used to visit.",
+            "description_es": "",
+            "lat": -14.7923,
+            "lng": -39.0478,
+            "layer_id": "restaurants",
+        },
+        {
+            "id": "bataclan",
+            "name": "Bataclan",
+            "description": "Cenário do romance Gabriela Cravo e Canela.",
+            "description_es": "Escenario de la novela Gabriela, clavo y canela.",
+            "lat": -14.7921,
+            "lng": -39.0479,
+            "layer_id": "sights",
+        },
+    ]
+    operations = [InsertOne(server_module.canonical_marker(marker)) for marker in markers]
+    asyncio.run(server_module.marker_dataset.publish(operations))
+
+
+def by_id(markers):
+    return {marker["id"]: marker for marker in markers}
+
+
+def test_lang_resolves_name_and_description_with_fallback(server_module, api):
+    add_translated_markers(server_module)
+
+    english = by_id(api.get("/api/markers", params={"lang": "en"}).json())
+    spanish = by_id(api.get("/api/markers", params={"lang": "es"}).json())
+    portuguese = by_id(api.get("/api/markers", params={"lang": "pt"}).json())
+
+    assert set(english["vesuvio"]) == {"id", "name", "description", "lat", "lng", "layer_id", "google_maps_url"}
+    assert english["vesuvio"]["name"] == "Vesuvius Bar"
+    assert english["bataclan"]["name"] == "Bataclan"
+    assert spanish["vesuvio"]["name"] == "Bar Vesubio"
+    # Empty translations fall back to Portuguese
+    assert spanish["vesuvio"]["description"] == "Bar histórico frequentado por Jorge Amado."
+    assert spanish["bataclan"]["description"] == "Escenario de la novela Gabriela, clavo y canela."
+    assert portuguese["vesuvio"]["name"] == "Vesúvio Bar"
+
+
+def test_lang_responses_are_cached_per_language_and_smaller(server_module, api):
+    add_translated_markers(server_module)
+
+    full = api.get("/api/markers")
+    english = api.get("/api/markers", params={"lang": "en"})
+    spanish = api.get("/api/markers", params={"lang": "es"})
+    assert len({full.headers["etag"], english.headers["etag"], spanish.headers["etag"]}) == 3
+    assert len(english.content) < len(full.content)
+
+    page = api.get("/api/markers", params={"lang": "en", "limit": 2, "after": "bataclan"}).json()
+    assert page[0]["id"] > "bataclan" and "name_en" not in page[0]
+    assert api.get("/api/markers", params={"lang": "fr"}).status_code == 400
+
+    asyncio.run(server_module.marker_dataset.collection.delete_many({}))
+    assert api.get("/api/markers", params={"lang": "en"}).json() == english.json()
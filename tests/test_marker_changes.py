@@ -0,0 +1,62 @@
+from pymongo import DeleteMany, UpdateOne
+
+
+def apply(markers, changes):
+    """What a client does with a changes response"""
+    if changes["reset"]:
+        return {marker["id"]: marker for marker in changes["upserts"]}
+    markers = {key: marker for key, marker in markers.items() if key not in changes["deleted"]}
+    markers.update((marker["id"], marker) for marker in changes["upserts"])
+    return markers
+
+
+def test_changes_follow_writes(server_module, api):
+    first = api.get("/api/markers/changes", params={"since": 0, "lang": "en"}).json()
+    assert not first["reset"]
+    assert first["deleted"] == []
+    copy = apply({}, first)
+    assert sorted(copy) == sorted(marker["id"] for marker in api.get("/api/markers").json())
+
+    unchanged = api.get("/api/markers/changes", params={"since": first["revision"], "lang": "en"}).json()
+    assert unchanged == {"revision": first["revision"], "reset": False, "upserts": [], "deleted": []}
+
+    renamed, removed = sorted(copy)[:2]
+    api.portal.call(server_module.marker_dataset.publish, [
+        UpdateOne({"id": renamed}, {"$set": {"name_en": "Renamed", "revision": None}}),
+        DeleteMany({"id": removed}),
+    ])
+    changes = api.get("/api/markers/changes", params={"since": first["revision"], "lang": "en"}).json()
+    assert changes["revision"] == first["revision"] + 1
+    assert [marker["id"] for marker in changes["upserts"]] == [renamed]
+    assert changes["upserts"][0]["name"] == "Renamed"
+    assert changes["deleted"] == [removed]
+    assert apply(copy, changes) == {
+        marker["id"]: marker for marker in api.get("/api/markers", params={"lang": "en"}).json()
+    }
+
+
+def test_google_maps_urls_job_bumps_revisions(server_module, api, run_job):
+    since = api.get("/api/markers/changes").json()["revision"]
+    job = run_job("POST", "/api/admin/add-google-maps-urls")
+    updated = job["result"]["updated_count"]
+    changes = api.get("/api/markers/changes", params={"since": since}).json()
+    assert len(changes["upserts"]) == updated
+    assert all(marker["google_maps_url"] for marker in changes["upserts"])
+
+
+def test_rollback_resets_clients(server_module, api):
+    revision = api.get("/api/markers/changes").json()["revision"]
+    marker_id = api.get("/api/markers").json()[0]["id"]
+    api.portal.call(server_module.marker_dataset.publish, [DeleteMany({"id": marker_id})])
+    api.post("/api/admin/markers/rollback")
+
+    changes = api.get("/api/markers/changes", params={"since": revision + 1}).json()
+    assert changes["reset"]
+    assert changes["revision"] == revision + 2
+    assert marker_id in {marker["id"] for marker in changes["upserts"]}
+    assert not api.get("/api/markers/changes", params={"since": changes["revision"]}).json()["reset"]
+
+
+def test_changes_validation(api):
+    assert api.get("/api/markers/changes", params={"lang": "fr"}).status_code == 400
+    assert api.get("/api/markers/changes", params={"since": 10 ** 6}).json()["reset"]
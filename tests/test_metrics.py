@@ -0,0 +1,144 @@
+import asyncio
+import re
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from geocoding import Geocoder
+from jobs import Job, timed
+from metrics import CommandMetrics, Counter, Histogram, Registry, dataset_name
+
+
+def sample(text, name, **labels):
+    """Value of one sample in an exposition, None when it is absent"""
+    wanted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = "^" + re.escape(name + (f"{{{wanted}}}" if labels else "")) + r" (\S+)$"
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_histogram_exposition():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency", ["route"], buckets=(0.01, 0.1))
+    for value in (0.005, 0.01, 0.05, 3):
+        latency.observe(value, '/a"b')
+    registry.counter("hits_total", "Hits").inc(amount=2)
+    text = registry.render()
+
+    assert "# TYPE latency_seconds histogram" in text
+    assert sample(text, "latency_seconds_bucket", route='/a\\"b', le="0.01") == 2
+    assert sample(text, "latency_seconds_bucket", route='/a\\"b', le="0.1") == 3
+    assert sample(text, "latency_seconds_bucket", route='/a\\"b', le="+Inf") == 4
+    assert sample(text, "latency_seconds_count", route='/a\\"b') == 4
+    assert sample(text, "latency_seconds_sum", route='/a\\"b') == pytest.approx(3.065)
+    assert sample(text, "hits_total") == 2
+
+
+def test_command_listener_groups_versioned_collections():
+    durations = Histogram("mongo_seconds", "", ["collection", "command"])
+    failures = Counter("mongo_failures_total", "", ["collection", "command"])
+    listener = CommandMetrics(durations, failures)
+
+    def started(request_id, command_name, command):
+        return SimpleNamespace(connection_id=("db", 27017), request_id=request_id,
+                               command_name=command_name, command=command)
+
+    def finished(request_id):
+        return SimpleNamespace(connection_id=("db", 27017), request_id=request_id, duration_micros=1500)
+
+    listener.started(started(1, "find", {"find": "markers_v12_3fa2c1d0"}))
+    listener.started(started(2, "getMore", {"getMore": 99, "collection": "markers_v12_3fa2c1d0"}))
+    listener.started(started(3, "insert", {"insert": "events"}))
+    listener.succeeded(finished(1))
+    listener.succeeded(finished(2))
+    listener.failed(finished(3))
+
+    assert durations.count("markers", "find") == 1
+    assert durations.count("markers", "getMore") == 1
+    assert durations.count("events", "insert") == 1
+    assert failures.value("events", "insert") == 1
+
+    # A new collection per published version must not grow the name memo forever
+    for version in range(1000):
+        listener.started(started(10 + version, "find", {"find": f"markers_v{version}_{version:08x}"}))
+    assert dataset_name.cache_info().currsize <= 256
+
+
+def test_job_steps_charge_nested_time_once():
+    async def run():
+        job = Job("job", "sync-sheet")
+
+        async def download():
+            for _ in range(3):
+                await asyncio.sleep(0.02)
+                yield "chunk"
+
+        async def parse(chunks):
+            async for chunk in chunks:
+                time.sleep(0.01)
+                yield chunk.upper()
+
+        started = time.perf_counter()
+        with job.step("write"):
+            rows = [row async for row in timed(parse(timed(download(), job, "download")), job, "parse")]
+        return job, rows, time.perf_counter() - started
+
+    job, rows, elapsed = asyncio.run(run())
+    assert rows == ["CHUNK"] * 3
+    steps = job.steps
+    assert set(steps) == {"download", "parse", "write"} and all(seconds > 0 for seconds in steps.values())
+    # Lower bounds only (sleeps never end early by more than the clock's
+    # resolution); a loaded runner can stretch any of them
+    assert steps["download"] > 0.05 and steps["parse"] > 0.025
+    # Nested time is charged to the innermost step only, so the steps add up
+    # to the time spent, and write keeps just its own small share
+    assert sum(steps.values()) <= elapsed
+    assert steps["write"] < steps["parse"]
+
+
+def test_geocoder_reports_each_request():
+    outcomes = []
+    statuses = iter(["OVER_QUERY_LIMIT", "OK"])
+
+    def respond(request):
+        status = next(statuses)
+        results = [{"geometry": {"location": {"lat": -14.8, "lng": -39.0}}}] if status == "OK" else []
+        return httpx.Response(200, json={"status": status, "results": results})
+
+    async def run():
+        geocoder = Geocoder(api_key="key", backoff_base=0,
+                            on_request=lambda status, seconds: outcomes.append((status, seconds)))
+        geocoder._client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+        location = await geocoder.geocode("Vesúvio")
+        await geocoder.aclose()
+        return location
+
+    assert asyncio.run(run()) == {"lat": -14.8, "lng": -39.0}
+    assert [status for status, _ in outcomes] == ["OVER_QUERY_LIMIT", "OK"]
+    assert all(seconds >= 0 for _, seconds in outcomes)
+
+
+def test_metrics_endpoint(api, run_job):
+    markers = api.get("/api/markers").json()
+    api.get("/api/markers")
+    api.get(f"/api/markers/{markers[0]['id']}/nearby", params={"k": 3})
+    api.get("/api/nowhere")
+    run_job("POST", "/api/admin/add-google-maps-urls")
+
+    response = api.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert sample(text, "http_request_duration_seconds_count",
+                  method="GET", route="/api/markers", status="200") == 2
+    assert sample(text, "http_request_duration_seconds_count",
+                  method="GET", route="/api/markers/{marker_id}/nearby", status="200") == 1
+    assert sample(text, "http_request_duration_seconds_count",
+                  method="GET", route="unmatched", status="404") == 1
+    assert sample(text, "response_cache_hits_total") >= 1
+    assert 0 < sample(text, "response_cache_hit_ratio") <= 1
+    assert sample(text, "job_duration_seconds_count", kind="add-google-maps-urls", status="succeeded") == 1
+    assert sample(text, "job_stage_duration_seconds_count", kind="add-google-maps-urls", stage="scan") == 1
+    assert sample(text, "marker_dataset_version") >= 1
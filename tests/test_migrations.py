@@ -0,0 +1,182 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from starlette.testclient import TestClient
+
+from migrations import MigrationRegistry
+
+
+def test_migrations_run_once_in_order():
+    async def run():
+        db = AsyncMongoMockClient()["ilheus_test"]
+        registry = MigrationRegistry()
+        calls = []
+
+        @registry.migration("0002_second")
+        async def second():
+            calls.append("second")
+
+        @registry.migration("0001_first", "First migration")
+        async def first():
+            calls.append("first")
+
+        assert await registry.run(db) == ["0001_first", "0002_second"]
+        assert await registry.run(db) == []
+        assert calls == ["first", "second"]
+
+        applied = await registry.applied(db)
+        assert applied["0001_first"]["description"] == "First migration"
+        assert applied["0002_second"]["status"] == "applied"
+
+    asyncio.run(run())
+
+
+def test_failed_migration_releases_its_claim():
+    async def run():
+        db = AsyncMongoMockClient()["ilheus_test"]
+        registry = MigrationRegistry()
+        attempts = []
+
+        @registry.migration("0001_flaky")
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError("boom")
+
+        @registry.migration("0002_after")
+        async def after():
+            pass
+
+        with pytest.raises(RuntimeError):
+            await registry.run(db)
+        # Nothing recorded, and later migrations did not run
+        assert await registry.applied(db) == {}
+        assert await registry.run(db) == ["0001_flaky", "0002_after"]
+
+    asyncio.run(run())
+
+
+def test_workers_wait_for_a_migration_claimed_by_another():
+    async def run():
+        db = AsyncMongoMockClient()["ilheus_test_race"]
+        release = asyncio.Event()
+        calls = []
+
+        def registry():
+            migrations = MigrationRegistry(poll_interval=0.01)
+
+            @migrations.migration("0001_seed")
+            async def seed():
+                calls.append("0001 started")
+                await release.wait()
+                calls.append("0001 done")
+
+            @migrations.migration("0002_depends_on_seed")
+            async def depends():
+                calls.append("0002")
+
+            return migrations
+
+        first = asyncio.create_task(registry().run(db))
+        await asyncio.sleep(0.02)
+        second = asyncio.create_task(registry().run(db))
+        await asyncio.sleep(0.05)
+        # The second worker must not move past 0001 while it is being applied
+        assert calls == ["0001 started"]
+        release.set()
+        ran = await asyncio.gather(first, second)
+        assert calls == ["0001 started", "0001 done", "0002"]
+        assert sorted(ran[0] + ran[1]) == ["0001_seed", "0002_depends_on_seed"]
+
+    asyncio.run(run())
+
+
+def test_lapsed_claim_is_taken_over():
+    async def run():
+        db = AsyncMongoMockClient()["ilheus_test_lapsed"]
+        registry = MigrationRegistry()
+        calls = []
+
+        @registry.migration("0001_seed")
+        async def seed():
+            calls.append("0001")
+
+        # A worker died while applying 0001, a while ago
+        started = datetime.now(timezone.utc) - timedelta(hours=1)
+        await db.migrations.insert_one({"_id": "0001_seed", "status": "running", "started_at": started,
+                                        "claimed_until": started + registry.lease})
+        assert await registry.run(db) == ["0001_seed"]
+        assert calls == ["0001"]
+        record = (await registry.applied(db))["0001_seed"]
+        assert record["status"] == "applied" and "claimed_until" not in record
+
+    asyncio.run(run())
+
+
+def test_cold_start_seeds_once_and_warm_start_does_no_data_work(server_module):
+    app = server_module.app
+
+    started = time.perf_counter()
+    with TestClient(app) as client:
+        cold_start = time.perf_counter() - started
+        assert len(client.get("/api/markers").json()) == 24
+        migrations = client.get("/api/admin/migrations").json()
+    assert [m["id"] for m in migrations] == server_module.migrations.ids
+    assert all(m["status"] == "applied" for m in migrations)
+
+    async def indexes():
+        layers = await server_module.db.layers.index_information()
+        markers = await server_module.marker_dataset.collection.index_information()
+        return layers, markers
+
+    layer_indexes, marker_indexes = asyncio.run(indexes())
+    assert any(index.get("unique") and index["key"] == [("id", 1)] for index in layer_indexes.values())
+    assert any(index["key"] == [("layer_id", 1), ("id", 1)] for index in marker_indexes.values())
+
+    ran = []
+    original_run = server_module.migrations.run
+
+    async def tracking_run(db):
+        applied = await original_run(db)
+        ran.extend(applied)
+        return applied
+
+    server_module.migrations.run = tracking_run
+    started = time.perf_counter()
+    with TestClient(app) as client:
+        warm_start = time.perf_counter() - started
+        assert len(client.get("/api/markers").json()) == 24
+        assert len(client.get("/api/layers").json()) == 4
+    assert ran == []
+
+    assert cold_start < 2.0
+    assert warm_start < cold_start
+
+
+def test_warm_start_indexes_the_current_marker_version(server_module):
+    with TestClient(server_module.app):
+        pass
+    dataset = server_module.marker_dataset
+
+    async def forget_indexes():
+        await dataset.collection.drop_indexes()
+        await server_module.db.drop_collection("markers")
+        # As a new process would start: the versioned pointer is only in the database
+        dataset.version, dataset.collection_name = 0, dataset.name
+
+    asyncio.run(forget_indexes())
+    with TestClient(server_module.app):
+        pass
+
+    async def indexes():
+        return await dataset.collection.index_information(), await server_module.db.list_collection_names()
+
+    current, collections = asyncio.run(indexes())
+    assert dataset.collection_name != "markers"
+    keys = [index["key"] for index in current.values()]
+    for index_keys, _ in server_module.MARKER_INDEXES:
+        assert list(index_keys) in keys
+    assert "markers" not in collections
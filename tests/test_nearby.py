@@ -0,0 +1,70 @@
+import math
+import random
+
+import pytest
+
+from spatial import EARTH_RADIUS, NearestIndex
+
+
+LAYERS = ["restaurants", "hotels", "sights", "beaches"]
+
+
+def synthetic_markers(count, seed=5):
+    rng = random.Random(seed)
+    return [
+        {"id": f"m{i}", "lat": rng.uniform(-15.7, -14.2), "lng": rng.uniform(-39.4, -38.9),
+         "layer_id": rng.choice(LAYERS)}
+        for i in range(count)
+    ]
+
+
+def haversine(a, b):
+    phi1, phi2 = math.radians(a["lat"]), math.radians(b["lat"])
+    h = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(b["lng"] - a["lng"]) / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(h))
+
+
+@pytest.mark.parametrize("layers", [None, ["restaurants"], ["hotels", "beaches"]])
+def test_nearest_matches_a_full_scan(layers):
+    markers = synthetic_markers(5000)
+    index = NearestIndex(markers, leaf_size=8)
+    for origin in random.Random(2).sample(markers, 25):
+        wanted = layers or [layer for layer in LAYERS if layer != origin["layer_id"]]
+        expected = sorted(
+            (haversine(origin, marker), marker["id"])
+            for marker in markers if marker["layer_id"] in wanted and marker is not origin
+        )[:7]
+        found = index.nearest(origin["id"], 7, layers)
+        assert [marker["id"] for marker, _ in found] == [marker_id for _, marker_id in expected]
+        assert all(abs(distance - meters) < 1e-3 for (_, distance), (meters, _) in zip(found, expected))
+
+
+def test_small_layers_and_unknown_layers():
+    markers = synthetic_markers(3)
+    index = NearestIndex(markers)
+    origin = markers[0]["id"]
+    assert len(index.nearest(origin, 10, layers=LAYERS)) == 2
+    assert index.nearest(origin, 5, layers=["nowhere"]) == []
+    assert index.get("missing") is None
+    assert NearestIndex([]).get("m0") is None
+
+
+def test_nearby_endpoint(api):
+    beaches = api.get("/api/markers/layer/beaches").json()
+    milionarios = next(marker for marker in beaches if marker["name"] == "Praia dos Milionários")
+
+    nearby = api.get(f"/api/markers/{milionarios['id']}/nearby", params={"k": 3}).json()
+    assert len(nearby) == 3
+    assert all(marker["layer_id"] != "beaches" for marker in nearby)
+    assert [marker["distance"] for marker in nearby] == sorted(marker["distance"] for marker in nearby)
+
+    restaurants = api.get(
+        f"/api/markers/{milionarios['id']}/nearby", params={"k": 50, "layers": "restaurants", "lang": "en"}
+    ).json()
+    assert restaurants and all(marker["layer_id"] == "restaurants" for marker in restaurants)
+    assert set(restaurants[0]) == {"id", "name", "description", "lat", "lng", "layer_id", "google_maps_url",
+                                   "distance"}
+
+    assert api.get("/api/markers/unknown/nearby").status_code == 404
+    assert api.get(f"/api/markers/{milionarios['id']}/nearby", params={"k": 0}).status_code == 400
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+from pymongo import InsertOne
+
+
+def add_markers(server_module, count):
+    markers = [
+        server_module.canonical_marker({
+            "id": f"extra-{i:05d}",
+            "name": f"Ponto {i}",
+            "description": "Costa do Cacau",
+            "lat": -14.79 - i * 1e-5,
+            "lng": -39.04,
+            "layer_id": "sights" if i % 2 else "restaurants",
+        })
+        for i in range(count)
+    ]
+    asyncio.run(server_module.marker_dataset.publish([InsertOne(marker) for marker in markers]))
+
+
+def test_full_list_is_not_truncated(server_module, api):
+    add_markers(server_module, 1500)
+    assert len(api.get("/api/markers").json()) == 1524
+    assert len(api.get("/api/markers/layer/sights").json()) == 750 + 8
+
+
+def test_keyset_pages_cover_every_marker_once(server_module, api):
+    add_markers(server_module, 1500)
+
+    ids, after, pages = [], None, 0
+    while True:
+        params = {"limit": 400, **({"after": after} if after else {})}
+        response = api.get("/api/markers", params=params)
+        page = response.json()
+        ids += [marker["id"] for marker in page]
+        pages += 1
+        after = response.headers.get("x-next-after")
+        if not after:
+            break
+        assert 'rel="next"' in response.headers["link"]
+
+    assert pages == 4
+    assert ids == sorted(ids) and len(set(ids)) == 1524
+
+    layer_page = api.get("/api/markers/layer/restaurants", params={"limit": 10, "after": "extra-00500"}).json()
+    assert [marker["id"] for marker in layer_page] == [f"extra-{i:05d}" for i in range(502, 522, 2)]
+
+    assert api.get("/api/markers", params={"limit": 0}).status_code == 400
+
+
+def test_ndjson_stream(server_module, api):
+    add_markers(server_module, 1500)
+
+    response = api.get("/api/markers", params={"format": "ndjson"})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.content.splitlines()
+    assert len(lines) == 1524
+    assert set(json.loads(lines[0])) == set(server_module.Marker.model_fields)
+
+    streamed = api.get("/api/markers/layer/sights", headers={"Accept": "application/x-ndjson"})
+    assert len(streamed.content.splitlines()) == 758
+    assert len(api.get("/api/layers", params={"format": "ndjson"}).content.splitlines()) == 4
+
+
+def test_bbox_limit_is_bounded(server_module, api):
+    params = {"sw": "-14.80,-39.06", "ne": "-14.78,-39.03"}
+    for limit in (0, -1, server_module.MAX_PAGE_SIZE + 1):
+        assert api.get("/api/markers/bbox", params={**params, "limit": limit}).status_code == 400
+
+
+def test_bbox_and_near_reject_bad_parameters(server_module, api):
+    box = {"sw": "-14.80,-39.06", "ne": "-14.78,-39.03"}
+    for params in ({**box, "sw": "-91,-39.06"}, {**box, "ne": "-14.78,181"}, {**box, "sw": "nowhere"},
+                   {"sw": box["ne"], "ne": box["sw"]}):
+        assert api.get("/api/markers/bbox", params=params).status_code == 400, params
+
+    point = {"lat": -14.79, "lng": -39.04}
+    for params in ({**point, "lat": 91}, {**point, "lng": -181}, {**point, "lat": "nan"},
+                   {**point, "radius": 0}, {**point, "radius": "nan"}, {**point, "radius": "inf"},
+                   {**point, "limit": 0}, {**point, "limit": server_module.MAX_PAGE_SIZE + 1}):
+        assert api.get("/api/markers/near", params=params).status_code == 400, params
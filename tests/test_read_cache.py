@@ -0,0 +1,40 @@
+import asyncio
+
+
+def test_cached_responses_skip_mongo_until_invalidated(server_module, api):
+    markers = api.get("/api/markers").json()
+    layers = api.get("/api/layers").json()
+    assert len(markers) == 24
+    assert {layer["id"] for layer in layers} == {"restaurants", "hotels", "sights", "beaches"}
+
+    # Writes that bypass the app are not seen: the bodies come from memory
+    db = server_module.db
+    asyncio.run(server_module.marker_dataset.collection.delete_many({}))
+    asyncio.run(db.layers.delete_many({}))
+    assert api.get("/api/markers").json() == markers
+    assert api.get("/api/layers").json() == layers
+    assert server_module.response_cache.stats()["hits"] == 2
+
+
+def test_marker_writes_invalidate_cached_responses(server_module, api, run_job):
+    before = api.get("/api/markers").json()
+    beaches = api.get("/api/markers/layer/beaches").json()
+    assert all(marker["google_maps_url"] is None for marker in before)
+    assert len(beaches) == 6
+
+    assert run_job("POST", "/api/admin/add-google-maps-urls")["result"]["updated_count"] == 24
+
+    after = api.get("/api/markers").json()
+    assert all(marker["google_maps_url"] for marker in after)
+    assert all(marker["google_maps_url"] for marker in api.get("/api/markers/layer/beaches").json())
+
+    api.post("/api/admin/markers/rollback")
+    assert api.get("/api/markers").json() == before
+
+
+def test_cached_body_matches_response_model(server_module, api):
+    server_module.response_cache.enabled = False
+    uncached = api.get("/api/markers").json()
+    server_module.response_cache.enabled = True
+    assert api.get("/api/markers").json() == uncached
+    assert set(uncached[0]) == set(server_module.Marker.model_fields)
@@ -0,0 +1,143 @@
+import random
+import sys
+import time
+from pathlib import Path
+
+from pymongo import UpdateOne
+
+from search import SearchIndex, fold
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+from bench_search import QUERIES, REGION, synthetic_pois
+
+
+def poi(marker_id, name, description, lat=-14.79, lng=-39.04, layer_id="sights", **fields):
+    return {"id": marker_id, "name": name, "description": description, "lat": lat, "lng": lng,
+            "layer_id": layer_id, **fields}
+
+
+MARKERS = [
+    poi("vesuvio", "Vesúvio Bar", "Bar histórico frequentado por Jorge Amado.", layer_id="restaurants"),
+    poi("casa", "Casa de Cultura Jorge Amado", "Casa onde o escritor viveu.", lat=-14.7935, lng=-39.0466),
+    poi("cabana", "Restaurante Cabana Gabriela", "Moqueca baiana tradicional.", lat=-14.70, lng=-39.00,
+        layer_id="restaurants", description_en="Traditional Bahian moqueca."),
+    poi("catedral", "Catedral de São Sebastião", "Cartão-postal de Ilhéus.", name_es="Catedral de San Sebastián"),
+]
+
+
+def ids(results):
+    return [marker["id"] for marker, _, _ in results]
+
+
+def test_fold_removes_case_and_accents():
+    assert fold("ILHÉUS São Sebastián") == "ilheus sao sebastian"
+
+
+def test_matching_is_accent_insensitive_across_languages():
+    index = SearchIndex(MARKERS)
+    assert ids(index.search("Ilheus")) == ["catedral"]
+    assert ids(index.search("sebastian")) == ["catedral"]
+    assert ids(index.search("bahian")) == ["cabana"]
+    # Name matches outrank description matches
+    assert ids(index.search("jorge amado")) == ["casa", "vesuvio"]
+
+
+def test_prefix_and_fuzzy_matching():
+    index = SearchIndex(MARKERS)
+    assert ids(index.search("gabri")) == ["cabana"]
+    assert ids(index.search("moqeuca")) == ["cabana"]
+    assert ids(index.search("catedarl sebastiao")) == ["catedral"]
+    assert index.search("xyzzy") == []
+
+
+def test_near_blends_distance_into_the_ranking():
+    index = SearchIndex(MARKERS + [poi("bar2", "Bar do Jorge", "", lat=-14.70, lng=-39.00)])
+    far_first = ids(index.search("jorge"))
+    near_cabana = index.search("jorge", near=(-14.70, -39.00))
+    assert far_first[0] == "casa"
+    assert ids(near_cabana)[0] == "bar2"
+    assert near_cabana[0][2] == 0.0
+    assert ids(index.search("jorge", layers=["restaurants"])) == ["vesuvio"]
+
+
+def test_update_reindexes_only_changed_markers():
+    index = SearchIndex(MARKERS)
+    changed = [dict(marker) for marker in MARKERS[1:]]
+    changed[0]["google_maps_url"] = "https://maps.example/casa"
+    changed[1]["description"] = "Acarajé e moqueca."
+    changed.append(poi("teatro", "Teatro Municipal", "Antigo cine-teatro."))
+
+    removed, added = index.changes(changed)
+    assert sorted(removed) == ["cabana", "vesuvio"]
+    assert sorted(marker["id"] for marker in added) == ["cabana", "teatro"]
+    index.apply(removed, added)
+
+    assert len(index) == 4
+    assert ids(index.search("acaraje")) == ["cabana"]
+    assert ids(index.search("vesuvio")) == []
+    assert ids(index.search("teatro")) == ["teatro"]
+    assert index.markers["casa"]["google_maps_url"] == "https://maps.example/casa"
+    # Slots freed by removals are reused
+    index.update(changed + [poi("ponte", "Ponte Jorge Amado", "")])
+    assert ids(index.search("ponte")) == ["ponte"]
+
+
+def test_p99_latency_at_100k_markers():
+    index = SearchIndex(synthetic_pois(100000))
+    rng = random.Random(3)
+    south, west, north, east = REGION
+
+    timings = []
+    for i in range(400):
+        near = (rng.uniform(south, north), rng.uniform(west, east)) if i % 2 else None
+        started = time.perf_counter()
+        index.search(rng.choice(QUERIES), limit=20, near=near)
+        timings.append(time.perf_counter() - started)
+
+    timings.sort()
+    assert timings[int(len(timings) * 0.99)] < 0.010
+
+
+def test_search_endpoint(api):
+    results = api.get("/api/search", params={"q": "moqueca"}).json()
+    assert results[0]["name"] == "Restaurante Cabana Gabriela"
+    assert results[0]["score"] > 0 and results[0]["distance"] is None
+
+    vesuvio = (-14.7923, -39.0478)
+    plain = api.get("/api/search", params={"q": "bar jorge"}).json()
+    results = api.get("/api/search", params={"q": "bar jorge", "lang": "en", "near": "%s,%s" % vesuvio}).json()
+    assert [r["name"] for r in results].index("Vesúvio Bar") <= [r["name"] for r in plain].index("Vesúvio Bar")
+    assert results[0]["name"] == "Vesúvio Bar" and results[0]["distance"] < 1
+    assert set(results[0]) == {"id", "name", "description", "lat", "lng", "layer_id", "google_maps_url",
+                               "score", "distance"}
+
+    assert api.get("/api/search", params={"q": "praia", "layers": "beaches", "limit": 3}).status_code == 200
+    assert len(api.get("/api/search", params={"q": "praia", "layers": "beaches", "limit": 3}).json()) == 3
+    assert api.get("/api/search", params={"q": "bar", "lang": "fr"}).status_code == 400
+    assert api.get("/api/search", params={"q": "bar", "near": "nowhere"}).status_code == 400
+
+
+def test_search_follows_marker_writes(api, run_job):
+    before = api.get("/api/search", params={"q": "milionarios"}).json()
+    assert before and before[0]["google_maps_url"] is None
+    run_job("POST", "/api/admin/add-google-maps-urls")
+    after = api.get("/api/search", params={"q": "milionarios"}).json()
+    assert after[0]["google_maps_url"]
+
+
+def test_search_ignores_a_listener_for_an_older_version(server_module, api):
+    dataset = server_module.marker_dataset
+    marker_id = api.get("/api/search", params={"q": "milionarios"}).json()[0]["id"]
+
+    async def publish(name):
+        version = await dataset.publish([UpdateOne({"id": marker_id}, {"$set": {"name": name}})])
+        markers = await dataset.collection.find({}, server_module.marker_serializer.projection).to_list(None)
+        return version, markers
+
+    older = api.portal.call(publish, "Palacete Primeiro")
+    api.portal.call(publish, "Palacete Segundo")
+    # The older version's listener only gets the lock once the newer one is live
+    api.portal.call(server_module.update_search_index, *older)
+
+    assert [r["id"] for r in api.get("/api/search", params={"q": "segundo"}).json()] == [marker_id]
+    assert api.get("/api/search", params={"q": "primeiro"}).json() == []
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+from pymongo import InsertOne
+
+from serialization import DocumentSerializer
+
+
+PATHS = [
+    "/api/layers",
+    "/api/markers",
+    "/api/markers?lang=en",
+    "/api/markers?limit=5",
+    "/api/markers/layer/beaches",
+    "/api/search?q=praia&lang=es",
+    "/api/clusters?bbox=-15.0,-39.2,-14.6,-38.9&zoom=12",
+    "/api/clusters?bbox=-15.0,-39.2,-14.6,-38.9&zoom=20",
+]
+
+
+def test_fast_and_strict_encode_canonical_documents_alike(server_module):
+    marker = server_module.canonical_marker({
+        "id": "m1", "name": "Catedral", "description": "Catedral de São Sebastião",
+        "lat": -14.7935, "lng": -39.0463, "layer_id": "sights",
+    })
+    document = {field: marker[field] for field in server_module.marker_serializer.fields}
+    fast = DocumentSerializer(server_module.Marker)
+    strict = DocumentSerializer(server_module.Marker, strict=True)
+    assert json.loads(fast.dump_list([document])) == json.loads(strict.dump_list([document]))
+    assert json.loads(fast.dump(document)) == json.loads(strict.dump(document))
+    assert document["name_en"] is None and document["google_maps_url"] is None
+
+
+def test_select_trims_and_fills_defaults(server_module):
+    serializer = DocumentSerializer(server_module.NearbyResult)
+    selected = serializer.select({"id": "m1", "name": "Bar", "name_en": "Bar", "description": "",
+                                  "lat": 1.0, "lng": 2.0, "layer_id": "restaurants", "distance": 3.5,
+                                  "location": {"type": "Point"}})
+    assert list(selected) == serializer.fields
+    assert selected["google_maps_url"] is None
+
+
+def test_strict_mode_rejects_what_fast_mode_trusts(server_module):
+    document = {"id": "m1", "name": "Bar", "lat": "north", "lng": 2.0, "layer_id": "restaurants"}
+    assert json.loads(DocumentSerializer(server_module.Marker).dump_list([document]))[0]["lat"] == "north"
+    with pytest.raises(ValueError):
+        DocumentSerializer(server_module.Marker, strict=True).dump_list([document])
+
+
+def read_all(api):
+    bodies = {}
+    marker_id = api.get("/api/markers").json()[0]["id"]
+    for path in PATHS + [f"/api/markers/{marker_id}/nearby?lang=en", "/api/markers?format=ndjson"]:
+        response = api.get(path)
+        assert response.status_code == 200, path
+        if path.endswith("ndjson"):
+            bodies[path] = sorted(response.text.splitlines())
+        else:
+            bodies[path] = response.json()
+    return bodies
+
+
+def test_strict_switch_serves_the_same_responses(server_module, api, monkeypatch):
+    fast = read_all(api)
+    for name in dir(server_module):
+        if isinstance(getattr(server_module, name), DocumentSerializer):
+            monkeypatch.setattr(getattr(server_module, name), "strict", True)
+    server_module.response_cache.invalidate()
+    assert read_all(api) == fast
+
+
+def test_migration_fills_in_missing_fields(server_module, api):
+    legacy = {"id": "legacy", "name": "Antigo", "description": "Sem traduções",
+              "lat": -14.79, "lng": -39.04, "layer_id": "sights",
+              "location": server_module.geo_point(-14.79, -39.04)}
+    api.portal.call(server_module.marker_dataset.publish, [InsertOne(legacy)])
+    api.portal.call(server_module.db.layers.update_one, {"id": "hotels"}, {"$unset": {"visible": ""}})
+
+    api.portal.call(server_module.canonicalize_documents)
+
+    marker = api.portal.call(server_module.marker_dataset.collection.find_one, {"id": "legacy"})
+    assert all(field in marker for field in server_module.marker_serializer.fields)
+    hotels = next(layer for layer in api.get("/api/layers").json() if layer["id"] == "hotels")
+    assert hotels["visible"] is True
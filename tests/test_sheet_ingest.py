@@ -0,0 +1,260 @@
+import asyncio
+import csv
+import io
+import os
+import subprocess
+import sys
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+import pytest
+
+from sheet_ingest import batched, csv_records
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+HEADER = "Name,Name_EN,Description,Category\n"
+
+
+def sheet_rows(count, categories=("restaurants", "hotels", "beaches", "sights")):
+    for i in range(count):
+        category = categories[i % len(categories)]
+        yield f'Lugar {i},Place {i},"Descrição {i}, com vírgula",{category}\n'
+
+
+class StubSheetHandler(BaseHTTPRequestHandler):
+    """Serves /{sheet_id} as a CSV export, generated while it is sent"""
+
+    sheets = {}
+
+    def do_GET(self):
+        sheet = self.sheets.get(self.path.split("/")[1])
+        if sheet is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv; charset=utf-8")
+        self.end_headers()
+        chunk = []
+        for line in sheet():
+            chunk.append(line)
+            if len(chunk) == 1000:
+                self.wfile.write("".join(chunk).encode())
+                chunk = []
+        self.wfile.write("".join(chunk).encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def sheet_server():
+    StubSheetHandler.sheets = {}
+    server = StubServer(("127.0.0.1", 0), StubSheetHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield StubSheetHandler.sheets, f"http://127.0.0.1:{server.server_address[1]}/{{sheet_id}}"
+    server.shutdown()
+    server.server_close()
+
+
+class StubGeocoder:
+    """Places geocode to a point derived from their name; 'Nowhere' fails"""
+
+    def __init__(self):
+        self.batches = []
+
+    async def aclose(self):
+        pass
+
+    async def geocode_many(self, place_names, on_result=None):
+        names = list(dict.fromkeys(place_names))
+        self.batches.append(len(names))
+        results = {}
+        for name in names:
+            location = None if name.startswith("Nowhere") else {"lat": -14.79, "lng": -39.04 + len(name) / 1000}
+            results[name] = location
+            if on_result:
+                on_result(name, location)
+        return results
+
+
+async def chunked(text, size):
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+async def collect(aiterator):
+    return [item async for item in aiterator]
+
+
+def test_csv_records_match_csv_module_for_any_chunking():
+    text = (
+        'Name,Description,Category\r\n'
+        '"Bar ""Vesúvio""","Petiscos, chope\ne história",restaurants\r\n'
+        '\r\n'
+        'Praia do Sul,"Linha 1\nLinha 2\nLinha 3",beaches\n'
+        'Sem quebra final,,sights'
+    )
+    expected = list(csv.DictReader(io.StringIO(text, newline="")))
+    assert len(expected) == 3
+    for size in (1, 2, 7, 64, len(text)):
+        assert asyncio.run(collect(csv_records(chunked(text, size)))) == expected
+
+
+def test_batched_groups_a_stream():
+    async def numbers():
+        for i in range(7):
+            yield i
+
+    assert asyncio.run(collect(batched(numbers(), 3))) == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_sync_streams_the_sheet_in_batches(server_module, run_job, sheet_server, monkeypatch):
+    sheets, url = sheet_server
+    geocoder = StubGeocoder()
+    monkeypatch.setattr(server_module, "SHEET_EXPORT_URL", url)
+    monkeypatch.setattr(server_module, "SYNC_BATCH_SIZE", 40)
+    monkeypatch.setattr(server_module, "geocoder", geocoder)
+
+    def first_sheet():
+        yield HEADER
+        yield from sheet_rows(200)
+        yield "Nowhere Bar,,,restaurants\n"
+        yield "Sem categoria,,,\n"
+
+    sheets["first"] = first_sheet
+    job = run_job("POST", "/api/admin/sync-sheet", params={"sheet_url": "https://docs.google.com/spreadsheets/d/first/edit"})
+    assert job["status"] == "succeeded", job
+    result = job["result"]
+    assert result["markers_added"] == 200
+    # The 24 seeded markers are not in the sheet
+    assert (result["inserted"], result["deleted"]) == (200, 24)
+    assert result["geocode_errors"] == ["Nowhere Bar"]
+    assert job["progress"]["stage"] == "publish"
+    assert geocoder.batches == [40] * 5 + [1]
+    assert set(job["steps_ms"]) == {"download", "parse", "geocode", "diff", "write"}
+    assert sum(job["steps_ms"].values()) <= job["timings_ms"]["total"]
+
+    # Unchanged sheet: nothing is written and no new version is published
+    version = result["dataset_version"]
+    again = run_job("POST", "/api/admin/sync-sheet", params={"sheet_url": "https://docs.google.com/spreadsheets/d/first/edit"})
+    assert again["result"]["unchanged"] == 200
+    assert again["result"]["dataset_version"] == version
+
+    def second_sheet():
+        yield HEADER
+        yield "Lugar 0,Place 0,Nova descrição,restaurants\n"
+        yield from list(sheet_rows(150))[1:]
+
+    sheets["second"] = second_sheet
+    job = run_job("POST", "/api/admin/sync-sheet", params={"sheet_url": "https://docs.google.com/spreadsheets/d/second/edit"})
+    result = job["result"]
+    assert (result["markers_added"], result["updated"], result["deleted"]) == (150, 1, 50)
+    assert result["dataset_version"] == version + 1
+
+
+def test_failed_download_fails_the_job(server_module, run_job, sheet_server, monkeypatch):
+    _, url = sheet_server
+    monkeypatch.setattr(server_module, "SHEET_EXPORT_URL", url)
+    job = run_job("POST", "/api/admin/sync-sheet", params={"sheet_url": "https://docs.google.com/spreadsheets/d/missing/edit"})
+    assert job["status"] == "failed"
+    assert "Could not access Google Sheet" in job["error"]
+
+
+INGEST_SCRIPT = """
+import asyncio, resource, sys, uuid
+import httpx
+
+url, mode = sys.argv[1:]
+if mode == "diff":
+    import motor.motor_asyncio
+    from mongomock_motor import AsyncMongoMockClient
+    motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+import server
+from jobs import Job
+from sheet_ingest import csv_records
+
+class Geocoder:
+    async def geocode_many(self, place_names, on_result=None):
+        return {name: {"lat": -14.79, "lng": -39.04} for name in place_names}
+
+server.geocoder = Geocoder()
+# The in-memory marker indexes hold every marker by design; only the sync is measured
+server.marker_dataset._listeners.clear()
+
+async def run():
+    job = Job("memory", "sync-sheet")
+    if mode == "sync":
+        server.SHEET_EXPORT_URL = url
+        try:
+            return (await server.run_sheet_sync(job, "sheet", 500))["markers_added"]
+        finally:
+            await server.client.drop_database(server.db.name)
+    # The sync up to publish_stream, which bulk-writes each batch and drops it
+    diff = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "markers": 0}
+    async with httpx.AsyncClient(timeout=60) as http:
+        async with http.stream("GET", url) as response:
+            markers = server.geocoded_markers(server.valid_rows(csv_records(response.aiter_text()), job), job, 500)
+            async for operations in server.marker_operations(markers, job, 500, diff):
+                pass
+    return diff["markers"]
+
+rows = asyncio.run(run())
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# marker_operations keeps every id it has seen, to tell duplicates and deleted markers
+ids = {str(uuid.uuid4()) for _ in range(rows)}
+print(rows, peak, (sys.getsizeof(ids) + sum(map(sys.getsizeof, ids))) // 1024)
+"""
+
+
+def ingest_peak_rss(url, mongo_url=None):
+    """Rows synced, peak RSS and the size of their ids (KiB) for a fresh process
+    streaming `url`: through publishing into `mongo_url` when given, otherwise
+    through the diff against an empty in-memory dataset"""
+    env = {**os.environ, "PYTHONPATH": str(BACKEND_DIR)}
+    if mongo_url:
+        env.update(MONGO_URL=mongo_url, DB_NAME=f"ilheus_ingest_{uuid.uuid4().hex[:8]}")
+    output = subprocess.run(
+        [sys.executable, "-c", INGEST_SCRIPT, url, "sync" if mongo_url else "diff"],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout.split()
+    return tuple(int(value) for value in output)
+
+
+@pytest.mark.parametrize("mongo_url", [
+    None,
+    pytest.param(os.environ.get("TEST_MONGO_URL"), id="publish",
+                 marks=pytest.mark.skipif(not os.environ.get("TEST_MONGO_URL"), reason="TEST_MONGO_URL not set")),
+])
+def test_ingestion_memory_is_bounded_for_200k_rows(sheet_server, mongo_url):
+    sheets, url = sheet_server
+
+    def sheet(rows):
+        def generate():
+            yield HEADER
+            yield from sheet_rows(rows)
+        return generate
+
+    sheets["small"] = sheet(20_000)
+    sheets["big"] = sheet(200_000)
+
+    small_rows, small_peak, small_ids = ingest_peak_rss(url.format(sheet_id="small"), mongo_url)
+    big_rows, big_peak, big_ids = ingest_peak_rss(url.format(sheet_id="big"), mongo_url)
+
+    assert (small_rows, big_rows) == (20_000, 200_000)
+    # The 200k-row export is ~15 MB and its markers several times that; a
+    # streaming sync holds a couple of batches whatever the sheet size, plus
+    # the ids seen so far (~100 bytes a row), which it needs to find deletions
+    growth = big_peak - small_peak
+    assert growth < big_ids - small_ids + 8 * 1024, f"peak grew by {growth / 1024:.1f} MiB"
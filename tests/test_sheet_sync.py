@@ -0,0 +1,71 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from server import diff_markers, marker_id_for
+
+
+def make_marker(name, category, description="", lat=-14.79, lng=-39.04):
+    return {
+        "id": marker_id_for(name, category),
+        "name": name,
+        "name_en": None,
+        "name_es": None,
+        "description": description or f"{name} em Ilhéus",
+        "description_en": None,
+        "description_es": None,
+        "lat": lat,
+        "lng": lng,
+        "layer_id": category,
+        "google_maps_url": None,
+    }
+
+
+def apply_sync(collection, new_markers):
+    async def run():
+        current = await collection.find({}, {"_id": 0}).to_list(None)
+        operations, diff = diff_markers(current, new_markers)
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+        return operations, diff
+
+    return asyncio.run(run())
+
+
+def test_marker_id_is_stable_per_name_and_category():
+    assert marker_id_for("Vesúvio Bar", "restaurants") == marker_id_for(" Vesúvio  bar ", "restaurants")
+    assert marker_id_for("Praia do Cristo", "sights") != marker_id_for("Praia do Cristo", "beaches")
+
+
+def test_unchanged_sheet_touches_no_documents():
+    collection = AsyncMongoMockClient()["ilheus_test"]["markers"]
+    sheet = [make_marker("Vesúvio Bar", "restaurants"), make_marker("Praia do Sul", "beaches")]
+
+    _, diff = apply_sync(collection, sheet)
+    assert diff == {"inserted": 2, "updated": 0, "deleted": 0, "unchanged": 0}
+
+    operations, diff = apply_sync(collection, sheet)
+    assert operations == []
+    assert diff == {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 2}
+
+
+def test_diff_counts_inserts_updates_and_deletes():
+    collection = AsyncMongoMockClient()["ilheus_test"]["markers"]
+    apply_sync(collection, [
+        make_marker("Vesúvio Bar", "restaurants"),
+        make_marker("Praia do Sul", "beaches"),
+        make_marker("Porto de Ilhéus", "sights"),
+    ])
+
+    _, diff = apply_sync(collection, [
+        make_marker("Vesúvio Bar", "restaurants", description="Bar histórico"),
+        make_marker("Praia do Sul", "beaches"),
+        make_marker("Teatro Municipal de Ilhéus", "sights"),
+    ])
+
+    assert diff == {"inserted": 1, "updated": 1, "deleted": 1, "unchanged": 1}
+    markers = asyncio.run(collection.find({}, {"_id": 0}).to_list(None))
+    assert sorted(marker["name"] for marker in markers) == ["Praia do Sul", "Teatro Municipal de Ilhéus", "Vesúvio Bar"]
+    vesuvio = next(marker for marker in markers if marker["name"] == "Vesúvio Bar")
+    assert vesuvio["id"] == marker_id_for("Vesúvio Bar", "restaurants")
+    assert vesuvio["description"] == "Bar histórico"
@@ -0,0 +1,121 @@
+import gzip
+import os
+import time
+
+import pytest
+from pymongo import UpdateOne
+
+from snapshots import SnapshotStore
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("SNAPSHOT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_write_is_content_addressed(tmp_path):
+    store = SnapshotStore(tmp_path)
+    entry = store.write("markers.en", b'[{"id": "a"}]')
+    assert entry["file"].startswith("markers.en.") and entry["file"].endswith(".json")
+    assert entry["url"] == f"/api/snapshots/{entry['file']}"
+    assert (tmp_path / entry["file"]).read_bytes() == b'[{"id": "a"}]'
+    assert gzip.decompress((tmp_path / f"{entry['file']}.gz").read_bytes()) == b'[{"id": "a"}]'
+    assert entry["encoded_bytes"]["gzip"] == (tmp_path / f"{entry['file']}.gz").stat().st_size
+
+    assert store.write("markers.en", b'[{"id": "a"}]') == entry
+    assert store.write("markers.en", b'[{"id": "b"}]')["file"] != entry["file"]
+
+
+def test_names_outside_the_pattern_are_rejected(tmp_path):
+    store = SnapshotStore(tmp_path)
+    file_name = store.write("layers", b"[]")["file"]
+    assert store.path(file_name) == tmp_path / file_name
+    assert store.path(file_name, "gzip") == tmp_path / f"{file_name}.gz"
+    for name in ("manifest.json", "../server.py", f"{file_name}.gz", "layers.0123.json"):
+        assert store.path(name) is None
+
+
+def test_publish_prunes_old_unreferenced_files(tmp_path):
+    store = SnapshotStore(tmp_path, retention=60)
+    old = store.write("layers", b"[1]")["file"]
+    recent = store.write("layers", b"[2]")["file"]
+    current = store.write("layers", b"[3]")
+    stale = time.time() - 120
+    for name in (old, f"{old}.gz", current["file"]):
+        os.utime(tmp_path / name, (stale, stale))
+
+    store.publish(3, {"layers": current})
+    assert not (tmp_path / old).exists() and not (tmp_path / f"{old}.gz").exists()
+    assert (tmp_path / recent).exists() and (tmp_path / current["file"]).exists()
+    assert SnapshotStore(tmp_path).load()["files"]["layers"] == current
+
+
+def test_superseded_files_are_kept_for_the_retention_period(tmp_path):
+    store = SnapshotStore(tmp_path, retention=60)
+    live = store.write("layers", b"[1]")
+    store.publish(1, {"layers": live})
+    # Current for longer than the retention period before being superseded
+    long_ago = time.time() - 600
+    for name in (live["file"], f"{live['file']}.gz"):
+        os.utime(tmp_path / name, (long_ago, long_ago))
+
+    store.publish(2, {"layers": store.write("layers", b"[2]")})
+    assert (tmp_path / live["file"]).exists() and (tmp_path / f"{live['file']}.gz").exists()
+
+    superseded = time.time() - 120
+    for name in (live["file"], f"{live['file']}.gz"):
+        os.utime(tmp_path / name, (superseded, superseded))
+    store.publish(3, {"layers": store.write("layers", b"[3]")})
+    assert not (tmp_path / live["file"]).exists()
+
+
+def test_seeding_exports_a_snapshot(snapshot_dir, api):
+    manifest = api.get("/api/snapshot").json()
+    assert manifest["version"] == api.get("/api/admin/worker").json()["dataset_version"]
+    assert manifest["revision"] == api.get("/api/markers/changes").json()["revision"]
+    assert set(manifest["files"]["markers"]) == {"pt", "en", "es"}
+
+    layers = api.get(manifest["files"]["layers"]["url"]).json()
+    assert layers == sorted(api.get("/api/layers").json(), key=lambda layer: layer["id"])
+    for lang, entry in manifest["files"]["markers"].items():
+        markers = api.get(entry["url"]).json()
+        expected = api.get("/api/markers", params={"lang": lang}).json()
+        assert markers == sorted(expected, key=lambda marker: marker["id"])
+
+
+def test_snapshot_files_are_served_precompressed(snapshot_dir, api):
+    entry = api.get("/api/snapshot").json()["files"]["markers"]["pt"]
+    response = api.get(entry["url"], headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "immutable" in response.headers["cache-control"]
+    assert int(response.headers["content-length"]) == entry["encoded_bytes"]["gzip"]
+
+    plain = api.get(entry["url"], headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert len(plain.content) == entry["bytes"]
+
+    assert api.get("/api/snapshots/manifest.json").status_code == 404
+    assert api.get("/api/snapshots/markers.pt.0000000000000000.json").status_code == 404
+
+
+def test_manifest_follows_new_versions(snapshot_dir, api, server_module):
+    first = api.get("/api/snapshot")
+    assert api.get("/api/snapshot", headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+
+    marker_id = api.get("/api/markers").json()[0]["id"]
+    api.portal.call(server_module.marker_dataset.publish, [
+        UpdateOne({"id": marker_id}, {"$set": {"name_en": "Renamed"}})
+    ])
+    second = api.get("/api/snapshot").json()
+    assert second["version"] == first.json()["version"] + 1
+    # Only the English markers changed, so only their file was replaced
+    assert second["files"]["layers"] == first.json()["files"]["layers"]
+    assert second["files"]["markers"]["pt"]["file"] == first.json()["files"]["markers"]["pt"]["file"]
+    assert second["files"]["markers"]["en"]["file"] != first.json()["files"]["markers"]["en"]["file"]
+    renamed = [m for m in api.get(second["files"]["markers"]["en"]["url"]).json() if m["id"] == marker_id]
+    assert renamed[0]["name"] == "Renamed"
+
+
+def test_snapshots_are_off_without_a_directory(api):
+    assert api.get("/api/snapshot").status_code == 404
@@ -0,0 +1,106 @@
+import random
+
+from pymongo import UpdateOne
+
+from clustering import project
+from tiles import TileIndex, decode_tile, encode_tile
+
+
+# Costa do Cacau, Itacaré to Canavieiras
+REGION = (-15.7, -39.4, -14.2, -38.9)
+
+
+def synthetic_markers(count, seed=7):
+    rng = random.Random(seed)
+    south, west, north, east = REGION
+    return [
+        {"id": f"m{i}", "lat": rng.uniform(south, north), "lng": rng.uniform(west, east),
+         "layer_id": "sights", "name": f"Lugar {i}"}
+        for i in range(count)
+    ]
+
+
+def tile_of(lat, lng, z):
+    x, y = project(lat, lng)
+    return int(x * 2 ** z), int(y * 2 ** z)
+
+
+def test_encoding_round_trips():
+    features = [(10, 4000, {"id": "a", "rank": 3, "score": -2, "weight": 0.5, "open": True}),
+                (-20, 50, {"id": "b", "rank": 3, "note": None})]
+    layers = decode_tile(encode_tile({"markers": features, "empty": []}, extent=4096))
+    assert list(layers) == ["markers"]
+    assert layers["markers"]["extent"] == 4096
+    assert [(f["x"], f["y"], f["properties"]) for f in layers["markers"]["features"]] == [
+        (10, 4000, {"id": "a", "rank": 3, "score": -2, "weight": 0.5, "open": True}),
+        (-20, 50, {"id": "b", "rank": 3}),
+    ]
+    assert encode_tile({"markers": []}) == b""
+
+
+def test_points_match_a_scan_of_every_marker():
+    markers = synthetic_markers(3000)
+    index = TileIndex(markers)
+    for z in (8, 11, 14):
+        for lat, lng in ((-14.8, -39.05), (-15.2, -39.1), (-14.5, -39.0)):
+            x, y = tile_of(lat, lng, z)
+            expected = set()
+            for marker in markers:
+                mx, my = project(marker["lat"], marker["lng"])
+                px, py = round((mx * 2 ** z - x) * 4096), round((my * 2 ** z - y) * 4096)
+                if -64 <= px < 4096 + 64 and -64 <= py < 4096 + 64:
+                    expected.add((marker["id"], px, py))
+            found = {(marker["id"], px, py) for marker, px, py in index.points(z, x, y, 4096, 64)}
+            assert found == expected
+
+
+def test_occupied_tiles_hold_markers():
+    markers = synthetic_markers(500)
+    index = TileIndex(markers)
+    occupied = index.occupied(12, *REGION)
+    assert sorted(occupied) == sorted({tile_of(marker["lat"], marker["lng"], 12) for marker in markers})
+    assert all(index.points(12, x, y) for x, y in occupied)
+
+
+def test_tile_endpoint(server_module, api):
+    marker = api.get("/api/markers").json()[0]
+    z = 15
+    x, y = tile_of(marker["lat"], marker["lng"], z)
+
+    response = api.get(f"/api/tiles/{z}/{x}/{y}.mvt", params={"lang": "en"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.mapbox-vector-tile"
+    features = {feature["properties"]["id"]: feature for feature in decode_tile(response.content)["markers"]["features"]}
+    assert features[marker["id"]]["properties"] == {
+        "id": marker["id"], "layer_id": marker["layer_id"], "name": marker["name_en"] or marker["name"],
+    }
+    mx, my = project(marker["lat"], marker["lng"])
+    assert features[marker["id"]]["x"] == round((mx * 2 ** z - x) * 4096)
+
+    etag = response.headers["etag"]
+    assert api.get(f"/api/tiles/{z}/{x}/{y}.mvt", params={"lang": "en"},
+                   headers={"If-None-Match": etag}).status_code == 304
+    assert api.get("/api/tiles/15/0/0.mvt").content == b""
+
+
+def test_tile_validation(api):
+    assert api.get("/api/tiles/23/0/0.mvt").status_code == 400
+    assert api.get("/api/tiles/2/4/0.mvt").status_code == 400
+    assert api.get("/api/tiles/2/0/0.mvt", params={"lang": "fr"}).status_code == 400
+
+
+def test_tiles_follow_dataset_versions(server_module, api, monkeypatch):
+    monkeypatch.setattr(server_module, "TILE_PRERENDER", True)
+    marker = api.get("/api/markers").json()[0]
+    x, y = tile_of(marker["lat"], marker["lng"], 14)
+    path = f"/api/tiles/14/{x}/{y}.mvt"
+    assert marker["name"] in {f["properties"]["name"] for f in decode_tile(api.get(path).content)["markers"]["features"]}
+
+    api.portal.call(server_module.marker_dataset.publish, [
+        UpdateOne({"id": marker["id"]}, {"$set": {"name": "Renomeado", "revision": None}}),
+    ])
+    # Pre-rendered at publish time, so this read is a cache hit
+    hits = server_module.tile_cache.hits
+    names = {f["properties"]["name"] for f in decode_tile(api.get(path).content)["markers"]["features"]}
+    assert "Renomeado" in names and marker["name"] not in names
+    assert server_module.tile_cache.hits == hits + 1